@@ -0,0 +1,182 @@
+import mimetypes
+import os
+import re
+import stat
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Receive, Scope, Send
+
+# Content-addressed uploads never change under the same URL
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Sibling files written by precompress_static.py, in order of preference
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+COMPRESSIBLE_SUFFIXES = {".css", ".js", ".svg", ".json", ".txt", ".html"}
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header, size):
+    """Parse a single ``bytes=`` range into inclusive ``(start, end)``.
+
+    Returns None when the header should be ignored (malformed or several
+    ranges; the full file is sent) and raises ValueError when it cannot be
+    satisfied.
+    """
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+class RangeFileResponse(FileResponse):
+    """206 Partial Content for one byte range of a file."""
+
+    def __init__(self, path, start, end, stat_result, **kwargs):
+        super().__init__(path, status_code=206, stat_result=stat_result, **kwargs)
+        self.start, self.end = start, end
+        self.headers["content-length"] = str(end - start + 1)
+        self.headers["content-range"] = f"bytes {start}-{end}/{stat_result.st_size}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        remaining = self.end - self.start + 1
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.start)
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({
+                    "type": "http.response.body",
+                    "body": chunk,
+                    "more_body": remaining > 0,
+                })
+        if remaining > 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles with cache headers, byte ranges and precompressed variants.
+
+    - Paths under ``immutable_prefixes`` (content-addressed uploads) get a
+      one-year immutable Cache-Control; everything else gets ``cache_control``
+      and is revalidated through ETag / Last-Modified.
+    - A single ``Range: bytes=`` range is answered with 206 (or 416), honouring
+      If-Range.
+    - For text assets, a ``.br`` / ``.gz`` sibling written at build time is
+      served when the client accepts it and it is not older than the source.
+    - Dot-files and dot-directories (e.g. the uploads ``.incoming`` area) are
+      never served.
+    """
+
+    def __init__(self, *args, immutable_prefixes=(), cache_control="no-cache", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.immutable_prefixes = tuple(os.path.normpath(p) + os.sep for p in immutable_prefixes)
+        self.cache_control = cache_control
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if any(part.startswith(".") for part in path.split(os.sep) if part != "."):
+            raise HTTPException(status_code=404)
+        return await super().get_response(path, scope)
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        relative = self.get_path(scope)
+        compressible = os.path.splitext(full_path)[1] in COMPRESSIBLE_SUFFIXES
+
+        response = None
+        if compressible and status_code == 200 and "range" not in request_headers:
+            response = self._precompressed_response(full_path, stat_result, request_headers)
+        if response is None:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+
+        response.headers["accept-ranges"] = "bytes"
+        if compressible:
+            response.headers["vary"] = "Accept-Encoding"
+        if relative.startswith(self.immutable_prefixes):
+            response.headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers["cache-control"] = self.cache_control
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+
+        if status_code == 200 and "range" in request_headers and self._if_range_matches(
+            response.headers, request_headers
+        ):
+            try:
+                byte_range = parse_range(request_headers["range"], stat_result.st_size)
+            except ValueError:
+                return Response(
+                    status_code=416,
+                    headers={"content-range": f"bytes */{stat_result.st_size}"},
+                )
+            if byte_range is not None:
+                ranged = RangeFileResponse(full_path, *byte_range, stat_result=stat_result)
+                for key in ("accept-ranges", "cache-control", "vary"):
+                    if key in response.headers:
+                        ranged.headers[key] = response.headers[key]
+                return ranged
+        return response
+
+    def _precompressed_response(self, full_path, stat_result, request_headers):
+        accepted = {
+            value.split(";")[0].strip().lower()
+            for value in request_headers.get("accept-encoding", "").split(",")
+        }
+        for encoding, suffix in PRECOMPRESSED:
+            if encoding not in accepted:
+                continue
+            try:
+                variant = os.stat(full_path + suffix)
+            except OSError:
+                continue
+            if not stat.S_ISREG(variant.st_mode) or variant.st_mtime < stat_result.st_mtime:
+                continue
+            response = FileResponse(
+                full_path + suffix,
+                stat_result=variant,
+                media_type=mimetypes.guess_type(full_path)[0],
+            )
+            response.headers["content-encoding"] = encoding
+            return response
+        return None
+
+    @staticmethod
+    def _if_range_matches(response_headers, request_headers):
+        if_range = request_headers.get("if-range")
+        if if_range is None:
+            return True
+        return if_range in (response_headers.get("etag"), response_headers.get("last-modified"))
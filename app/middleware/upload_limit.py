@@ -0,0 +1,65 @@
+from starlette.responses import RedirectResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Rejects oversized request bodies on upload routes before they are parsed.
+
+    ``limits`` maps a path to ``(max_body_bytes, redirect_url)``. A declared
+    Content-Length above the limit is refused without reading the body;
+    otherwise received bytes are counted and the request is cut off as soon
+    as they pass the limit. Either way the client is redirected to
+    ``redirect_url`` with ``?error=file_too_large``.
+    """
+
+    def __init__(self, app: ASGIApp, *, limits: dict) -> None:
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] not in self.limits:
+            await self.app(scope, receive, send)
+            return
+
+        max_bytes, redirect_url = self.limits[scope["path"]]
+        reject = RedirectResponse(f"{redirect_url}?error=file_too_large", status_code=303)
+
+        headers = dict(scope.get("headers") or [])
+        declared = headers.get(b"content-length")
+        if declared and declared.isdigit() and int(declared) > max_bytes:
+            await reject(scope, receive, send)
+            return
+
+        received = 0
+        exceeded = False
+        rejected = False
+
+        async def counting_receive() -> Message:
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    exceeded = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message: Message) -> None:
+            # Form parsing turns our exception into a 400; replace that response.
+            nonlocal rejected
+            if not exceeded:
+                await send(message)
+            elif not rejected:
+                rejected = True
+                await reject(scope, receive, send)
+
+        try:
+            await self.app(scope, counting_receive, guarded_send)
+        except _BodyTooLarge:
+            if not rejected:
+                await reject(scope, receive, send)
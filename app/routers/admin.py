@@ -1,34 +1,44 @@
 from fastapi import APIRouter, Request, Depends, Form
 from fastapi.responses import RedirectResponse
 from fastapi.templating import Jinja2Templates
-from db import get_db
+from db import get_db, get_read_db
+from app.services import pagination, storage_service
+from app.services.image_service import delete_image
 import json
 from fastapi.responses import StreamingResponse
 import io
 import csv
 from datetime import datetime
+from config import ADMIN_PAGE_SIZE, GALLERY_PAGE_SIZE
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
+templates.env.filters["upload_url"] = storage_service.upload_url
 
 @router.get("/admin")
-def admin_dashboard(request: Request, db=Depends(get_db)):
+def admin_dashboard(request: Request, cursor: str | None = None, db=Depends(get_read_db)):
     if not request.session.get("is_admin"):
         return RedirectResponse("/", status_code=303)
 
     request.session.pop("view_user", None)
 
+    name, last_id = pagination.decode_cursor(cursor, pagination.FIRST)
     cur = db.cursor()
     cur.execute(
         """
-        SELECT u.id, u.name, u.email, COUNT(i.id) AS total_posts
+        SELECT u.id, u.name, u.email,
+               (SELECT COUNT(*) FROM images i WHERE i.user_name = u.email) AS total_posts
         FROM users u
-        LEFT JOIN images i ON i.user_name = u.email
-        GROUP BY u.id, u.name, u.email
-        ORDER BY u.name COLLATE NOCASE
-        """
+        WHERE IFNULL(u.name, '') COLLATE NOCASE >= ?
+          AND (IFNULL(u.name, '') COLLATE NOCASE, u.id) > (?, ?)
+        ORDER BY IFNULL(u.name, '') COLLATE NOCASE, u.id
+        LIMIT ?
+        """,
+        (name, name, last_id, ADMIN_PAGE_SIZE + 1)
+    )
+    rows, next_cursor = pagination.split_page(
+        cur.fetchall(), ADMIN_PAGE_SIZE, lambda r: (r[1] or "", r[0])
     )
-    rows = cur.fetchall()
 
     users = [
         {
@@ -40,11 +50,14 @@ def admin_dashboard(request: Request, db=Depends(get_db)):
         for r in rows
     ]
 
-    cur.execute("SELECT COUNT(*) FROM admins")
-    total_admins = cur.fetchone()[0]
-
-    cur.execute("SELECT COUNT(*) FROM images")
-    total_images = cur.fetchone()[0]
+    cur.execute(
+        """
+        SELECT (SELECT COUNT(*) FROM users),
+               (SELECT COUNT(*) FROM admins),
+               (SELECT COUNT(*) FROM images)
+        """
+    )
+    total_users, total_admins, total_images = cur.fetchone()
 
     return templates.TemplateResponse(
         request=request,
@@ -52,7 +65,9 @@ def admin_dashboard(request: Request, db=Depends(get_db)):
         context={
             "request": request,
             "users": users,
+            "page": pagination.links(request, next_cursor),
             "user": request.session.get("user"),
+            "total_users": total_users,
             "total_admins": total_admins,
             "total_images": total_images
         }
@@ -60,7 +75,12 @@ def admin_dashboard(request: Request, db=Depends(get_db)):
 
 
 @router.get("/admin/user/{user_id}")
-def admin_user_gallery(user_id: int, request: Request, db=Depends(get_db)):
+def admin_user_gallery(
+    user_id: int,
+    request: Request,
+    cursor: str | None = None,
+    db=Depends(get_read_db)
+):
     if not request.session.get("is_admin"):
         return RedirectResponse("/", 303)
 
@@ -72,20 +92,28 @@ def admin_user_gallery(user_id: int, request: Request, db=Depends(get_db)):
 
     email = user_row[0]
 
+    upload_date, last_id = pagination.decode_cursor(cursor, pagination.NEWEST)
     cur.execute(
         """
-        SELECT filename, metadata, narrative, visibility
+        SELECT filename, metadata, narrative, visibility, thumbnails, upload_date, id
         FROM images
-        WHERE user_name = ?
-        ORDER BY id DESC
+        WHERE user_name = ? AND (upload_date, id) < (?, ?)
+        ORDER BY upload_date DESC, id DESC
+        LIMIT ?
         """,
-        (email,)
+        (email, upload_date, last_id, GALLERY_PAGE_SIZE + 1)
+    )
+    rows, next_cursor = pagination.split_page(
+        cur.fetchall(), GALLERY_PAGE_SIZE, lambda r: (r[5], r[6])
     )
 
     images = []
-    for r in cur.fetchall():
+    for r in rows:
         meta = json.loads(r[1]) if r[1] else None
-        images.append((r[0], meta, r[2], r[3]))
+        images.append((r[0], meta, r[2], r[3], json.loads(r[4] or "[]")))
+
+    cur.execute("SELECT COUNT(*) FROM images WHERE user_name = ?", (email,))
+    total = cur.fetchone()[0]
 
     return templates.TemplateResponse(
         request=request,
@@ -93,6 +121,8 @@ def admin_user_gallery(user_id: int, request: Request, db=Depends(get_db)):
         context={
             "request": request,
             "images": images,
+            "total_images": total,
+            "page": pagination.links(request, next_cursor),
             "profile_user": email
         }
     )
@@ -107,12 +137,7 @@ def admin_delete_image(
     if not request.session.get("is_admin"):
         return RedirectResponse("/", status_code=303)
 
-    cur = db.cursor()
-    cur.execute(
-        "DELETE FROM images WHERE filename=? AND user_name=?",
-        (filename, user_email)
-    )
-    db.commit()
+    delete_image(db, user_email, filename)
 
     return RedirectResponse(f"/admin/user/{user_email}", status_code=303)
 
@@ -162,6 +187,7 @@ def generate_admin_users_csv(db) -> str:
         """
         SELECT u.name, u.email, CASE WHEN a.email IS NOT NULL THEN 'Yes' ELSE 'No' END as is_admin,
                COUNT(i.id) as total_images, COALESCE(SUM(i.file_size), 0) / 1024 as storage_mb,
+               COALESCE(SUM(COALESCE(i.original_file_size, i.file_size)), 0) / 1024 as uploaded_mb,
                MIN(i.upload_date) as join_date
         FROM users u
         LEFT JOIN admins a ON u.email = a.email
@@ -173,10 +199,10 @@ def generate_admin_users_csv(db) -> str:
 
     output = io.StringIO()
     writer = csv.writer(output)
-    writer.writerow(['Username', 'Email', 'Admin Status', 'Total Images', 'Storage (MB)', 'Join Date'])
+    writer.writerow(['Username', 'Email', 'Admin Status', 'Total Images', 'Storage (MB)', 'Uploaded (MB)', 'Join Date'])
 
     for row in cur.fetchall():
-        name, email, is_admin, total_images, storage_mb, join_date = row
+        name, email, is_admin, total_images, storage_mb, uploaded_mb, join_date = row
         # Format join date
         try:
             if join_date:
@@ -187,7 +213,7 @@ def generate_admin_users_csv(db) -> str:
         except (ValueError, TypeError):
             formatted_join = join_date or "N/A"
 
-        writer.writerow([name or "N/A", email, is_admin, total_images, f"{storage_mb:.2f}", formatted_join])
+        writer.writerow([name or "N/A", email, is_admin, total_images, f"{storage_mb:.2f}", f"{uploaded_mb:.2f}", formatted_join])
 
     return output.getvalue()
 
@@ -240,7 +266,7 @@ def generate_admin_images_csv(db) -> str:
 
 
 @router.get("/admin/export/users")
-def admin_export_users(request: Request, db=Depends(get_db)):
+def admin_export_users(request: Request, db=Depends(get_read_db)):
     """Export all users data as CSV (admin only)."""
     if not request.session.get("is_admin"):
         return RedirectResponse("/", status_code=303)
@@ -259,7 +285,7 @@ def admin_export_users(request: Request, db=Depends(get_db)):
 
 
 @router.get("/admin/export/images")
-def admin_export_images(request: Request, db=Depends(get_db)):
+def admin_export_images(request: Request, db=Depends(get_read_db)):
     """Export all images data as CSV (admin only)."""
     if not request.session.get("is_admin"):
         return RedirectResponse("/", status_code=303)
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Request, Depends, HTTPException
 from fastapi.responses import StreamingResponse
-from db import get_db
+from db import get_read_db, run_db
 import csv
 import io
 import json
@@ -72,7 +72,7 @@ def generate_user_json(db, user_email: str) -> Dict[str, Any]:
 
     cur.execute(
         """
-        SELECT filename, metadata, narrative, visibility, upload_date, file_size
+        SELECT filename, metadata, narrative, visibility, upload_date, file_size, original_file_size
         FROM images
         WHERE user_name = ?
         ORDER BY upload_date DESC
@@ -82,10 +82,12 @@ def generate_user_json(db, user_email: str) -> Dict[str, Any]:
 
     images = []
     total_storage = 0.0
+    total_uploaded = 0.0
 
     for row in cur.fetchall():
-        filename, metadata, narrative, visibility, upload_date, file_size = row
+        filename, metadata, narrative, visibility, upload_date, file_size, original_file_size = row
         total_storage += file_size or 0
+        total_uploaded += original_file_size or file_size or 0
 
         meta_dict = {}
         if metadata:
@@ -99,6 +101,7 @@ def generate_user_json(db, user_email: str) -> Dict[str, Any]:
             "description": meta_dict.get('description', narrative or ""),
             "filename": filename,
             "file_size_kb": round(file_size or 0, 2),
+            "original_file_size_kb": round(original_file_size or file_size or 0, 2),
             "uploaded_at": upload_date or "Unknown",
             "metadata": meta_dict
         })
@@ -117,18 +120,19 @@ def generate_user_json(db, user_email: str) -> Dict[str, Any]:
             "email": user_email,
             "member_since": join_date,
             "total_images": len(images),
-            "total_storage_mb": round(total_storage / 1024, 2)
+            "total_storage_mb": round(total_storage / 1024, 2),
+            "total_uploaded_mb": round(total_uploaded / 1024, 2)
         },
         "images": images,
         "export_date": datetime.now().isoformat()
     }
 
 @router.get("/csv")
-async def export_my_data_csv(request: Request, db=Depends(get_db)):
+async def export_my_data_csv(request: Request, db=Depends(get_read_db)):
     """Export current user's data as CSV."""
     user_email = get_current_user(request)
 
-    csv_data = generate_user_csv(db, user_email)
+    csv_data = await run_db(generate_user_csv, db, user_email)
     filename = f"bhv_my_data_{user_email.split('@')[0]}_{datetime.now().strftime('%Y%m%d')}.csv"
 
     def iter_csv():
@@ -141,11 +145,11 @@ async def export_my_data_csv(request: Request, db=Depends(get_db)):
     )
 
 @router.get("/json")
-async def export_my_data_json(request: Request, db=Depends(get_db)):
+async def export_my_data_json(request: Request, db=Depends(get_read_db)):
     """Export current user's data as JSON."""
     user_email = get_current_user(request)
 
-    json_data = generate_user_json(db, user_email)
+    json_data = await run_db(generate_user_json, db, user_email)
     filename = f"bhv_my_data_{user_email.split('@')[0]}_{datetime.now().strftime('%Y%m%d')}.json"
 
     json_str = json.dumps(json_data, indent=2, ensure_ascii=False)
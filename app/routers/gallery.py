@@ -1,23 +1,28 @@
 from fastapi import APIRouter, Request, UploadFile, File, Form, Depends
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
+from PIL import Image
+from typing import List
+import asyncio
 import sqlite3
 import json
 import os
-import uuid
 
-from db import get_db
-from app.services.image_service import delete_image
+from db import get_db, get_read_db, run_db
+from app.services.image_service import delete_image, place_upload
 from app.services.admin_service import is_admin
-from fuzzy_emotion import detect_fuzzy_emotion
+from app.services import analysis_cache, analysis_queue, emotion_store, fts, normalize_service, pagination, storage_service
+from app.services.thumbnail_service import remove_thumbnails
+from app.services.upload_service import UploadTooLarge
+from config import GALLERY_PAGE_SIZE, MAX_BATCH_FILES, SEARCH_MAX_USERS
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
+templates.env.filters["upload_url"] = storage_service.upload_url
 
-UPLOAD_DIR = "static/uploads"
 
-
-def require_user(request: Request, db: sqlite3.Connection = Depends(get_db)) -> str:
+def require_user(request: Request, db: sqlite3.Connection = Depends(get_read_db)) -> str:
     email = request.session.get("email")
     if not email:
         return RedirectResponse("/login", 303)
@@ -28,26 +33,66 @@ def require_user(request: Request, db: sqlite3.Connection = Depends(get_db)) ->
     return email
 
 
+def _is_image(path):
+    try:
+        with Image.open(path) as img:
+            img.verify()
+        return True
+    except Exception:
+        return False
+
+
 @router.get("/gallery")
 def gallery(
     request: Request,
+    emotion: str | None = None,
+    cursor: str | None = None,
     user: str = Depends(require_user),
-    db: sqlite3.Connection = Depends(get_db)
+    db: sqlite3.Connection = Depends(get_read_db)
 ):
     # Fix: if require_user returned redirect
     if isinstance(user, RedirectResponse):
         return user
 
     cur = db.cursor()
+    upload_date, last_id = pagination.decode_cursor(cursor, pagination.NEWEST)
 
-    cur.execute(
-        "SELECT filename, metadata, narrative FROM images WHERE user_name=?",
-        (user,)
-    )
+    if emotion:
+        # idx_images_user_emotion_upload; see app.services.emotion_store
+        cur.execute(
+            """
+            SELECT filename, metadata, narrative, analysis_status, thumbnails, upload_date, id
+            FROM images
+            WHERE user_name = ? AND dominant_emotion = ? AND (upload_date, id) < (?, ?)
+            ORDER BY upload_date DESC, id DESC
+            LIMIT ?
+            """,
+            (user, emotion, upload_date, last_id, GALLERY_PAGE_SIZE + 1)
+        )
+        rows = cur.fetchall()
+        cur.execute(
+            "SELECT COUNT(*) FROM images WHERE user_name = ? AND dominant_emotion = ?",
+            (user, emotion)
+        )
+    else:
+        cur.execute(
+            """
+            SELECT filename, metadata, narrative, analysis_status, thumbnails, upload_date, id
+            FROM images
+            WHERE user_name = ? AND (upload_date, id) < (?, ?)
+            ORDER BY upload_date DESC, id DESC
+            LIMIT ?
+            """,
+            (user, upload_date, last_id, GALLERY_PAGE_SIZE + 1)
+        )
+        rows = cur.fetchall()
+        cur.execute("SELECT COUNT(*) FROM images WHERE user_name = ?", (user,))
+    total = cur.fetchone()[0]
 
+    rows, next_cursor = pagination.split_page(rows, GALLERY_PAGE_SIZE, lambda r: (r[5], r[6]))
     images = [
-        (fn, json.loads(meta) if meta else {}, narrative)
-        for fn, meta, narrative in cur.fetchall()
+        (fn, meta, narrative, user, status, json.loads(thumbs or "[]"))
+        for fn, meta, narrative, status, thumbs, _, _ in rows
     ]
 
     return templates.TemplateResponse(
@@ -56,11 +101,178 @@ def gallery(
         context={
             "request": request,
             "images": images,
+            "total_images": total,
+            "page": pagination.links(request, next_cursor),
             "profile_user": user,
-            "current_user": user
+            "current_user": user,
+            "emotion_filter": emotion
         }
     )
 
+ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp'}
+
+
+async def _receive_upload(db, user_email, image):
+    """Stream, normalize and validate one uploaded file.
+
+    Returns ``(error, upload)``: ``error`` is one of the gallery ``?error=``
+    codes (and nothing is kept), otherwise ``upload`` is a dict describing
+    the temporary file, ready for _insert_image.
+    """
+    ext = os.path.splitext(image.filename or "")[1].lower()
+    if ext not in ALLOWED_EXTENSIONS:
+        return "invalid_file_type", None
+
+    try:
+        tmp_path, size, digest = await run_in_threadpool(storage_service.receive, image.file)
+    except UploadTooLarge:
+        return "file_too_large", None
+
+    original_size = size
+    ext, size, digest = await run_in_threadpool(normalize_service.apply, tmp_path, ext, size, digest)
+
+    filename = storage_service.blob_name(digest, ext)
+    # Early out before any analysis; _store_upload/_store_batch check again
+    # inside their write transaction, which is what rules out duplicates
+    if await run_db(storage_service.user_has, db, user_email, filename):
+        storage_service.discard(tmp_path)
+        return "duplicate_image", None
+
+    # Cheap header check only; decoding and clustering happen in analysis_queue
+    if not await run_in_threadpool(_is_image, tmp_path):
+        print(f"Error processing image {image.filename}: not a readable image")
+        storage_service.discard(tmp_path)
+        return "invalid_image", None
+
+    return None, {
+        "tmp_path": tmp_path,
+        "filename": filename,
+        "digest": digest,
+        "size": size,
+        "original_size": original_size,
+    }
+
+
+def _insert_image(db, user_email, upload, visibility, metadata, status, thumbnails=None):
+    """Reference the upload's blob and add its ``images`` row; the caller commits, then places it."""
+    shared = storage_service.add_ref(db, upload["filename"], upload["size"])
+    thumbnails = thumbnails or shared
+    cur = db.cursor()
+    cur.execute(
+        """
+        INSERT INTO images (
+            user_name, filename, metadata, visibility, analysis_status,
+            file_size, original_file_size, thumbnails
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            user_email,
+            upload["filename"],
+            metadata,
+            visibility,
+            status,
+            upload["size"] / 1024,
+            upload["original_size"] / 1024,
+            thumbnails
+        )
+    )
+    if metadata:
+        emotion_store.store(db, cur.lastrowid, metadata)
+    return cur.lastrowid, thumbnails
+
+
+def _store_upload(db, user_email, upload, visibility, key):
+    """Look up cached analysis, insert the row, commit and place the file; runs on the DB executor.
+
+    Returns None, keeping nothing, when the user already has this image.
+    """
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        if storage_service.user_has(db, user_email, upload["filename"]):
+            db.rollback()
+            storage_service.discard(upload["tmp_path"])
+            return None
+        cached = analysis_cache.get(db, key, commit=False)
+        image_id, thumbnails = _insert_image(
+            db, user_email, upload, visibility, cached, "done" if cached else "pending"
+        )
+        db.commit()
+    except BaseException:
+        db.rollback()
+        storage_service.discard(upload["tmp_path"])
+        raise
+    place_upload(db, user_email, upload["tmp_path"], upload["filename"])
+    return image_id, thumbnails, cached
+
+
+def _lookup_cached(db, upload):
+    """Cached metadata for a batch upload, and whether its blob already has thumbnails."""
+    cached = analysis_cache.get(db, upload["key"])
+    return cached, cached is not None and bool(storage_service.shared_thumbnails(db, upload["filename"]))
+
+
+def _store_batch(db, user_email, accepted, outcomes, visibility):
+    """Insert every accepted batch file in one transaction; runs on the DB executor.
+
+    Files the user already has by the time the transaction starts are
+    marked rejected and dropped from ``accepted``.
+    """
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        stored = []
+        for (result, upload), outcome in zip(accepted, outcomes):
+            if storage_service.user_has(db, user_email, upload["filename"]):
+                result.update(status="rejected", error="duplicate_image")
+                storage_service.discard(upload["tmp_path"])
+                continue
+            stored.append((result, upload))
+            metadata, thumbnails, status = upload["cached"], None, "done"
+            if isinstance(outcome, BaseException):
+                print(f"Error processing image {result['file']}: {outcome}")
+                status = "failed"
+                result["error"] = str(outcome) or type(outcome).__name__
+            else:
+                fresh, thumbnails = outcome
+                if fresh is not None:
+                    metadata = fresh
+                    analysis_cache.put(db, upload["key"], fresh, commit=False)
+            _insert_image(db, user_email, upload, visibility, metadata, status, thumbnails)
+            result.update(
+                status=status,
+                filename=upload["filename"],
+                metadata=json.loads(metadata) if metadata else None
+            )
+        db.commit()
+    except BaseException:
+        db.rollback()
+        _discard_batch(db, accepted, outcomes)
+        raise
+
+    accepted[:] = stored
+    for result, upload in accepted:
+        try:
+            place_upload(db, user_email, upload["tmp_path"], upload["filename"])
+        except OSError as exc:
+            print(f"Error storing image {result['file']}: {exc}")
+            result.update(status="failed", error=str(exc), metadata=None)
+
+
+def _discard_batch(db, accepted, outcomes):
+    """Remove the temp files of a rolled-back batch and the thumbnails written for them.
+
+    Thumbnails of a blob that another row already stores are shared, so
+    they are kept.
+    """
+    for (_, upload), outcome in zip(accepted, outcomes):
+        storage_service.discard(upload["tmp_path"])
+        if isinstance(outcome, BaseException) or not outcome[1]:
+            continue
+        if not db.execute("SELECT 1 FROM blobs WHERE name=?", (upload["filename"],)).fetchone():
+            out_dir = os.path.dirname(storage_service.blob_path(upload["filename"]))
+            remove_thumbnails(out_dir, outcome[1])
+
+
 @router.post("/upload")
 async def upload_image(
     request: Request,
@@ -72,46 +284,112 @@ async def upload_image(
     if not user_email:
         return RedirectResponse("/login", 303)
 
-    # Check if the file is an image
-    allowed_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp'}
-    ext = os.path.splitext(image.filename)[1].lower()
-    if ext not in allowed_extensions:
-        return RedirectResponse("/gallery?error=invalid_file_type", 303)
+    error, upload = await _receive_upload(db, user_email, image)
+    if error:
+        return RedirectResponse(f"/gallery?error={error}", 303)
 
-    ext = os.path.splitext(image.filename)[1]
-    filename = f"{uuid.uuid4().hex}{ext}"
-    filepath = os.path.join(UPLOAD_DIR, filename)
+    key = analysis_cache.cache_key(upload["digest"])
+    stored = await run_db(_store_upload, db, user_email, upload, visibility, key)
+    if stored is None:
+        return RedirectResponse("/gallery?error=duplicate_image", 303)
+    image_id, thumbnails, cached = stored
 
-    with open(filepath, "wb") as f:
-        f.write(await image.read())
+    if cached is None or thumbnails is None:
+        analysis_queue.submit(
+            image_id, storage_service.blob_path(upload["filename"]), key, analyze=cached is None
+        )
 
-    try:
-        metadata = detect_fuzzy_emotion(filepath)
-    except Exception as e:
-        print(f"Error processing image {filename}: {e}")
-        if os.path.exists(filepath):
-            try:
-                os.remove(filepath)
-            except OSError:
-                pass
-        return RedirectResponse("/gallery?error=invalid_image", 303)
+    return RedirectResponse("/gallery", 303)
+
+
+@router.post("/upload/batch")
+async def upload_batch(
+    request: Request,
+    images: List[UploadFile] = File(...),
+    visibility: str = Form("private"),
+    db=Depends(get_db)
+):
+    """Upload many files in one request and return per-file results as JSON.
+
+    Files are received one after another, then analysed concurrently on the
+    analysis_queue process pool, and every accepted file gets its ``images``
+    row in a single transaction.
+    """
+    user_email = request.session.get("email")
+    if not user_email:
+        return RedirectResponse("/login", 303)
+
+    if len(images) > MAX_BATCH_FILES:
+        return JSONResponse(
+            {"detail": f"At most {MAX_BATCH_FILES} files per batch"}, status_code=413
+        )
+
+    results = []
+    accepted = []
+    batch_names = set()
+    for image in images:
+        result = {"file": image.filename}
+        results.append(result)
+
+        error, upload = await _receive_upload(db, user_email, image)
+        if not error and upload["filename"] in batch_names:
+            storage_service.discard(upload["tmp_path"])
+            error = "duplicate_image"
+        if error:
+            result.update(status="rejected", error=error)
+            continue
+        batch_names.add(upload["filename"])
+
+        upload["key"] = analysis_cache.cache_key(upload["digest"])
+        upload["cached"], has_thumbnails = await run_db(_lookup_cached, db, upload)
+        if has_thumbnails:
+            upload["job"] = None
+        else:
+            out_dir = os.path.dirname(storage_service.blob_path(upload["filename"]))
+            upload["job"] = asyncio.wrap_future(analysis_queue.submit_file(
+                upload["tmp_path"], out_dir, os.path.splitext(upload["filename"])[0],
+                analyze=upload["cached"] is None
+            ))
+        accepted.append((result, upload))
+
+    # Cached files that already have thumbnails need no job: sleep(0, result) stands in
+    outcomes = await asyncio.gather(
+        *(upload["job"] or asyncio.sleep(0, (None, None)) for _, upload in accepted),
+        return_exceptions=True
+    )
+
+    await run_db(_store_batch, db, user_email, accepted, outcomes, visibility)
+
+    return {
+        "uploaded": len(accepted),
+        "rejected": len(results) - len(accepted),
+        "results": results
+    }
+
+
+@router.get("/gallery/status/{filename}")
+def analysis_status(
+    filename: str,
+    user: str = Depends(require_user),
+    db: sqlite3.Connection = Depends(get_read_db)
+):
+    if isinstance(user, RedirectResponse):
+        return user
 
     cur = db.cursor()
     cur.execute(
-        """
-        INSERT INTO images (user_name, filename, metadata, visibility)
-        VALUES (?, ?, ?, ?)
-        """,
-        (
-            user_email,
-            filename,
-            json.dumps(metadata),
-            visibility
-        )
+        "SELECT analysis_status, metadata FROM images WHERE filename=? AND user_name=?",
+        (filename, user)
     )
-    db.commit()
+    row = cur.fetchone()
+    if not row:
+        return JSONResponse({"detail": "Not found"}, status_code=404)
 
-    return RedirectResponse("/gallery", 303)
+    return {
+        "filename": filename,
+        "analysis_status": row[0],
+        "metadata": json.loads(row[1]) if row[1] else None
+    }
 
 
 
@@ -135,7 +413,8 @@ def delete_image_route(
 def search_users(
     request: Request,
     q: str = "",
-    db: sqlite3.Connection = Depends(get_db)
+    cursor: str | None = None,
+    db: sqlite3.Connection = Depends(get_read_db)
 ):
     """Search for public images from other users."""
     if not request.session.get("email"):
@@ -149,36 +428,61 @@ def search_users(
 
     
     cur = db.cursor()
+    term = q.strip()
+    if len(term) >= fts.MIN_TRIGRAM_CHARS:
+        # users_fts (migration 10): trigram substring match, best matches first
+        cur.execute(
+            """
+            SELECT u.email FROM users_fts
+            JOIN users u ON u.id = users_fts.rowid
+            WHERE users_fts MATCH ? AND u.email != ?
+            ORDER BY users_fts.rank
+            LIMIT ?
+            """,
+            (fts.phrase(term), current_user_email, SEARCH_MAX_USERS)
+        )
+    else:
+        cur.execute(
+            """
+            SELECT email FROM users
+            WHERE (name LIKE ? OR email LIKE ?) AND email != ?
+            ORDER BY id
+            LIMIT ?
+            """,
+            (f"%{term}%", f"%{term}%", current_user_email, SEARCH_MAX_USERS)
+        )
+    # One bound JSON array instead of an IN (...) list that grows with the matches
+    user_emails = json.dumps([row[0] for row in cur.fetchall()])
+
+    upload_date, last_id = pagination.decode_cursor(cursor, pagination.NEWEST)
     cur.execute(
         """
-        SELECT email, name FROM users
-        WHERE (name LIKE ? OR email LIKE ?) AND email != ?
+        SELECT i.filename, i.metadata, i.narrative, i.user_name, i.analysis_status,
+               i.thumbnails, i.upload_date, i.id
+        FROM json_each(?) m
+        JOIN images i ON i.user_name = m.value AND i.visibility = 'public'
+        WHERE (i.upload_date, i.id) < (?, ?)
+        ORDER BY i.upload_date DESC, i.id DESC
+        LIMIT ?
         """,
-        (f"%{q.lower()}%", f"%{q.lower()}%", current_user_email)
+        (user_emails, upload_date, last_id, GALLERY_PAGE_SIZE + 1)
     )
+    rows, next_cursor = pagination.split_page(
+        cur.fetchall(), GALLERY_PAGE_SIZE, lambda r: (r[6], r[7])
+    )
+    images = [
+        (fn, meta, narrative, user_name, status, json.loads(thumbs or "[]"))
+        for fn, meta, narrative, user_name, status, thumbs, _, _ in rows
+    ]
 
-    matching_users = cur.fetchall()
-    print(f"DEBUG: Search query: {q}, Current user: {current_user_email}, Matching users: {matching_users}")
-
-    user_emails = [user[0] for user in matching_users]
-    if not user_emails:
-        images = []
-        print("DEBUG: No matching users found")
-    else:
-        placeholders = ','.join('?' * len(user_emails))
-        query = f"""
-            SELECT filename, metadata, narrative, user_name
-            FROM images
-            WHERE user_name IN ({placeholders}) AND visibility = 'public'
-            ORDER BY upload_date DESC
-            """
-        cur.execute(query, user_emails)
-
-        images = [
-            (fn, json.loads(meta) if meta else {}, narrative, user_name)
-            for fn, meta, narrative, user_name in cur.fetchall()
-        ]
-        print(f"DEBUG: Found {len(images)} public images from users: {user_emails}")
+    cur.execute(
+        """
+        SELECT COUNT(*) FROM json_each(?) m
+        JOIN images i ON i.user_name = m.value AND i.visibility = 'public'
+        """,
+        (user_emails,)
+    )
+    total = cur.fetchone()[0]
 
     return templates.TemplateResponse(
         request=request,
@@ -186,6 +490,8 @@ def search_users(
         context={
             "request": request,
             "images": images,
+            "total_images": total,
+            "page": pagination.links(request, next_cursor),
             "search_query": q,
             "current_user": current_user_email
         }
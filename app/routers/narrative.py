@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Form, Depends, Request
+from fastapi import APIRouter, Form, Depends, HTTPException, Request
 from fastapi.responses import RedirectResponse
+import json
 import sqlite3
 
-from db import get_db
+from db import get_db, get_read_db
+from app.services import fts, pagination
 from app.services.admin_service import is_admin
+from config import GALLERY_PAGE_SIZE
 
 router = APIRouter()
 
@@ -41,3 +44,64 @@ def update_narrative(
         request.session["view_user"] = user_email
 
     return RedirectResponse("/gallery", 303)
+
+
+@router.get("/narratives/search")
+def search_narratives(
+    request: Request,
+    q: str = "",
+    cursor: str | None = None,
+    db: sqlite3.Connection = Depends(get_read_db)
+):
+    """Ranked full-text search over the narratives in the current vault.
+
+    Scoped like /update-narrative: the signed-in user's images, or the
+    admin's ``view_user``. Returns JSON with a marked-up snippet per match
+    and a ``next_cursor`` for the following page.
+    """
+    user_email = get_current_user_email(request, db)
+    if not user_email:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    terms = fts.prefix_terms(q.strip())
+    if not terms:
+        return {"query": q, "results": [], "next_cursor": None}
+
+    # The owner is part of the MATCH so FTS5 only ranks this vault's hits;
+    # its tokens are not exact (a.b@c and a@b.c agree), hence i.user_name too.
+    # BM25's corpus statistics still span every vault: counts only, no text.
+    match = f"user_name : {fts.phrase(user_email)} AND narrative : ({terms})"
+    rank, last_id = pagination.decode_cursor(cursor, pagination.BEST_RANK)
+    cur = db.cursor()
+    # narratives_fts (migration 13): best BM25 matches first, id breaks ties
+    cur.execute(
+        """
+        SELECT i.filename, i.upload_date, i.thumbnails,
+               snippet(narratives_fts, 0, ?, ?, '…', 24) AS snippet,
+               narratives_fts.rank, i.id
+        FROM narratives_fts
+        JOIN images i ON i.id = narratives_fts.rowid
+        WHERE narratives_fts MATCH ? AND i.user_name = ?
+          AND (narratives_fts.rank, i.id) > (?, ?)
+        ORDER BY narratives_fts.rank, i.id
+        LIMIT ?
+        """,
+        (fts.MARK_OPEN, fts.MARK_CLOSE, match, user_email, rank, last_id, GALLERY_PAGE_SIZE + 1)
+    )
+    rows, next_cursor = pagination.split_page(
+        cur.fetchall(), GALLERY_PAGE_SIZE, lambda r: (r[4], r[5])
+    )
+
+    return {
+        "query": q,
+        "results": [
+            {
+                "filename": filename,
+                "upload_date": upload_date,
+                "thumbnails": json.loads(thumbnails or "[]"),
+                "snippet_html": str(fts.marked(snippet)),
+            }
+            for filename, upload_date, thumbnails, snippet, _, _ in rows
+        ],
+        "next_cursor": next_cursor
+    }
@@ -2,16 +2,21 @@ import sqlite3
 import os
 import re
 import uuid
-from collections import Counter
 from fastapi import APIRouter, Request, Depends, Form, UploadFile, File
 from fastapi.responses import RedirectResponse
 from fastapi.templating import Jinja2Templates
 
-from db import get_db
+from starlette.concurrency import run_in_threadpool
+
+from db import get_db, get_read_db, run_db
+from config import DOCS_SEARCH_LIMIT, MAX_DOCS_UPLOAD_BYTES
+from app.services import docs_catalog, fts
 from app.services.admin_service import is_admin
+from app.services.upload_service import UploadTooLarge, copy_stream
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
+templates.env.filters["marked"] = fts.marked
 DOCS_UPLOAD_DIR = os.path.join("static", "docs_uploads")
 ALLOWED_DOC_EXTENSIONS = {".pdf", ".md", ".txt", ".doc", ".docx", ".png", ".jpg", ".jpeg"}
 DEFAULT_DOCS = [
@@ -83,27 +88,29 @@ def _ensure_unique_slug(db: sqlite3.Connection, base_slug: str) -> str:
         slug = f"{base_slug}-{suffix}"
 
 
-def _docs_table_exists(db: sqlite3.Connection):
+def _insert_doc(db: sqlite3.Connection, entry: dict) -> str:
+    """Pick a free slug, insert the entry and commit; returns the slug."""
+    slug = _ensure_unique_slug(db, _slugify(entry["title"]))
     cur = db.cursor()
     cur.execute(
         """
-        CREATE TABLE IF NOT EXISTS docs_entries (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            slug TEXT UNIQUE NOT NULL,
-            title TEXT NOT NULL,
-            section TEXT NOT NULL DEFAULT 'General',
-            summary TEXT,
-            content TEXT NOT NULL,
-            tags TEXT,
-            attachment_name TEXT,
-            created_by TEXT,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            is_published INTEGER DEFAULT 1
+        INSERT INTO docs_entries (slug, title, section, summary, content, tags, attachment_name, created_by)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            slug,
+            entry["title"],
+            entry["section"],
+            entry["summary"],
+            entry["content"],
+            entry["tags"],
+            entry["attachment_name"],
+            entry["created_by"]
         )
-        """
     )
     db.commit()
+    return slug
+
 
 @router.get("/")
 def home(request: Request):
@@ -212,49 +219,53 @@ def signup_submit(
     return RedirectResponse("/", status_code=303)
 
 
+def _default_doc_matches(doc, query):
+    if not query:
+        return True
+    return any(
+        query in (doc.get(field) or "").lower()
+        for field in ("title", "summary", "content", "section", "tags")
+    )
+
+
 @router.get("/docs")
-def docs_page(request: Request, db: sqlite3.Connection = Depends(get_db)):
+def docs_page(request: Request, db: sqlite3.Connection = Depends(get_read_db)):
     if not request.session.get("user"):
         return RedirectResponse("/login", status_code=303)
 
-    _docs_table_exists(db)
     selected_slug = (request.query_params.get("doc") or "").strip().lower()
     query = (request.query_params.get("q") or "").strip().lower()
 
-    cur = db.cursor()
-    cur.execute(
-        """
-        SELECT slug, title, section, summary, content, tags, attachment_name, created_at, created_by
-        FROM docs_entries
-        WHERE is_published = 1
-        ORDER BY section COLLATE NOCASE, title COLLATE NOCASE
-        """
-    )
-    rows = cur.fetchall()
-    docs_entries = [dict(r) for r in rows]
-    if not docs_entries:
-        docs_entries = DEFAULT_DOCS
-
-    if query:
-        docs_entries = [
-            d for d in docs_entries
-            if query in (d.get("title") or "").lower()
-            or query in (d.get("summary") or "").lower()
-            or query in (d.get("content") or "").lower()
-            or query in (d.get("section") or "").lower()
-            or query in (d.get("tags") or "").lower()
-        ]
-
-    selected_doc = None
-    if selected_slug:
-        selected_doc = next((d for d in docs_entries if d.get("slug") == selected_slug), None)
-
-    section_counter = Counter((d.get("section") or "General") for d in docs_entries)
-    tag_counter = Counter()
-    for d in docs_entries:
-        raw_tags = d.get("tags") or ""
-        for tag in [t.strip() for t in raw_tags.split(",") if t.strip()]:
-            tag_counter[tag] += 1
+    catalog = docs_catalog.get(db, DEFAULT_DOCS)
+    if not query:
+        docs_entries = catalog["entries"]
+        section_counts, tag_counts = catalog["section_counts"], catalog["tag_counts"]
+    else:
+        if catalog["published"]:
+            # docs_fts (migration 11); rank is its configured weighted BM25
+            cur = db.cursor()
+            cur.execute(
+                """
+                SELECT d.slug, d.title, d.section, d.summary, d.tags,
+                       highlight(docs_fts, 0, ?, ?) AS title_marked,
+                       snippet(docs_fts, -1, ?, ?, '…', 16) AS snippet
+                FROM docs_fts
+                JOIN docs_entries d ON d.id = docs_fts.rowid
+                WHERE docs_fts MATCH ? AND d.is_published = 1
+                ORDER BY docs_fts.rank
+                LIMIT ?
+                """,
+                (
+                    fts.MARK_OPEN, fts.MARK_CLOSE, fts.MARK_OPEN, fts.MARK_CLOSE,
+                    fts.prefix_terms(query), DOCS_SEARCH_LIMIT
+                )
+            )
+            docs_entries = [dict(r) for r in cur.fetchall()]
+        else:
+            docs_entries = [d for d in catalog["entries"] if _default_doc_matches(d, query)]
+        section_counts, tag_counts = docs_catalog.summarize(docs_entries)
+
+    selected_doc = catalog["by_slug"].get(selected_slug) if selected_slug else None
 
     return templates.TemplateResponse(
         request=request,
@@ -263,11 +274,12 @@ def docs_page(request: Request, db: sqlite3.Connection = Depends(get_db)):
             "request": request,
             "user": request.session.get("user"),
             "docs_entries": docs_entries,
+            "nav": catalog["nav"],
             "selected_doc": selected_doc,
             "selected_slug": selected_slug,
             "search_query": query,
-            "section_counts": sorted(section_counter.items(), key=lambda x: x[0].lower()),
-            "tag_counts": sorted(tag_counter.items(), key=lambda x: x[0].lower()),
+            "section_counts": section_counts,
+            "tag_counts": tag_counts,
             "is_admin": bool(request.session.get("is_admin")),
             "upload_error": request.query_params.get("error")
         }
@@ -300,10 +312,6 @@ async def docs_upload(
     if not clean_title or not clean_content:
         return RedirectResponse("/docs?error=missing_required_fields", status_code=303)
 
-    _docs_table_exists(db)
-    base_slug = _slugify(clean_title)
-    slug = _ensure_unique_slug(db, base_slug)
-
     attachment_name = None
     if attachment and attachment.filename:
         ext = os.path.splitext(attachment.filename)[1].lower()
@@ -313,27 +321,26 @@ async def docs_upload(
         os.makedirs(DOCS_UPLOAD_DIR, exist_ok=True)
         attachment_name = f"{uuid.uuid4().hex}{ext}"
         target_path = os.path.join(DOCS_UPLOAD_DIR, attachment_name)
-        with open(target_path, "wb") as f:
-            f.write(await attachment.read())
-
-    cur = db.cursor()
-    cur.execute(
-        """
-        INSERT INTO docs_entries (slug, title, section, summary, content, tags, attachment_name, created_by)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            slug,
-            clean_title,
-            clean_section,
-            clean_summary,
-            clean_content,
-            clean_tags,
-            attachment_name,
-            request.session.get("email")
-        )
+        try:
+            await run_in_threadpool(copy_stream, attachment.file, target_path, MAX_DOCS_UPLOAD_BYTES)
+        except UploadTooLarge:
+            return RedirectResponse("/docs?error=file_too_large", status_code=303)
+
+    slug = await run_db(
+        _insert_doc,
+        db,
+        {
+            "title": clean_title,
+            "section": clean_section,
+            "summary": clean_summary,
+            "content": clean_content,
+            "tags": clean_tags,
+            "attachment_name": attachment_name,
+            "created_by": request.session.get("email"),
+        }
     )
-    db.commit()
+    # Other workers see the bumped cache_versions row; this one rebuilds now
+    docs_catalog.invalidate()
 
     return RedirectResponse(f"/docs?doc={slug}", status_code=303)
 
@@ -0,0 +1,73 @@
+import hashlib
+
+from config import ANALYSIS_CACHE_MAX_ENTRIES, PALETTE_ENGINE
+from fuzzy_emotion import ALGORITHM_VERSION, ANALYSIS_SIZE
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(content_sha256, k=5, size=ANALYSIS_SIZE, engine=None):
+    """Identify an analysis result by image content plus everything that affects it."""
+    engine = engine or PALETTE_ENGINE
+    return f"{content_sha256}:{ALGORITHM_VERSION}:{engine}:k={k}:size={size}"
+
+
+# Same text format as CURRENT_TIMESTAMP plus milliseconds, so rows stamped
+# before and after compare in order and LRU holds within a second
+NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+def get(db, key, commit=True):
+    """Return the cached metadata JSON text for ``key`` or None.
+
+    A hit refreshes the row's ``last_used_at``; pass ``commit=False`` when
+    calling inside a transaction the caller commits.
+    """
+    cur = db.cursor()
+    cur.execute("SELECT metadata FROM analysis_cache WHERE cache_key = ?", (key,))
+    row = cur.fetchone()
+    if not row:
+        return None
+
+    cur.execute(f"UPDATE analysis_cache SET last_used_at = {NOW} WHERE cache_key = ?", (key,))
+    if commit:
+        db.commit()
+    return row[0]
+
+
+def put(db, key, metadata_json, max_entries=None, commit=True):
+    """Store a result and evict the least recently used rows beyond the limit."""
+    max_entries = ANALYSIS_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+    cur = db.cursor()
+    cur.execute(
+        f"""
+        INSERT INTO analysis_cache (cache_key, metadata, last_used_at) VALUES (?, ?, {NOW})
+        ON CONFLICT(cache_key) DO UPDATE
+        SET metadata = excluded.metadata, last_used_at = excluded.last_used_at
+        """,
+        (key, metadata_json)
+    )
+
+    cur.execute("SELECT COUNT(*) FROM analysis_cache")
+    excess = cur.fetchone()[0] - max_entries
+    if excess > 0:
+        cur.execute(
+            """
+            DELETE FROM analysis_cache WHERE cache_key IN (
+                SELECT cache_key FROM analysis_cache
+                ORDER BY last_used_at, rowid
+                LIMIT ?
+            )
+            """,
+            (excess,)
+        )
+    if commit:
+        db.commit()
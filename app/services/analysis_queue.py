@@ -0,0 +1,151 @@
+import json
+import logging
+import multiprocessing
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from config import ANALYSIS_RESUME_WINDOW_SECONDS, ANALYSIS_WORKERS
+import db
+from app.services import analysis_cache, emotion_store, storage_service, thumbnail_service
+from fuzzy_emotion import analyze_image, warm_up
+
+logger = logging.getLogger("bhv.analysis")
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _analyze_file(path, out_dir=None, stem=None, analyze=True):
+    """Worker-process job: thumbnail and (optionally) analyse one file.
+
+    The file is decoded once; the thumbnail buffer is shrunk again for
+    analysis. Returns ``(metadata_json or None, thumbnails_json)``.
+    """
+    img, thumbs = thumbnail_service.generate_for_file(path, out_dir, stem)
+    metadata = json.dumps(analyze_image(thumbnail_service.analysis_input(img))) if analyze else None
+    return metadata, json.dumps(thumbs)
+
+
+def _run_analysis(image_id, path, db_path, cache_key=None, analyze=True):
+    """Worker-process job: run _analyze_file and store the result on the row.
+
+    With ``analyze=False`` (metadata came from the cache) only the
+    thumbnails are written.
+    """
+    metadata = thumbnails = None
+    status = "done"
+    try:
+        metadata, thumbnails = _analyze_file(path, analyze=analyze)
+    except Exception:
+        logger.exception("Error processing image %s", path)
+        status = "failed"
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        if analyze:
+            conn.execute(
+                "UPDATE images SET metadata=?, analysis_status=?, thumbnails=? WHERE id=?",
+                (metadata, status, thumbnails, image_id)
+            )
+            emotion_store.store(conn, image_id, metadata)
+        else:
+            conn.execute("UPDATE images SET thumbnails=? WHERE id=?", (thumbnails, image_id))
+        conn.commit()
+        if cache_key and metadata is not None:
+            analysis_cache.put(conn, cache_key, metadata)
+    finally:
+        conn.close()
+    return status
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: never fork a process that may hold OpenMP/BLAS thread state
+            _executor = ProcessPoolExecutor(
+                max_workers=ANALYSIS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=warm_up
+            )
+        return _executor
+
+
+def _reset_if_broken(future):
+    if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+        # Rows stay 'pending' and are picked up again by resume_pending
+        shutdown()
+
+
+def _log_failure(future):
+    if future.cancelled():
+        return
+    exc = future.exception()
+    if exc is not None:
+        logger.error("Background analysis job crashed: %s", exc)
+        _reset_if_broken(future)
+
+
+def submit(image_id, path, cache_key=None, analyze=True):
+    """Queue work for an ``images`` row inserted with analysis_status='pending'.
+
+    Pass ``analyze=False`` when the metadata is already stored (cache hit) and
+    only thumbnails are still needed.
+    """
+    future = _get_executor().submit(_run_analysis, image_id, str(path), db.DB_PATH, cache_key, analyze)
+    future.add_done_callback(_log_failure)
+    return future
+
+
+def submit_file(path, out_dir=None, stem=None, analyze=True):
+    """Queue _analyze_file for a file that has no ``images`` row yet.
+
+    The future resolves to ``(metadata_json, thumbnails_json)`` or raises
+    the worker's exception; nothing is written to the database.
+    """
+    future = _get_executor().submit(_analyze_file, str(path), out_dir, stem, analyze)
+    future.add_done_callback(_reset_if_broken)
+    return future
+
+
+def prewarm():
+    """Start every worker process now so the first upload skips the import cost."""
+    executor = _get_executor()
+    return [executor.submit(warm_up) for _ in range(ANALYSIS_WORKERS)]
+
+
+def resume_pending(conn, upload_dir=None, window=ANALYSIS_RESUME_WINDOW_SECONDS):
+    """Re-queue rows left pending by a previous process (e.g. after a restart).
+
+    Every server worker calls this on startup. Rows are claimed and stamped
+    in one write transaction, so only the first worker of a start re-queues
+    them; a claim older than ``window`` seconds is from an earlier start.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rows = conn.execute(
+            """
+            UPDATE images SET analysis_claimed_at = julianday('now')
+            WHERE analysis_status = 'pending'
+              AND (analysis_claimed_at IS NULL OR analysis_claimed_at < julianday('now') - ? / 86400.0)
+            RETURNING id, filename
+            """,
+            (window,)
+        ).fetchall()
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    for image_id, filename in rows:
+        submit(image_id, storage_service.blob_path(filename, upload_dir))
+    return len(rows)
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
@@ -0,0 +1,97 @@
+"""Process-wide cache of the published docs behind /docs.
+
+The catalog holds every published entry (by slug and in navigation
+order), the section tree and the section/tag counts, built once per
+change instead of on every request. Triggers from migration 12 bump
+``cache_versions.version`` for ``'docs'`` on any write to docs_entries,
+and every worker compares that counter with the version it built from.
+Within DOCS_CATALOG_RECHECK_SECONDS of the last check a hit does no
+database work at all; the worker that handled an upload calls
+invalidate() so its own next request rebuilds immediately.
+"""
+import threading
+import time
+from collections import Counter
+
+from config import DOCS_CATALOG_RECHECK_SECONDS
+
+_lock = threading.Lock()
+_cached = None  # {"version", "checked_at", "catalog"}
+
+
+def current_version(db):
+    row = db.execute("SELECT version FROM cache_versions WHERE name = 'docs'").fetchone()
+    return row[0] if row else 0
+
+
+def summarize(entries):
+    """``(section_counts, tag_counts)``, each sorted case-insensitively by name."""
+    section_counter = Counter((d.get("section") or "General") for d in entries)
+    tag_counter = Counter()
+    for d in entries:
+        raw_tags = d.get("tags") or ""
+        for tag in [t.strip() for t in raw_tags.split(",") if t.strip()]:
+            tag_counter[tag] += 1
+    return (
+        sorted(section_counter.items(), key=lambda x: x[0].lower()),
+        sorted(tag_counter.items(), key=lambda x: x[0].lower()),
+    )
+
+
+def _load(db):
+    cur = db.execute(
+        """
+        SELECT slug, title, section, summary, content, tags, attachment_name, created_at, created_by
+        FROM docs_entries
+        WHERE is_published = 1
+        ORDER BY section COLLATE NOCASE, title COLLATE NOCASE
+        """
+    )
+    return [dict(r) for r in cur.fetchall()]
+
+
+def build(entries, published=True):
+    section_counts, tag_counts = summarize(entries)
+    nav = {}
+    for d in entries:
+        nav.setdefault(d.get("section") or "General", []).append(d)
+    return {
+        "published": published,
+        "entries": entries,
+        "by_slug": {d["slug"]: d for d in entries},
+        "nav": sorted(nav.items(), key=lambda x: x[0].lower()),
+        "section_counts": section_counts,
+        "tag_counts": tag_counts,
+    }
+
+
+def get(db, defaults=()):
+    """The current catalog; ``defaults`` stand in while nothing is published.
+
+    Callers must treat the returned structure as read-only: it is shared
+    by every request until the next rebuild.
+    """
+    global _cached
+    now = time.monotonic()
+    cached = _cached
+    if cached and now - cached["checked_at"] < DOCS_CATALOG_RECHECK_SECONDS:
+        return cached["catalog"]
+
+    # Read the version before the rows: a write in between only causes an
+    # extra rebuild on the next check, never a stale catalog under a new version
+    version = current_version(db)
+    with _lock:
+        cached = _cached
+        if cached and cached["version"] == version:
+            cached["checked_at"] = now
+            return cached["catalog"]
+        entries = _load(db)
+        catalog = build(entries) if entries else build(list(defaults), published=False)
+        _cached = {"version": version, "checked_at": now, "catalog": catalog}
+        return catalog
+
+
+def invalidate():
+    global _cached
+    with _lock:
+        _cached = None
@@ -0,0 +1,105 @@
+"""Typed, indexed copies of the analysis results kept in ``images.metadata``.
+
+The JSON blob stays the source for display; store() mirrors the parts
+worth filtering and sorting on into ``images`` columns and one
+``image_palette`` row per palette entry. Every writer of
+``images.metadata`` calls it in the same transaction. Migration 8
+backfilled existing rows with the equivalent SQL.
+"""
+import json
+
+COLUMNS = (
+    "dominant_color",
+    "dominant_emotion",
+    "emotion_positive",
+    "emotion_neutral",
+    "emotion_negative",
+    "confidence",
+    "brightness",
+    "saturation",
+    "contrast",
+)
+
+_EMPTY = dict.fromkeys(COLUMNS)
+
+
+def _number(value):
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def derive(metadata_json):
+    """Split metadata JSON into ``(columns, palette_rows)``.
+
+    ``columns`` maps every name in COLUMNS to a value or None;
+    ``palette_rows`` are ``(position, color, weight, r, g, b, lab_distance)``.
+    Missing or unparseable metadata gives all-None columns and no rows.
+    Ties go to the earlier palette entry and the alphabetically first
+    emotion, as in the migration's SQL.
+    """
+    try:
+        meta = json.loads(metadata_json) if metadata_json else None
+    except (TypeError, ValueError):
+        meta = None
+    if not isinstance(meta, dict):
+        return dict(_EMPTY), []
+
+    palette_rows = []
+    palette = meta.get("palette")
+    for position, entry in enumerate(palette if isinstance(palette, list) else []):
+        if not isinstance(entry, dict) or not isinstance(entry.get("color"), str):
+            continue
+        rgb = entry.get("centroid_rgb")
+        rgb = list(rgb)[:3] if isinstance(rgb, list) and len(rgb) >= 3 else [None] * 3
+        palette_rows.append(
+            (position, entry["color"], _number(entry.get("weight")), *rgb, _number(entry.get("lab_distance")))
+        )
+
+    emotions = meta.get("emotion_space")
+    emotions = {
+        name: score for name, score in (emotions.items() if isinstance(emotions, dict) else ())
+        if _number(score) is not None
+    }
+    groups = meta.get("emotion_groups") if isinstance(meta.get("emotion_groups"), dict) else {}
+    stats = meta.get("visual_stats") if isinstance(meta.get("visual_stats"), dict) else {}
+    weighted = [row for row in palette_rows if row[2] is not None]
+
+    columns = {
+        "dominant_color": max(weighted, key=lambda row: row[2])[1] if weighted else None,
+        "dominant_emotion": min(emotions.items(), key=lambda kv: (-kv[1], kv[0]))[0] if emotions else None,
+        "emotion_positive": _number(groups.get("positive")),
+        "emotion_neutral": _number(groups.get("neutral")),
+        "emotion_negative": _number(groups.get("negative")),
+        "confidence": _number(meta.get("confidence")),
+        "brightness": _number(stats.get("avg_brightness")),
+        "saturation": _number(stats.get("avg_saturation")),
+        "contrast": _number(stats.get("contrast")),
+    }
+    return columns, palette_rows
+
+
+def store(db, image_id, metadata_json):
+    """Write the derived columns and palette rows for one image; the caller commits."""
+    columns, palette_rows = derive(metadata_json)
+    db.execute(
+        """
+        UPDATE images SET
+            dominant_color = ?, dominant_emotion = ?,
+            emotion_positive = ?, emotion_neutral = ?, emotion_negative = ?,
+            confidence = ?, brightness = ?, saturation = ?, contrast = ?
+        WHERE id = ?
+        """,
+        (*(columns[name] for name in COLUMNS), image_id)
+    )
+    db.execute("DELETE FROM image_palette WHERE image_id = ?", (image_id,))
+    db.executemany(
+        """
+        INSERT INTO image_palette (image_id, position, color, weight, r, g, b, lab_distance)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [(image_id, *row) for row in palette_rows]
+    )
+
+
+def forget(db, image_ids):
+    """Drop palette rows of deleted images; the caller commits."""
+    db.executemany("DELETE FROM image_palette WHERE image_id = ?", [(i,) for i in image_ids])
@@ -0,0 +1,29 @@
+"""Helpers for querying the FTS5 indexes created in migrations.py."""
+import re
+
+from markupsafe import Markup, escape
+
+# The trigram tokenizer indexes 3-character substrings; shorter queries match nothing
+MIN_TRIGRAM_CHARS = 3
+
+
+def phrase(text):
+    """``text`` as one quoted FTS5 phrase, so operators and quotes in it are literal."""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def prefix_terms(text):
+    """Every word of ``text`` as a quoted prefix phrase; FTS5 ANDs them together."""
+    return " ".join(phrase(word) + "*" for word in text.split())
+
+
+# Passed to highlight()/snippet() instead of HTML, so the indexed text can be
+# escaped before the markers become <mark> tags (see ``marked``)
+MARK_OPEN = "\x02"
+MARK_CLOSE = "\x03"
+_MARKS = re.compile(f"{MARK_OPEN}(.*?){MARK_CLOSE}", re.S)
+
+
+def marked(text):
+    """Jinja filter: escape ``text`` and turn highlight markers into <mark> tags."""
+    return Markup(_MARKS.sub(r"<mark>\1</mark>", str(escape(text or ""))))
@@ -1,44 +1,77 @@
-import uuid
-import json
-import shutil
 from pathlib import Path
-from fuzzy_emotion import detect_fuzzy_emotion
 from datetime import datetime
 
-UPLOAD_DIR = Path("static/uploads")
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+from app.services import analysis_cache, analysis_queue, emotion_store, normalize_service, storage_service
 
 
 def save_image(db, user, image, visibility):
     ext = Path(image.filename).suffix or ".jpg"
-    filename = f"{uuid.uuid4()}{ext}"
-    path = UPLOAD_DIR / filename
+    tmp_path, size, digest = storage_service.receive(image.file)
+    original_size = size
+    ext, size, digest = normalize_service.apply(tmp_path, ext, size, digest)
 
-    with open(path, "wb") as f:
-        shutil.copyfileobj(image.file, f)
+    filename = storage_service.blob_name(digest, ext)
 
-    # Get file size in KB
-    file_size_kb = path.stat().st_size / 1024
+    # Get file sizes in KB
+    file_size_kb = size / 1024
+    original_size_kb = original_size / 1024
 
-    metadata = detect_fuzzy_emotion(str(path))
     upload_date = datetime.now().isoformat()
 
-    db.execute(
-        "INSERT INTO images (user_name, filename, metadata, visibility, upload_date, file_size) VALUES (?, ?, ?, ?, ?, ?)",
-        (user, filename, json.dumps(metadata), visibility, upload_date, file_size_kb)
-    )
-    db.commit()
+    key = analysis_cache.cache_key(digest)
+
+    # The duplicate check and the insert share one write transaction
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        if storage_service.user_has(db, user, filename):
+            db.rollback()
+            storage_service.discard(tmp_path)
+            return filename
+        cached = analysis_cache.get(db, key, commit=False)
+        thumbnails = storage_service.add_ref(db, filename, size)
+        cur = db.execute(
+            "INSERT INTO images (user_name, filename, metadata, visibility, upload_date, file_size, original_file_size, analysis_status, thumbnails) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (user, filename, cached, visibility, upload_date, file_size_kb, original_size_kb, "done" if cached else "pending", thumbnails)
+        )
+        if cached:
+            emotion_store.store(db, cur.lastrowid, cached)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        storage_service.discard(tmp_path)
+        raise
+    place_upload(db, user, tmp_path, filename)
+
+    if cached is None or thumbnails is None:
+        analysis_queue.submit(
+            cur.lastrowid, storage_service.blob_path(filename), key, analyze=cached is None
+        )
+    return filename
 
 
 def delete_image(db, user, filename):
     safe_name = Path(filename).name
-    file_path = UPLOAD_DIR / safe_name
+
+    rows = db.execute(
+        "SELECT id, thumbnails FROM images WHERE filename=? AND user_name=?",
+        (safe_name, user)
+    ).fetchall()
 
     db.execute(
         "DELETE FROM images WHERE filename=? AND user_name=?",
         (safe_name, user)
     )
+    emotion_store.forget(db, [image_id for image_id, _ in rows])
+    orphaned = [thumbnails for _, thumbnails in rows if storage_service.release(db, safe_name)]
     db.commit()
+    for thumbnails in orphaned:
+        storage_service.purge(db, safe_name, thumbnails)
+
 
-    if file_path.exists():
-        file_path.unlink()
+def place_upload(db, user, tmp_path, filename):
+    """Move a committed upload into the blob store, deleting its row again if that fails."""
+    try:
+        storage_service.place(tmp_path, filename)
+    except OSError:
+        delete_image(db, user, filename)
+        raise
@@ -0,0 +1,87 @@
+import hashlib
+import io
+import os
+
+from PIL import Image, ImageOps
+
+from config import (
+    ANALYSIS_MAX_PIXELS,
+    NORMALIZE_MAX_EDGE,
+    NORMALIZE_QUALITY,
+    NORMALIZE_UPLOADS,
+)
+
+# Output format per "has transparency"; both take a quality setting
+_OPAQUE = ("JPEG", ".jpg")
+_ALPHA = ("WEBP", ".webp")
+
+
+def _has_alpha(img):
+    return img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+
+
+def normalize_file(path, max_edge=NORMALIZE_MAX_EDGE, quality=NORMALIZE_QUALITY):
+    """Re-encode the image at ``path`` in place, upright and without metadata.
+
+    EXIF orientation is applied, the long edge is capped at ``max_edge`` and
+    the result is written as JPEG (or WebP when it has transparency) with no
+    EXIF/XMP; the ICC profile is kept so colours do not shift. Returns
+    ``(ext, size_in_bytes, sha256_hex)``, or None when the file is left
+    untouched: animations, images over ANALYSIS_MAX_PIXELS, unreadable files,
+    and already-small files without metadata that would not shrink.
+    """
+    with Image.open(path) as img:
+        if getattr(img, "n_frames", 1) > 1 or img.width * img.height > ANALYSIS_MAX_PIXELS:
+            return None
+        has_metadata = bool(img.getexif()) or "xmp" in img.info
+        too_large = max(img.size) > max_edge
+        if not (has_metadata or too_large or img.format not in (_OPAQUE[0], _ALPHA[0])):
+            return None
+
+        # JPEG: let libjpeg decode at a reduced scale that still covers max_edge
+        img.draft(img.mode, (max_edge, max_edge))
+        out = ImageOps.exif_transpose(img)
+        icc_profile = img.info.get("icc_profile")
+
+    fmt, ext = _ALPHA if _has_alpha(out) else _OPAQUE
+    if out.mode not in ("RGB", "RGBA"):
+        # A CMYK or greyscale profile would mis-describe the converted pixels
+        icc_profile = None
+    out = out.convert("RGBA" if fmt == _ALPHA[0] else "RGB")
+    if max(out.size) > max_edge:
+        out.thumbnail((max_edge, max_edge), Image.LANCZOS, reducing_gap=3.0)
+
+    buf = io.BytesIO()
+    save_args = {"quality": quality}
+    if icc_profile:
+        save_args["icc_profile"] = icc_profile
+    if fmt == "JPEG":
+        save_args["optimize"] = True
+    out.save(buf, fmt, **save_args)
+    data = buf.getvalue()
+
+    if not (has_metadata or too_large) and len(data) >= os.path.getsize(path):
+        return None
+
+    tmp = f"{path}.norm"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return ext, len(data), hashlib.sha256(data).hexdigest()
+
+
+def apply(path, ext, size, digest):
+    """Upload-pipeline hook: normalize ``path`` when NORMALIZE_UPLOADS is on.
+
+    Returns the ``(ext, size, digest)`` to store the file under, which are
+    the inputs unchanged when normalization is off or skipped.
+    """
+    if not NORMALIZE_UPLOADS:
+        return ext, size, digest
+    try:
+        result = normalize_file(path)
+    except Exception as exc:
+        # Unreadable files are rejected by the caller's own image check
+        print(f"Skipping normalization of {path}: {exc}")
+        return ext, size, digest
+    return result or (ext, size, digest)
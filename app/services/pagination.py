@@ -0,0 +1,60 @@
+"""Opaque keyset cursors for paginated listings.
+
+A cursor is the sort key of the last row on a page, e.g. ``(upload_date, id)``,
+as URL-safe base64 JSON. Listings fetch ``size + 1`` rows past the cursor
+(``(upload_date, id) < (?, ?)`` for newest-first, ``>`` for A-Z), so every
+page is an index range seek however deep it is, and the extra row tells
+whether there is a next page.
+"""
+import base64
+import binascii
+import json
+
+# Start keys for the first page: NEWEST sorts after every stored upload_date
+# and id, FIRST before every name and id, BEST_RANK before every FTS5 rank
+# (bm25 scores are negative; lower is better)
+NEWEST = ("\uffff", 2 ** 63 - 1)
+FIRST = ("", -1)
+BEST_RANK = (float("-inf"), -1)
+
+
+def encode_cursor(key):
+    raw = json.dumps(list(key), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token, start):
+    """The key in ``token``, or ``start`` when it is missing or malformed.
+
+    A usable key has the same length and value types as ``start``.
+    """
+    if not token:
+        return start
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        key = tuple(json.loads(raw))
+    except (binascii.Error, ValueError, TypeError):
+        return start
+    if len(key) != len(start) or any(type(v) is not type(s) for v, s in zip(key, start)):
+        return start
+    return key
+
+
+def split_page(rows, size, key):
+    """``(rows[:size], next_cursor or None)`` for rows fetched with LIMIT size + 1."""
+    if len(rows) <= size:
+        return rows, None
+    rows = rows[:size]
+    return rows, encode_cursor(key(rows[-1]))
+
+
+def links(request, next_cursor):
+    """Template context for components/pager.html, keeping the other query parameters."""
+    def url(u):
+        return f"{u.path}?{u.query}" if u.query else u.path
+
+    return {
+        "first_url": url(request.url.remove_query_params("cursor")),
+        "next_url": url(request.url.include_query_params(cursor=next_cursor)) if next_cursor else None,
+        "paged": "cursor" in request.query_params,
+    }
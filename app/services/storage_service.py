@@ -0,0 +1,138 @@
+import os
+import uuid
+
+from app.services.thumbnail_service import remove_thumbnails
+from app.services.upload_service import copy_stream
+from config import MAX_UPLOAD_BYTES
+
+UPLOAD_DIR = os.path.join("static", "uploads")
+UPLOAD_URL = "/static/uploads"
+
+
+def blob_name(digest, ext):
+    """Stored name of an upload: its SHA-256 plus the lower-cased extension."""
+    return f"{digest}{ext.lower()}"
+
+
+def shard(name):
+    """Two levels of 256 directories keyed on the leading hex of the name."""
+    return name[:2], name[2:4]
+
+
+def blob_path(name, root=None):
+    """Filesystem path of a stored upload or one of its thumbnails."""
+    return os.path.join(root or UPLOAD_DIR, *shard(name), name)
+
+
+def upload_url(name):
+    """Public URL of a stored upload or thumbnail (Jinja filter ``upload_url``)."""
+    return "/".join((UPLOAD_URL, *shard(name), name))
+
+
+def receive(src, max_bytes=MAX_UPLOAD_BYTES):
+    """Stream an upload into a temporary file next to the blob store.
+
+    Returns ``(tmp_path, size, sha256_hex)``; hand the path to place() or
+    discard(). Raises UploadTooLarge like copy_stream.
+    """
+    # Same filesystem as the blobs, so place() can move it with os.replace
+    incoming = os.path.join(UPLOAD_DIR, ".incoming")
+    os.makedirs(incoming, exist_ok=True)
+    tmp_path = os.path.join(incoming, f"{uuid.uuid4().hex}.part")
+    size, digest = copy_stream(src, tmp_path, max_bytes)
+    return tmp_path, size, digest
+
+
+def discard(tmp_path):
+    try:
+        os.remove(tmp_path)
+    except OSError:
+        pass
+
+
+def user_has(db, user, name):
+    cur = db.execute(
+        "SELECT 1 FROM images WHERE user_name=? AND filename=? LIMIT 1", (user, name)
+    )
+    return cur.fetchone() is not None
+
+
+def add_ref(db, name, size):
+    """Take a reference on blob ``name`` inside the caller's transaction.
+
+    The caller inserts the images row and commits, then calls place() to
+    move the received file into the store; no file moves before the
+    commit, so a rollback leaves nothing behind. Returns the thumbnails
+    JSON of an existing row for the same blob, or None.
+    """
+    db.execute(
+        """
+        INSERT INTO blobs (name, size, refcount) VALUES (?, ?, 1)
+        ON CONFLICT(name) DO UPDATE SET refcount = refcount + 1
+        """,
+        (name, size)
+    )
+    return shared_thumbnails(db, name)
+
+
+def place(tmp_path, name):
+    """Move ``tmp_path`` into the store as ``name`` once its add_ref() has committed.
+
+    purge() unlinks only under the write lock and while no blobs row
+    exists, so once add_ref() has committed the blob cannot disappear
+    underneath us. The temp file is discarded on failure too.
+    """
+    path = blob_path(name)
+    try:
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+    finally:
+        discard(tmp_path)
+
+
+def shared_thumbnails(db, name):
+    """Thumbnails JSON already generated for blob ``name`` by another row, or None."""
+    row = db.execute(
+        "SELECT thumbnails FROM images WHERE filename=? AND thumbnails IS NOT NULL LIMIT 1",
+        (name,)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def release(db, name):
+    """Drop one reference to ``name`` inside the caller's transaction.
+
+    Runs after the images row is deleted. Returns True when that was the
+    last reference; the caller then commits and calls purge().
+    """
+    db.execute("UPDATE blobs SET refcount = refcount - 1 WHERE name=?", (name,))
+    row = db.execute("SELECT refcount FROM blobs WHERE name=?", (name,)).fetchone()
+    if row is None or row[0] > 0:
+        return False
+
+    db.execute("DELETE FROM blobs WHERE name=?", (name,))
+    return True
+
+
+def purge(db, name, thumbnails_json=None):
+    """Remove the file and thumbnails of a blob whose release() has committed.
+
+    Takes the write lock and unlinks only while no blobs row exists, so an
+    add_ref() committed meanwhile keeps the file. Returns True when the
+    blob was removed.
+    """
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        if db.execute("SELECT 1 FROM blobs WHERE name=?", (name,)).fetchone():
+            return False
+        path = blob_path(name)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        remove_thumbnails(os.path.dirname(path), thumbnails_json)
+        return True
+    finally:
+        db.commit()
@@ -0,0 +1,81 @@
+import json
+import os
+
+from PIL import Image
+
+from config import THUMBNAIL_QUALITY, THUMBNAIL_WIDTHS
+from fuzzy_emotion import ANALYSIS_SIZE, load_analysis_image, shrink_to
+
+# Decoding at this size serves every thumbnail and the analysis buffer
+DECODE_SIZE = max(ANALYSIS_SIZE, *THUMBNAIL_WIDTHS)
+
+
+def thumbnail_name(stem, width):
+    return f"{stem}_{width}.webp"
+
+
+def make_thumbnails(img, stem, out_dir, widths=THUMBNAIL_WIDTHS, quality=THUMBNAIL_QUALITY,
+                    source_size=None):
+    """Write WebP thumbnails of a decoded RGB image.
+
+    Widths are produced largest first, each one shrunk from the previous, and
+    sizes the original does not exceed are skipped rather than upscaled; pass
+    its ``source_size`` when ``img`` was decoded smaller. Returns
+    ``[[actual_width, filename], ...]`` sorted by width.
+    """
+    longest = max(source_size or img.size)
+    thumbs = []
+    current = img
+    for width in sorted(widths, reverse=True):
+        if longest <= width:
+            continue
+        current = shrink_to(current, width)
+        name = thumbnail_name(stem, width)
+        current.save(os.path.join(out_dir, name), "WEBP", quality=quality, method=4)
+        thumbs.append([current.width, name])
+    return sorted(thumbs)
+
+
+def decode(path):
+    """Decode ``path`` once for both thumbnails and analysis."""
+    return load_analysis_image(path, size=DECODE_SIZE)
+
+
+def analysis_input(img):
+    """The analysis buffer for an image returned by decode().
+
+    Every path that feeds analysis_cache (upload workers, reanalyze.py) goes
+    through decode() and this, so one cache key always means one resampling.
+    """
+    return shrink_to(img)
+
+
+def load_for_analysis(path):
+    """decode() plus analysis_input(), for callers that need no thumbnails."""
+    return analysis_input(decode(path))
+
+
+def generate_for_file(path, out_dir=None, stem=None):
+    """Decode ``path`` once and write its thumbnails; returns (decoded image, thumbnails).
+
+    Thumbnails go next to ``path`` and are named after it unless ``out_dir``
+    / ``stem`` say otherwise (batch uploads analyse the file before it is
+    moved into the blob store).
+    """
+    with Image.open(path) as header:
+        source_size = header.size
+    img = decode(path)
+    stem = stem or os.path.splitext(os.path.basename(path))[0]
+    out_dir = out_dir or os.path.dirname(path)
+    os.makedirs(out_dir, exist_ok=True)
+    # decode() stops at the largest width, so judge the skips by the original
+    return img, make_thumbnails(img, stem, out_dir, source_size=source_size)
+
+
+def remove_thumbnails(directory, thumbnails_json):
+    """Delete the thumbnails listed in ``thumbnails_json`` from ``directory``."""
+    for _, name in json.loads(thumbnails_json or "[]"):
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
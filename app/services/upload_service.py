@@ -0,0 +1,41 @@
+import hashlib
+import os
+
+from config import UPLOAD_CHUNK_SIZE
+
+
+class UploadTooLarge(Exception):
+    """Raised once an upload grows past its per-file byte limit."""
+
+    def __init__(self, limit):
+        super().__init__(f"Upload exceeds the {limit} byte limit")
+        self.limit = limit
+
+
+def copy_stream(src, path, max_bytes, chunk_size=UPLOAD_CHUNK_SIZE):
+    """Copy a file object to ``path`` chunk by chunk, hashing as it goes.
+
+    Returns ``(size_in_bytes, sha256_hex)``. If more than ``max_bytes`` arrive
+    the partial file is removed and UploadTooLarge is raised. Blocking: call
+    it through run_in_threadpool from async handlers.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, "wb") as out:
+            while True:
+                chunk = src.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise
+    return size, digest.hexdigest()
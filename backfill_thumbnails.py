@@ -0,0 +1,83 @@
+"""Generate WebP thumbnails for images uploaded before thumbnails existed.
+
+Rows with no ``thumbnails`` value are processed in id order across a
+process pool, one batch per transaction. Re-running picks up whatever is
+still missing:
+
+    python backfill_thumbnails.py
+    python backfill_thumbnails.py --workers 4 --batch-size 100
+"""
+import argparse
+import json
+import multiprocessing
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from config import ANALYSIS_WORKERS
+from db import DB_PATH
+from app.services import storage_service, thumbnail_service
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate missing WebP thumbnails for stored images.")
+    parser.add_argument("--workers", type=int, default=ANALYSIS_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=50)
+    return parser.parse_args(argv)
+
+
+def iter_batches(conn, batch_size):
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, filename FROM images WHERE thumbnails IS NULL AND id > ? ORDER BY id LIMIT ?",
+            (last_id, batch_size)
+        ).fetchall()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def generate(path):
+    """Worker job: return (thumbnails_json, error)."""
+    try:
+        _, thumbs = thumbnail_service.generate_for_file(path)
+        return json.dumps(thumbs), None
+    except Exception as exc:
+        return None, str(exc)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    done = failed = 0
+    try:
+        # spawn, like analysis_queue: workers start clean instead of inheriting
+        # this process's open SQLite connection and loaded modules
+        pool = ProcessPoolExecutor(
+            max_workers=args.workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        with pool:
+            for rows in iter_batches(conn, args.batch_size):
+                paths = [storage_service.blob_path(filename) for _, filename in rows]
+                updates = []
+                for (image_id, filename), (thumbnails, error) in zip(rows, pool.map(generate, paths)):
+                    if error:
+                        failed += 1
+                        print(f"  {image_id} {filename}: {error}", file=sys.stderr)
+                        continue
+                    updates.append((thumbnails, image_id))
+                with conn:
+                    conn.executemany("UPDATE images SET thumbnails = ? WHERE id = ?", updates)
+                done += len(updates)
+                print(f"Processed through id {rows[-1][0]}: {done} updated, {failed} failed")
+    finally:
+        conn.close()
+
+    print(f"Finished: {done} updated, {failed} failed")
+    return 0 if not failed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
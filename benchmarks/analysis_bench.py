@@ -0,0 +1,207 @@
+"""Benchmark detect_fuzzy_emotion across image sizes, formats, content and engines.
+
+Synthetic images are generated once into a temporary directory. Every case
+runs in a freshly spawned worker (after fuzzy_emotion.warm_up()) and its
+peak RSS is reported as the growth over that warmed-up baseline.
+
+    python benchmarks/analysis_bench.py --output bench.json
+    python benchmarks/analysis_bench.py --quick --compare bench.json
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fuzzy_emotion  # noqa: E402
+
+SIZES = {
+    "thumb": (160, 120),
+    "hd": (1280, 720),
+    "fhd": (1920, 1080),
+    "4k": (3840, 2160),
+    "8k": (7680, 4320),
+}
+FORMATS = {"jpeg": ".jpg", "png": ".png", "webp": ".webp", "gif": ".gif"}
+CONTENTS = ("flat", "noisy")
+STAGES = ("decode", "resize", "palette", "naming", "visual_stats")
+SPAWN = multiprocessing.get_context("spawn")
+
+
+def make_image(path, size, content, fmt):
+    w, h = size
+    if content == "flat":
+        arr = np.empty((h, w, 3), dtype=np.uint8)
+        arr[:, : w // 2] = (30, 144, 255)
+        arr[:, w // 2:] = (255, 215, 0)
+    else:
+        arr = np.random.default_rng(0).integers(0, 256, size=(h, w, 3), dtype=np.uint8)
+    img = Image.fromarray(arr)
+    if fmt == "gif":
+        img = img.quantize(256)
+    img.save(path, quality=90) if fmt in ("jpeg", "webp") else img.save(path)
+
+
+def _percentiles(values):
+    ordered = sorted(values)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {
+        "p50": round(statistics.median(ordered) * 1000, 3),
+        "p95": round(pick(0.95) * 1000, 3),
+        "max": round(ordered[-1] * 1000, 3),
+    }
+
+
+def _rss_kb(field):
+    """Read VmRSS / VmHWM (kB) on Linux; fall back to ru_maxrss elsewhere."""
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _reset_peak_rss():
+    # ru_maxrss survives fork+exec, so a spawned worker would inherit the
+    # parent's high-water mark; writing 5 to clear_refs resets VmHWM.
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def run_case(path, engine, repeat):
+    """Worker job: warm up, then time ``repeat`` analyses of one image."""
+    warnings.filterwarnings("ignore")  # sklearn ConvergenceWarning on flat images
+    fuzzy_emotion.warm_up()
+    _reset_peak_rss()
+    baseline_kb = _rss_kb("VmRSS")
+
+    per_stage = {stage: [] for stage in STAGES}
+    totals = []
+    for _ in range(repeat):
+        timings = {}
+        fuzzy_emotion.detect_fuzzy_emotion(path, palette_engine=engine, timings=timings)
+        for stage in STAGES:
+            per_stage[stage].append(timings.get(stage, 0.0))
+        totals.append(sum(timings.values()))
+
+    peak_kb = _rss_kb("VmHWM")
+    return {
+        "stages_ms": {stage: _percentiles(v) for stage, v in per_stage.items()},
+        "total_ms": _percentiles(totals),
+        "peak_rss_growth_mb": round((peak_kb - baseline_kb) / 1024, 1),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    old = {r["case"]: r for r in baseline["results"]}
+    print(f"\nvs {baseline_path} (commit {baseline['meta'].get('commit')})")
+    for r in current["results"]:
+        prev = old.get(r["case"])
+        if not prev:
+            continue
+        before, after = prev["total_ms"]["p50"], r["total_ms"]["p50"]
+        ratio = after / before if before else float("inf")
+        print(f"  {r['case']:36s} p50 {before:9.1f} -> {after:9.1f} ms  x{ratio:5.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", choices=SIZES, default=list(SIZES))
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--contents", nargs="+", choices=CONTENTS, default=list(CONTENTS))
+    parser.add_argument("--engines", nargs="+", choices=fuzzy_emotion.PALETTE_ENGINES,
+                        default=[fuzzy_emotion.PALETTE_ENGINE])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--quick", action="store_true", help="thumb + fhd, jpeg + png, 3 repeats")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--compare", help="earlier JSON output to compare p50 totals against")
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.sizes, args.formats, args.repeat = ["thumb", "fhd"], ["jpeg", "png"], 3
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": datetime.datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pillow": Image.__version__,
+            "algorithm": fuzzy_emotion.ALGORITHM_VERSION,
+            "repeat": args.repeat,
+        },
+        "results": [],
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_name in args.sizes:
+            for fmt in args.formats:
+                for content in args.contents:
+                    path = os.path.join(tmp, f"{size_name}-{content}{FORMATS[fmt]}")
+                    make_image(path, SIZES[size_name], content, fmt)
+                    for engine in args.engines:
+                        # A freshly spawned process per case: a clean RSS high-water mark
+                        with ProcessPoolExecutor(max_workers=1, mp_context=SPAWN) as pool:
+                            result = pool.submit(run_case, path, engine, args.repeat).result()
+                        case = f"{size_name}/{fmt}/{content}/{engine}"
+                        report["results"].append({
+                            "case": case,
+                            "size": list(SIZES[size_name]),
+                            "format": fmt,
+                            "content": content,
+                            "engine": engine,
+                            "file_bytes": os.path.getsize(path),
+                            **result,
+                        })
+                        stages = "  ".join(
+                            f"{s}={result['stages_ms'][s]['p50']:.1f}" for s in STAGES
+                        )
+                        print(
+                            f"{case:36s} p50 {result['total_ms']['p50']:9.1f} ms  "
+                            f"p95 {result['total_ms']['p95']:9.1f} ms  "
+                            f"+{result['peak_rss_growth_mb']:6.1f} MB  {stages}"
+                        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
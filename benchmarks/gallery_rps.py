@@ -0,0 +1,183 @@
+"""Requests per second on GET /gallery with and without the SQLite pools.
+
+A throwaway database is seeded with one user's images, then the app is
+served by uvicorn once per mode and hammered by client threads while
+optional writer threads keep updating narratives:
+
+    legacy  a new sqlite3.connect per dependency, rollback journal
+    pooled  db.get_db / db.get_read_db pools, WAL and tuned pragmas
+
+    python benchmarks/gallery_rps.py --duration 10 --clients 8 --writers 1
+"""
+import argparse
+import base64
+import json
+import os
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+from itsdangerous import TimestampSigner
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = ("legacy", "pooled")
+SECRET = "gallery-bench"
+USER = "bench@example.com"
+
+
+def create_app():
+    """uvicorn --factory target; BENCH_DB_MODE picks the connection strategy."""
+    import db
+    from main import app
+
+    if os.environ.get("BENCH_DB_MODE") == "legacy":
+        conn = sqlite3.connect(db.DB_PATH)
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.close()
+
+        def legacy_get_db():
+            conn = sqlite3.connect(db.DB_PATH, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            try:
+                yield conn
+            finally:
+                conn.close()
+
+        app.dependency_overrides[db.get_db] = legacy_get_db
+        app.dependency_overrides[db.get_read_db] = legacy_get_db
+    return app
+
+
+def seed(db_path, images):
+    env = {**os.environ, "BHV_DB_PATH": db_path}
+    subprocess.run([sys.executable, "-c", "import db; db.init_db()"], cwd=ROOT, env=env, check=True)
+    meta = json.dumps({"algorithm": "fuzzy-color-v2", "palette": [{"color": "blue", "weight": 1.0}]})
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO users (name, email) VALUES (?, ?)", ("Bench", USER))
+    conn.executemany(
+        "INSERT INTO images (user_name, filename, metadata, analysis_status) VALUES (?, ?, ?, 'done')",
+        [(USER, f"{i:064x}.png", meta) for i in range(images)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def session_cookie():
+    # Same encoding as starlette.middleware.sessions.SessionMiddleware
+    data = base64.b64encode(json.dumps({"email": USER}).encode("utf-8"))
+    return TimestampSigner(SECRET).sign(data).decode("utf-8")
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/health").status_code == 200:
+                return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def run_mode(mode, db_path, args):
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "BHV_DB_PATH": db_path, "BENCH_DB_MODE": mode, "SECRET_KEY": SECRET}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "--factory", "benchmarks.gallery_rps:create_app",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env
+    )
+    try:
+        _wait_ready(url)
+        cookies = {"session": session_cookie()}
+        stop = time.monotonic() + args.duration
+        latencies, errors, writes = [], [0], [0]
+        lock = threading.Lock()
+
+        def reader():
+            with httpx.Client(base_url=url, cookies=cookies) as client:
+                while time.monotonic() < stop:
+                    t = time.perf_counter()
+                    res = client.get("/gallery")
+                    elapsed = time.perf_counter() - t
+                    with lock:
+                        if res.status_code == 200:
+                            latencies.append(elapsed)
+                        else:
+                            errors[0] += 1
+
+        def writer():
+            with httpx.Client(base_url=url, cookies=cookies) as client:
+                i = 0
+                while time.monotonic() < stop:
+                    client.post("/update-narrative", data={
+                        "filename": f"{i % args.images:064x}.png", "narrative": f"note {i}"
+                    })
+                    i += 1
+                    with lock:
+                        writes[0] += 1
+
+        threads = [threading.Thread(target=reader) for _ in range(args.clients)]
+        threads += [threading.Thread(target=writer) for _ in range(args.writers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    ordered = sorted(latencies)
+    return {
+        "rps": round(len(latencies) / args.duration, 1),
+        "p50_ms": round(statistics.median(ordered) * 1000, 2) if ordered else None,
+        "p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))] * 1000, 2) if ordered else None,
+        "errors": errors[0],
+        "writes_per_s": round(writes[0] / args.duration, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=1)
+    parser.add_argument("--images", type=int, default=200, help="gallery size for the bench user")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    report = {"config": vars(args), "results": {}}
+    for mode in args.modes:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "bench.db")
+            seed(db_path, args.images)
+            result = run_mode(mode, db_path, args)
+        report["results"][mode] = result
+        print(
+            f"{mode:7s} {result['rps']:8.1f} req/s  p50 {result['p50_ms']} ms  "
+            f"p95 {result['p95_ms']} ms  errors {result['errors']}  writes {result['writes_per_s']}/s"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
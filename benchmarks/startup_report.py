@@ -0,0 +1,69 @@
+"""Measure cold import time and RSS of the web app modules.
+
+Each target is imported in a fresh interpreter so caches from earlier
+imports do not leak between measurements.
+
+    python benchmarks/startup_report.py [--repeat 5] [--json out.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = {
+    "gallery_router": "import app.routers.gallery",
+    "main_app": "import main",
+    "warm_analysis": "import fuzzy_emotion; fuzzy_emotion.warm_up()",
+}
+
+PROBE = """
+import resource, sys, time
+t = time.perf_counter()
+exec(sys.argv[1])
+elapsed = time.perf_counter() - t
+heavy = sorted(m for m in ("sklearn", "skimage", "scipy") if m in sys.modules)
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(elapsed, rss_kb, ",".join(heavy), sep="|")
+"""
+
+
+def measure(statement):
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE, statement],
+        cwd=ROOT, check=True, capture_output=True, text=True
+    ).stdout.strip().splitlines()[-1]
+    elapsed, rss_kb, heavy = out.split("|")
+    return float(elapsed), int(rss_kb) / 1024, heavy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    report = {}
+    for name, statement in TARGETS.items():
+        runs = [measure(statement) for _ in range(args.repeat)]
+        report[name] = {
+            "import_seconds_median": round(statistics.median(r[0] for r in runs), 4),
+            "max_rss_mb_median": round(statistics.median(r[1] for r in runs), 1),
+            "heavy_modules_loaded": runs[-1][2].split(",") if runs[-1][2] else [],
+        }
+        print(
+            f"{name:16s} {report[name]['import_seconds_median']:8.3f}s "
+            f"{report[name]['max_rss_mb_median']:8.1f} MB  "
+            f"heavy: {', '.join(report[name]['heavy_modules_loaded']) or '-'}"
+        )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
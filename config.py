@@ -20,4 +20,72 @@ if IS_RENDER:
 
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 7))
-JWT_ALGORITHM = "HS256"
\ No newline at end of file
+JWT_ALGORITHM = "HS256"
+
+# Palette extraction for detect_fuzzy_emotion: kmeans, minibatch_kmeans, median_cut, octree or histogram
+PALETTE_ENGINE = os.getenv("PALETTE_ENGINE", "kmeans")
+
+# Worker processes running detect_fuzzy_emotion for uploads in the background
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", 2))
+
+# Upper bound on rows kept in the analysis_cache table (least recently used are evicted)
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", 10000))
+
+# RGB -> color name lookup table used by fuzzy_emotion.name_colors (bins per channel must divide 256)
+COLOR_LUT_BINS = int(os.getenv("COLOR_LUT_BINS", 64))
+COLOR_LUT_CACHE_DIR = os.getenv("COLOR_LUT_CACHE_DIR", ".cache")
+
+# Start and warm the analysis worker processes at application startup
+ANALYSIS_PREWARM = os.getenv("ANALYSIS_PREWARM", "false").lower() in {"1", "true", "yes", "on"}
+
+# Pending analyses are re-queued by the first server worker to start; a claim older
+# than this many seconds is from an earlier start and is taken over
+ANALYSIS_RESUME_WINDOW_SECONDS = int(os.getenv("ANALYSIS_RESUME_WINDOW_SECONDS", 60))
+
+# Images with more pixels than this are rejected by detect_fuzzy_emotion before decoding
+ANALYSIS_MAX_PIXELS = int(os.getenv("ANALYSIS_MAX_PIXELS", 80_000_000))
+
+# Per-file upload limits (bytes) and the chunk size used to stream uploads to disk
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 25 * 1024 * 1024))
+MAX_DOCS_UPLOAD_BYTES = int(os.getenv("MAX_DOCS_UPLOAD_BYTES", 10 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+
+# POST /upload/batch: files per request and total request body size (bytes)
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", 50))
+MAX_BATCH_UPLOAD_BYTES = int(os.getenv("MAX_BATCH_UPLOAD_BYTES", 250 * 1024 * 1024))
+
+# WebP thumbnails written next to each upload (long edge in pixels) for the gallery srcset
+THUMBNAIL_WIDTHS = tuple(int(w) for w in os.getenv("THUMBNAIL_WIDTHS", "160,320,640").split(","))
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", 80))
+
+# Cache-Control for /static files other than uploads (which are immutable); CSS/JS
+# are not fingerprinted, so the default makes browsers revalidate via ETag
+STATIC_CACHE_CONTROL = os.getenv("STATIC_CACHE_CONTROL", "no-cache")
+
+# Optional upload normalization: apply EXIF orientation, strip metadata, cap the long
+# edge and re-encode before storing (images.original_file_size keeps the as-uploaded size)
+NORMALIZE_UPLOADS = os.getenv("NORMALIZE_UPLOADS", "false").lower() in {"1", "true", "yes", "on"}
+NORMALIZE_MAX_EDGE = int(os.getenv("NORMALIZE_MAX_EDGE", 2560))
+NORMALIZE_QUALITY = int(os.getenv("NORMALIZE_QUALITY", 85))
+
+# SQLite connection pools used by db.get_db / db.get_read_db (idle connections kept),
+# per-connection page cache (KiB), memory-mapped I/O size (bytes) and statement cache
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", 8))
+DB_WRITE_POOL_SIZE = int(os.getenv("DB_WRITE_POOL_SIZE", 2))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", 16 * 1024))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", 128 * 1024 * 1024))
+DB_STATEMENT_CACHE = int(os.getenv("DB_STATEMENT_CACHE", 256))
+# Threads behind db.run_db, which async handlers await instead of querying on the event loop
+DB_EXECUTOR_THREADS = int(os.getenv("DB_EXECUTOR_THREADS", 8))
+
+# Keyset pagination (see app.services.pagination): rows per page on /gallery, /search and
+# the admin user gallery, users per admin dashboard page, and how many users a search matches
+GALLERY_PAGE_SIZE = int(os.getenv("GALLERY_PAGE_SIZE", 30))
+ADMIN_PAGE_SIZE = int(os.getenv("ADMIN_PAGE_SIZE", 50))
+SEARCH_MAX_USERS = int(os.getenv("SEARCH_MAX_USERS", 200))
+
+# Most /docs?q= results returned, best BM25 matches first
+DOCS_SEARCH_LIMIT = int(os.getenv("DOCS_SEARCH_LIMIT", 50))
+# How long a worker serves its cached docs catalog before re-reading the shared
+# version counter (app.services.docs_catalog); 0 checks on every request
+DOCS_CATALOG_RECHECK_SECONDS = float(os.getenv("DOCS_CATALOG_RECHECK_SECONDS", 2))
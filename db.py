@@ -1,125 +1,164 @@
+import asyncio
+import functools
+import queue
 import sqlite3
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import migrations
+
+from config import (
+    DB_CACHE_SIZE_KB,
+    DB_EXECUTOR_THREADS,
+    DB_MMAP_SIZE,
+    DB_READ_POOL_SIZE,
+    DB_STATEMENT_CACHE,
+    DB_WRITE_POOL_SIZE,
+)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "users.db")
+DB_PATH = os.getenv("BHV_DB_PATH", os.path.join(BASE_DIR, "users.db"))
+
+# Applied to every pooled connection. WAL lets readers run alongside the one
+# writer; NORMAL sync is durable in WAL mode except across power loss.
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}",
+    f"PRAGMA mmap_size = {DB_MMAP_SIZE}",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+
+
+class ConnectionPool:
+    """A LIFO pool of configured connections to one database file.
+
+    Up to ``size`` idle connections are kept; when all are checked out a
+    new one is opened and closed again on release instead of blocking.
+    Read pools open connections with ``query_only`` so a write through them
+    fails loudly instead of bypassing the write pool.
+    """
+
+    def __init__(self, path, size, readonly=False):
+        self.path = path
+        self.readonly = readonly
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            cached_statements=DB_STATEMENT_CACHE
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        if self.readonly:
+            conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn):
+        try:
+            # Uncommitted work is discarded, as closing a connection would
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = sqlite3.Row
+            self._idle.put_nowait(conn)
+        except (queue.Full, sqlite3.Error):
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(readonly=False):
+    """The shared read or write pool for the current DB_PATH."""
+    key = (DB_PATH, readonly)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            size = DB_READ_POOL_SIZE if readonly else DB_WRITE_POOL_SIZE
+            pool = _pools[key] = ConnectionPool(DB_PATH, size, readonly=readonly)
+        return pool
+
+
+def close_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
 
 
 def get_db():
-    db = sqlite3.connect(
-        DB_PATH,
-        check_same_thread=False
-    )
-    db.row_factory = sqlite3.Row
-    try:
+    """FastAPI dependency: a pooled connection that may write."""
+    with get_pool().connection() as db:
         yield db
-    finally:
-        db.close()
 
 
-def init_db():
-    db = sqlite3.connect(DB_PATH)
-    db.execute("PRAGMA foreign_keys = ON;")
-    cur = db.cursor()
-
-    # ===== USERS TABLE (with migration safety) =====
-    row = cur.execute(
-        "SELECT sql FROM sqlite_master WHERE type='table' AND name='users'"
-    ).fetchone()
-
-    if row and row[0] and "name TEXT UNIQUE" in row[0]:
-        cur.executescript(
-            """
-            PRAGMA foreign_keys=off;
-            CREATE TABLE IF NOT EXISTS users_mig (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT,
-                email TEXT UNIQUE NOT NULL,
-                password TEXT,
-                is_private INTEGER DEFAULT 0
-            );
-            INSERT OR IGNORE INTO users_mig (id, name, email, password, is_private)
-                SELECT id, name, email, password, is_private FROM users;
-            DROP TABLE users;
-            ALTER TABLE users_mig RENAME TO users;
-            PRAGMA foreign_keys=on;
-            """
-        )
+def get_read_db():
+    """FastAPI dependency: a pooled read-only connection for GET handlers."""
+    with get_pool(readonly=True).connection() as db:
+        yield db
 
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            email TEXT UNIQUE NOT NULL,
-            password TEXT,
-            is_private INTEGER DEFAULT 0
-        )
-        """
-    )
-
-    cur.execute(
-        "CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);"
-    )
-
-    # ===== IMAGES TABLE =====
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS images (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_name TEXT NOT NULL,
-            filename TEXT NOT NULL,
-            metadata TEXT,
-            visibility TEXT DEFAULT 'private',
-            narrative TEXT,
-            upload_date TEXT DEFAULT CURRENT_TIMESTAMP,
-            file_size REAL
-        )
-        """
-    )
 
+_executor = None
+_executor_lock = threading.Lock()
 
 
-    cur.execute(
-        "CREATE INDEX IF NOT EXISTS idx_images_user_name ON images(user_name);"
-    )
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=DB_EXECUTOR_THREADS, thread_name_prefix="db"
+            )
+        return _executor
 
-    # ===== ADMINS TABLE =====
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS admins (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL
-        )
-        """
-    )
-
-    # ===== DOCS TABLE =====
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS docs_entries (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            slug TEXT UNIQUE NOT NULL,
-            title TEXT NOT NULL,
-            section TEXT NOT NULL DEFAULT 'General',
-            summary TEXT,
-            content TEXT NOT NULL,
-            tags TEXT,
-            attachment_name TEXT,
-            created_by TEXT,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            is_published INTEGER DEFAULT 1
-        )
-        """
-    )
-
-    cur.execute(
-        "CREATE INDEX IF NOT EXISTS idx_docs_entries_section ON docs_entries(section);"
-    )
-    cur.execute(
-        "CREATE INDEX IF NOT EXISTS idx_docs_entries_slug ON docs_entries(slug);"
-    )
-
-    db.commit()
-    db.close()
+
+async def run_db(fn, *args, **kwargs):
+    """Await ``fn(*args, **kwargs)`` on the DB thread executor.
+
+    For ``async def`` handlers: the event loop keeps serving other requests
+    while the query runs. Put a whole unit of work (reads, writes and the
+    commit) in one ``fn`` so the transaction never spans an ``await``; a
+    connection is used by one call at a time, never concurrently.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(fn, *args, **kwargs))
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+def init_db():
+    """Apply pending schema migrations (see migrations.py)."""
+    return migrations.migrate(DB_PATH)
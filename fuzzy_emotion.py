@@ -1,13 +1,20 @@
 import json
 import datetime
+import functools
+import hashlib
+import os
+import time
 from collections import defaultdict
 
 import numpy as np
 from PIL import Image
-from sklearn.cluster import KMeans
-from skimage import color as skcolor
 import colorsys
 
+# sklearn and skimage (and the scipy they pull in) are imported on first use;
+# call warm_up() to pay that cost up front, e.g. in a pool initializer.
+
+from config import PALETTE_ENGINE, COLOR_LUT_BINS, COLOR_LUT_CACHE_DIR, ANALYSIS_MAX_PIXELS
+
 
 try:
     with open("cleaned_data.json", "r", encoding="utf-8") as f:
@@ -50,11 +57,19 @@ REFERENCE_RGB = {
 }
 
 def rgb255_to_lab(rgb):
+    from skimage import color as skcolor
+
     arr = np.array([[list(rgb)]], dtype=np.uint8) / 255.0
     lab = skcolor.rgb2lab(arr)[0][0]
     return lab
 
-REF_LABS = {name: rgb255_to_lab(rgb) for name, rgb in REFERENCE_RGB.items()}
+
+@functools.lru_cache(maxsize=None)
+def _ref_labs():
+    return {name: rgb255_to_lab(rgb) for name, rgb in REFERENCE_RGB.items()}
+
+ALGORITHM_VERSION = "fuzzy-color-v2"
+ANALYSIS_SIZE = 200
 
 
 def _nearest_named_color(centroid_rgb):
@@ -62,7 +77,7 @@ def _nearest_named_color(centroid_rgb):
     lab = rgb255_to_lab(tuple(int(round(v)) for v in centroid_rgb))
     best = None
     bestd = float("inf")
-    for name, rlab in REF_LABS.items():
+    for name, rlab in _ref_labs().items():
         d = np.linalg.norm(lab - rlab)
         if d < bestd:
             bestd = d
@@ -85,34 +100,219 @@ def _image_visual_stats(img):
     avg_sat = float(np.mean(sats))
     avg_val = float(np.mean(vals))
    
+    from skimage import color as skcolor
+
     lab = skcolor.rgb2lab(arr)
     contrast = float(np.std(lab[..., 0]) / 100.0)
     return {"avg_brightness": avg_val, "avg_saturation": avg_sat, "contrast": contrast}
 
 
-def detect_fuzzy_emotion(image_path, k=5):
-  
-    img = Image.open(image_path).convert("RGB")
-    w, h = img.size
-   
-    short = 200
-    if max(w, h) > short:
-        if w >= h:
-            nw = short
-            nh = int(h * (short / w))
-        else:
-            nh = short
-            nw = int(w * (short / h))
-        img_small = img.resize((max(1, nw), max(1, nh)))
+# sRGB (D65, 2 degree observer) constants, matching skimage.color.rgb2lab defaults
+_XYZ_FROM_RGB = np.array([
+    [0.412453, 0.357580, 0.180423],
+    [0.212671, 0.715160, 0.072169],
+    [0.019334, 0.119193, 0.950227],
+])
+_XYZ_WHITE_D65 = np.array([0.95047, 1.0, 1.08883])
+
+UNKNOWN_COLOR_DISTANCE = 45
+
+POSITIVE_EMOTIONS = {"happiness", "joy", "optimism", "love", "peace", "purity", "energy", "enthusiasm"}
+NEGATIVE_EMOTIONS = {"sadness", "grief", "anger", "fear", "death", "disgust"}
+
+
+def rgb_to_lab(arr):
+    """Convert an array of sRGB values in 0..1 (channels last) to CIE Lab."""
+    arr = np.asarray(arr, dtype=float)
+    lin = np.where(arr > 0.04045, ((arr + 0.055) / 1.055) ** 2.4, arr / 12.92)
+    xyz = (lin @ _XYZ_FROM_RGB.T) / _XYZ_WHITE_D65
+    f = np.where(xyz > 0.008856, np.cbrt(xyz), 7.787 * xyz + 16.0 / 116.0)
+    lab = np.empty_like(f)
+    lab[..., 0] = 116.0 * f[..., 1] - 16.0
+    lab[..., 1] = 500.0 * (f[..., 0] - f[..., 1])
+    lab[..., 2] = 200.0 * (f[..., 1] - f[..., 2])
+    return lab
+
+
+REF_NAMES = list(REFERENCE_RGB.keys())
+REF_NAME_ARRAY = np.array(REF_NAMES)
+REF_LAB_ARRAY = rgb_to_lab(np.array(list(REFERENCE_RGB.values()), dtype=float) / 255.0)
+
+
+def _nearest_named_colors(centroids_rgb):
+    """Vectorized _nearest_named_color: return (names, distances) for an (n, 3) array."""
+    rgb = np.clip(np.rint(np.asarray(centroids_rgb, dtype=float)), 0, 255).reshape(-1, 3)
+    labs = rgb_to_lab(rgb / 255.0)
+    dists = np.linalg.norm(labs[:, None, :] - REF_LAB_ARRAY[None, :, :], axis=-1)
+    idx = dists.argmin(axis=1)
+    best = dists[np.arange(len(idx)), idx]
+    names = [
+        "unknown" if d > UNKNOWN_COLOR_DISTANCE else REF_NAMES[i]
+        for i, d in zip(idx, best)
+    ]
+    return names, best
+
+
+def _lut_path(bins):
+    digest = hashlib.sha256(
+        json.dumps([REFERENCE_RGB, UNKNOWN_COLOR_DISTANCE], sort_keys=True).encode()
+    ).hexdigest()[:12]
+    return os.path.join(COLOR_LUT_CACHE_DIR, f"color_lut_{bins}_{digest}.npy")
+
+
+def _build_color_lut(bins):
+    """Name the centre of every RGB cell; cells beyond the cutoff map to "unknown"."""
+    step = 256 // bins
+    centers = np.arange(bins) * step + (step - 1) / 2.0
+    grid = np.stack(np.meshgrid(centers, centers, centers, indexing="ij"), axis=-1).reshape(-1, 3)
+    labs = rgb_to_lab(grid / 255.0)
+
+    unknown = REF_NAMES.index("unknown")
+    lut = np.empty(len(grid), dtype=np.uint8)
+    for start in range(0, len(grid), 65536):
+        chunk = labs[start:start + 65536]
+        dists = np.linalg.norm(chunk[:, None, :] - REF_LAB_ARRAY[None, :, :], axis=-1)
+        idx = dists.argmin(axis=1)
+        idx[dists[np.arange(len(idx)), idx] > UNKNOWN_COLOR_DISTANCE] = unknown
+        lut[start:start + len(idx)] = idx
+    return lut.reshape(bins, bins, bins)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_color_lut(path, bins):
+    if not os.path.exists(path):
+        lut = _build_color_lut(bins)
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, lut)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"Could not write color LUT cache {path}: {e}")
+            return lut
+    return np.load(path, mmap_mode="r")
+
+
+def color_lut(bins=COLOR_LUT_BINS):
+    """Return the (bins, bins, bins) table of REF_NAMES indices, memory-mapped from disk."""
+    if 256 % bins:
+        raise ValueError("bins must divide 256")
+    return _load_color_lut(_lut_path(bins), bins)
+
+
+def name_colors(rgb, bins=COLOR_LUT_BINS):
+    """Name an array of 0..255 RGB values (channels last) via the lookup table."""
+    rgb = np.asarray(rgb)
+    if rgb.dtype != np.uint8:
+        rgb = np.clip(np.rint(rgb.astype(float)), 0, 255)
+    rgb = rgb.astype(np.intp)
+    shift = 256 // bins
+    idx = color_lut(bins)[rgb[..., 0] // shift, rgb[..., 1] // shift, rgb[..., 2] // shift]
+    return REF_NAME_ARRAY[idx]
+
+
+def _visual_stats_from_array(arr):
+    """Whole-array version of _image_visual_stats for an (h, w, 3) array in 0..1."""
+    maxc = arr.max(axis=-1)
+    minc = arr.min(axis=-1)
+    sats = np.divide(maxc - minc, maxc, out=np.zeros_like(maxc), where=maxc > 0)
+    lab_l = rgb_to_lab(arr)[..., 0]
+    return {
+        "avg_brightness": float(np.mean(maxc)),
+        "avg_saturation": float(np.mean(sats)),
+        "contrast": float(np.std(lab_l) / 100.0),
+    }
+
+
+def _fit_within(w, h, short):
+    if max(w, h) <= short:
+        return w, h
+    if w >= h:
+        nw = short
+        nh = int(h * (short / w))
     else:
-        img_small = img.copy()
+        nh = short
+        nw = int(w * (short / h))
+    return max(1, nw), max(1, nh)
 
-    
-    arr = np.array(img_small).reshape(-1, 3).astype(float)  # 0..255
-    
+
+def _load_small(image_path, short=ANALYSIS_SIZE):
+    """v1 loader: full-size decode plus a resized copy."""
+    img = Image.open(image_path).convert("RGB")
+    target = _fit_within(*img.size, short)
+    img_small = img.resize(target) if target != img.size else img.copy()
+    return img, img_small
+
+
+class _StageTimer:
+    """Accumulate per-stage wall time into ``timings`` (a dict) when one is given."""
+
+    def __init__(self, timings):
+        self.timings = timings
+        self.last = time.perf_counter() if timings is not None else None
+
+    def lap(self, stage):
+        if self.timings is None:
+            return
+        now = time.perf_counter()
+        self.timings[stage] = self.timings.get(stage, 0.0) + now - self.last
+        self.last = now
+
+
+def load_analysis_image(image_path, size=ANALYSIS_SIZE, max_pixels=None, timings=None):
+    """Decode an image straight to at most ``size`` pixels on the long edge.
+
+    JPEGs are DCT-scaled by draft() while decoding and other formats are
+    shrunk with reduce() before resampling, so no full-resolution RGB copy
+    is made. Images above ``max_pixels`` are rejected from the header alone.
+    """
+    max_pixels = ANALYSIS_MAX_PIXELS if max_pixels is None else max_pixels
+    timer = _StageTimer(timings)
+    with Image.open(image_path) as img:
+        w, h = img.size
+        if max_pixels and w * h > max_pixels:
+            raise ValueError(f"Image is {w}x{h} pixels, above the {max_pixels} pixel limit")
+
+        target = _fit_within(w, h, size)
+        if target != (w, h):
+            img.draft("RGB", target)
+        img.load()
+        timer.lap("decode")
+
+        if img.size != target and img.mode in ("P", "PA", "1", "RGBA", "LA"):
+            # Palette indices cannot be averaged, and Pillow premultiplies
+            # alpha through a full-size copy for any filter but NEAREST:
+            # subsample to twice the target first and convert only that
+            img = img.resize(
+                (min(img.width, 2 * target[0]), min(img.height, 2 * target[1])),
+                Image.Resampling.NEAREST
+            ).convert("RGB")
+        # CMYK, I;16 and the rest resample in their own mode
+        if img.size != target:
+            img = img.resize(target, reducing_gap=3.0)
+        small = img.convert("RGB")
+        timer.lap("resize")
+        return small
+
+
+def _kmeans(n_clusters):
+    from sklearn.cluster import KMeans
+
+    return KMeans(n_clusters=n_clusters, random_state=0, n_init=10)
+
+
+def _minibatch_kmeans(n_clusters):
+    from sklearn.cluster import MiniBatchKMeans
+
+    return MiniBatchKMeans(n_clusters=n_clusters, random_state=0, n_init=3, batch_size=2048)
+
+
+def _cluster_palette(arr, k, make_model=_kmeans):
+    """Cluster an (n, 3) pixel array; return (centroids, weights)."""
     n_clusters = min(k, max(2, arr.shape[0] // 50))
     try:
-        km = KMeans(n_clusters=n_clusters, random_state=0, n_init=10)
+        km = make_model(n_clusters)
         labels = km.fit_predict(arr)
         centroids = km.cluster_centers_
     except ValueError as e:
@@ -122,26 +322,77 @@ def detect_fuzzy_emotion(image_path, k=5):
         centroids = np.array(arr[:n_clusters])
         labels = np.zeros(len(arr), dtype=int)
 
-   
     counts = np.bincount(labels, minlength=len(centroids)).astype(float)
     weights = counts / counts.sum()
+    return centroids, weights
+
+
+def _pixels(img_small):
+    return np.asarray(img_small, dtype=float).reshape(-1, 3)  # 0..255
+
+
+def _palette_kmeans(img_small, k):
+    return _cluster_palette(_pixels(img_small), k)
+
+
+def _palette_minibatch_kmeans(img_small, k):
+    return _cluster_palette(_pixels(img_small), k, make_model=_minibatch_kmeans)
+
+
+def _quantized_palette(img_small, k, method):
+    q = img_small.quantize(colors=k, method=method)
+    colors = np.array(q.getpalette(), dtype=float).reshape(-1, 3)
+    counts = np.bincount(np.asarray(q).ravel(), minlength=len(colors))[:len(colors)]
+    used = counts > 0
+    return colors[used], counts[used] / counts.sum()
+
+
+def _palette_median_cut(img_small, k):
+    return _quantized_palette(img_small, k, Image.Quantize.MEDIANCUT)
+
+
+def _palette_octree(img_small, k):
+    return _quantized_palette(img_small, k, Image.Quantize.FASTOCTREE)
+
+
+def _palette_histogram(img_small, k, bins=8):
+    """Pick the k most populated cells of a fixed bins**3 RGB histogram."""
+    px = np.asarray(img_small, dtype=np.uint8).reshape(-1, 3)
+    cells = (px // (256 // bins)).astype(np.int64)
+    idx = (cells[:, 0] * bins + cells[:, 1]) * bins + cells[:, 2]
+    counts = np.bincount(idx, minlength=bins ** 3)
+    top = np.argsort(-counts, kind="stable")[:k]
+    top = top[counts[top] > 0]
+    sums = np.stack(
+        [np.bincount(idx, weights=px[:, c], minlength=bins ** 3)[top] for c in range(3)],
+        axis=1,
+    )
+    centroids = sums / counts[top, None]
+    return centroids, counts[top] / counts[top].sum()
+
+
+# Each engine maps (downscaled RGB image, k) -> (centroids as (n, 3) 0..255, weights summing to 1)
+PALETTE_ENGINES = {
+    "kmeans": _palette_kmeans,
+    "minibatch_kmeans": _palette_minibatch_kmeans,
+    "median_cut": _palette_median_cut,
+    "octree": _palette_octree,
+    "histogram": _palette_histogram,
+}
+
+# Fail on import with the setting's name rather than as a KeyError inside
+# warm_up(), where a pool initializer only surfaces as BrokenProcessPool
+if PALETTE_ENGINE not in PALETTE_ENGINES:
+    raise RuntimeError(
+        f"PALETTE_ENGINE={PALETTE_ENGINE!r} is not one of: {', '.join(PALETTE_ENGINES)}"
+    )
 
-    palette = []
-    for cen, wgt in zip(centroids, weights):
-        name, dist = _nearest_named_color(cen)
-        palette.append({"color": name, "weight": float(round(float(wgt), 6)), "centroid_rgb": [int(round(c)) for c in cen], "lab_distance": float(round(float(dist), 3))})
 
+def _build_metadata(palette, visual_stats, algorithm, palette_engine):
     emotion_scores = defaultdict(float)
     for p in palette:
-        cname = p["color"]
-        weight = p["weight"]
-       
-        if cname in COLOR_TO_EMOTIONS:
-            for emo in COLOR_TO_EMOTIONS[cname]:
-                emotion_scores[emo] += weight
-        else:
-            pass
-
+        for emo in COLOR_TO_EMOTIONS.get(p["color"], []):
+            emotion_scores[emo] += p["weight"]
 
     total = sum(emotion_scores.values())
     if total > 0:
@@ -151,33 +402,92 @@ def detect_fuzzy_emotion(image_path, k=5):
         
         emotion_scores = {}
 
-   
-    pos = {"happiness", "joy", "optimism", "love", "peace", "purity", "energy", "enthusiasm"}
-    neg = {"sadness", "grief", "anger", "fear", "death", "disgust"}
-    
     group_scores = {"positive": 0.0, "neutral": 0.0, "negative": 0.0}
     for emo, score in emotion_scores.items():
-        if emo in pos:
+        if emo in POSITIVE_EMOTIONS:
             group_scores["positive"] += score
-        elif emo in neg:
+        elif emo in NEGATIVE_EMOTIONS:
             group_scores["negative"] += score
         else:
             group_scores["neutral"] += score
 
-    
-    visual_stats = _image_visual_stats(img)
-
-    
     confidence = max([p["weight"] for p in palette]) if palette else 0.0
 
-    metadata = {
+    return {
         "palette": palette,
         "emotion_space": emotion_scores,
         "emotion_groups": group_scores,
         "visual_stats": visual_stats,
         "confidence": float(round(confidence, 6)),
         "generated_at": datetime.datetime.utcnow().isoformat() + "Z",
-        "algorithm": "fuzzy-color-v1"
+        "algorithm": algorithm,
+        "palette_engine": palette_engine
     }
-    return metadata
 
+
+def detect_fuzzy_emotion_v1(image_path, k=5):
+    """Reference per-pixel implementation, kept for parity checks against v2."""
+    img, img_small = _load_small(image_path)
+    arr = np.array(img_small).reshape(-1, 3).astype(float)  # 0..255
+    centroids, weights = _cluster_palette(arr, k)
+
+    palette = []
+    for cen, wgt in zip(centroids, weights):
+        name, dist = _nearest_named_color(cen)
+        palette.append({"color": name, "weight": float(round(float(wgt), 6)), "centroid_rgb": [int(round(c)) for c in cen], "lab_distance": float(round(float(dist), 3))})
+
+    return _build_metadata(palette, _image_visual_stats(img), "fuzzy-color-v1", "kmeans")
+
+
+def shrink_to(img, size=ANALYSIS_SIZE):
+    """Downscale an already decoded image to at most ``size`` on the long edge."""
+    target = _fit_within(*img.size, size)
+    return img.resize(target, reducing_gap=3.0) if target != img.size else img
+
+
+def analyze_image(img_small, k=5, palette_engine=None, timings=None):
+    """Run the v2 kernel on an RGB image already at analysis size."""
+    engine = palette_engine or PALETTE_ENGINE
+    if engine not in PALETTE_ENGINES:
+        raise ValueError(f"Unknown palette engine: {engine}")
+
+    timer = _StageTimer(timings)
+    centroids, weights = PALETTE_ENGINES[engine](img_small, k)
+    timer.lap("palette")
+
+    names, dists = _nearest_named_colors(centroids)
+    palette = [
+        {
+            "color": name,
+            "weight": float(round(float(wgt), 6)),
+            "centroid_rgb": [int(round(c)) for c in cen],
+            "lab_distance": float(round(float(dist), 3)),
+        }
+        for name, dist, cen, wgt in zip(names, dists, centroids, weights)
+    ]
+    timer.lap("naming")
+
+    stats_arr = np.asarray(img_small, dtype=float) / 255.0
+    visual_stats = _visual_stats_from_array(stats_arr)
+    timer.lap("visual_stats")
+    return _build_metadata(palette, visual_stats, ALGORITHM_VERSION, engine)
+
+
+def detect_fuzzy_emotion(image_path, k=5, palette_engine=None, timings=None):
+    """Analyse one image; pass a dict as ``timings`` to collect per-stage seconds."""
+    img_small = load_analysis_image(image_path, timings=timings)
+    return analyze_image(img_small, k, palette_engine, timings)
+
+
+def warm_up():
+    """Import the clustering stack, load the color LUT and run one tiny analysis.
+
+    Safe to call more than once; meant for the lifespan hook, a pre-fork
+    parent or a worker pool initializer.
+    """
+    import sklearn.cluster  # noqa: F401
+
+    color_lut()
+    arr = np.zeros((16, 16, 3), dtype=np.uint8)
+    arr[:, 8:] = 255
+    PALETTE_ENGINES[PALETTE_ENGINE](Image.fromarray(arr), 2)
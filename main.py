@@ -1,13 +1,16 @@
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
 from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 import logging
+import sqlite3
 import sys
 import os
 
-from config import SECRET_KEY
-from db import init_db
+from config import (
+    SECRET_KEY, ANALYSIS_PREWARM, MAX_UPLOAD_BYTES, MAX_DOCS_UPLOAD_BYTES, STATIC_CACHE_CONTROL,
+    MAX_BATCH_UPLOAD_BYTES
+)
+from db import init_db, close_pools, shutdown_executor, DB_PATH
 
 from app.routers.auth import router as auth_router
 from app.routers.gallery import router as gallery_router
@@ -15,6 +18,9 @@ from app.routers.pages import router as pages_router
 from app.routers.narrative import router as narrative_router
 from app.routers.admin import router as admin_router
 from app.routers.export import router as export_router
+from app.services import analysis_queue
+from app.middleware.upload_limit import UploadSizeLimitMiddleware
+from app.middleware.static_files import CachedStaticFiles
 
 logger = logging.getLogger("bhv")
 logger.setLevel(logging.INFO)
@@ -32,7 +38,6 @@ app = FastAPI(
 
 app.add_middleware(ProxyHeadersMiddleware, trusted_hosts="*")
 
-init_db()
 
 is_production = os.environ.get("RENDER") is not None
 
@@ -42,7 +47,25 @@ app.add_middleware(
     same_site="none" if is_production else "lax",
     https_only=is_production
 )
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Headroom for multipart boundaries and the other form fields
+MULTIPART_OVERHEAD = 64 * 1024
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    limits={
+        "/upload": (MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD, "/gallery"),
+        "/upload/batch": (MAX_BATCH_UPLOAD_BYTES + MULTIPART_OVERHEAD, "/gallery"),
+        "/docs/upload": (MAX_DOCS_UPLOAD_BYTES + MULTIPART_OVERHEAD, "/docs"),
+    }
+)
+app.mount(
+    "/static",
+    CachedStaticFiles(
+        directory="static",
+        immutable_prefixes=("uploads",),
+        cache_control=STATIC_CACHE_CONTROL,
+    ),
+    name="static",
+)
 
 app.include_router(pages_router)
 app.include_router(auth_router)
@@ -58,11 +81,26 @@ async def health_check():
 @app.on_event("startup")
 async def on_startup():
     logger.info("Starting BHV Platform application")
+    applied = init_db()
+    if applied:
+        logger.info("Applied schema migrations: %s", ", ".join(str(v) for v, _ in applied))
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        resumed = analysis_queue.resume_pending(conn)
+    finally:
+        conn.close()
+    if resumed:
+        logger.info("Re-queued %d pending image analyses", resumed)
+    if ANALYSIS_PREWARM:
+        analysis_queue.prewarm()
 
 
 @app.on_event("shutdown")
 async def on_shutdown():
     logger.info("Shutting down BHV Platform application")
+    analysis_queue.shutdown()
+    shutdown_executor()
+    close_pools()
 
 
 if __name__ == "__main__":
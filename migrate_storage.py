@@ -0,0 +1,110 @@
+"""Move uploads from the flat static/uploads directory into the blob store.
+
+Every images row whose filename is not yet a blob is hashed, linked into its
+sharded content-addressed path (see app.services.storage_service), renamed
+in the database and counted in the blobs table. Rows are committed one at a
+time and the old file is only removed afterwards, so the script can be
+interrupted and re-run:
+
+    python migrate_storage.py
+"""
+import json
+import os
+import shutil
+import sqlite3
+import sys
+
+from db import DB_PATH, init_db
+from app.services import storage_service
+from app.services.analysis_cache import file_sha256
+from app.services.thumbnail_service import thumbnail_name
+
+
+def _link(src, dest):
+    if os.path.exists(dest):
+        return
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def migrate_row(conn, image_id, filename, thumbnails, root):
+    """Move one row's file and thumbnails; returns the new name or None if the file is missing."""
+    src = os.path.join(root, filename)
+    if not os.path.isfile(src):
+        return None
+
+    name = storage_service.blob_name(file_sha256(src), os.path.splitext(filename)[1] or ".jpg")
+    dest = storage_service.blob_path(name, root)
+    _link(src, dest)
+
+    old_thumbs = json.loads(thumbnails) if thumbnails else None
+    new_thumbs = None
+    if old_thumbs is not None:
+        stem = os.path.splitext(name)[0]
+        new_thumbs = []
+        for width, thumb in old_thumbs:
+            thumb_src = os.path.join(root, thumb)
+            if not os.path.isfile(thumb_src):
+                continue
+            new_name = thumbnail_name(stem, width)
+            _link(thumb_src, os.path.join(os.path.dirname(dest), new_name))
+            new_thumbs.append([width, new_name])
+
+    with conn:
+        conn.execute(
+            "UPDATE images SET filename = ?, thumbnails = ? WHERE id = ?",
+            (name, json.dumps(new_thumbs) if new_thumbs is not None else None, image_id)
+        )
+        conn.execute(
+            """
+            INSERT INTO blobs (name, size, refcount) VALUES (?, ?, 1)
+            ON CONFLICT(name) DO UPDATE SET refcount = refcount + 1
+            """,
+            (name, os.path.getsize(dest))
+        )
+
+    if not conn.execute("SELECT 1 FROM images WHERE filename = ? LIMIT 1", (filename,)).fetchone():
+        _remove(src)
+        for _, thumb in old_thumbs or []:
+            _remove(os.path.join(root, thumb))
+    return name
+
+
+def main(root=None):
+    root = root or storage_service.UPLOAD_DIR
+    init_db()
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    moved = missing = 0
+    try:
+        rows = conn.execute(
+            """
+            SELECT id, filename, thumbnails FROM images
+            WHERE filename NOT IN (SELECT name FROM blobs)
+            ORDER BY id
+            """
+        ).fetchall()
+        for image_id, filename, thumbnails in rows:
+            if migrate_row(conn, image_id, filename, thumbnails, root) is None:
+                missing += 1
+                print(f"  {image_id} {filename}: file not found", file=sys.stderr)
+            else:
+                moved += 1
+    finally:
+        conn.close()
+
+    print(f"Finished: {moved} moved, {missing} missing")
+    return 0 if not missing else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
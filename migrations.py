@@ -0,0 +1,580 @@
+"""Versioned schema migrations for the SQLite database.
+
+Each migration is a ``(version, name, function)`` entry in MIGRATIONS; the
+function receives a cursor inside a transaction that also records the
+version in ``schema_migrations``. ``migrate()`` applies whatever is
+missing while holding an exclusive lock file next to the database, so when
+several workers start at once only one of them does the work. Once the
+database is current, ``migrate()`` is a single SELECT.
+
+    python migrations.py            # apply pending migrations
+    python migrations.py --status   # list applied / pending versions
+
+Migrations written before this runner existed use IF NOT EXISTS and
+_ensure_column, so databases created by the old init_db() are adopted
+without changes.
+"""
+import argparse
+import sqlite3
+import sys
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _ensure_column(cur, table, column, decl):
+    columns = {r[1] for r in cur.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def _001_initial(cur):
+    # Older databases declared users.name UNIQUE; rebuild users without it
+    row = cur.execute(
+        "SELECT sql FROM sqlite_master WHERE type='table' AND name='users'"
+    ).fetchone()
+    if row and row[0] and "name TEXT UNIQUE" in row[0]:
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS users_mig (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT,
+                email TEXT UNIQUE NOT NULL,
+                password TEXT,
+                is_private INTEGER DEFAULT 0
+            )
+            """
+        )
+        cur.execute(
+            """
+            INSERT OR IGNORE INTO users_mig (id, name, email, password, is_private)
+                SELECT id, name, email, password, is_private FROM users
+            """
+        )
+        cur.execute("DROP TABLE users")
+        cur.execute("ALTER TABLE users_mig RENAME TO users")
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT,
+            is_private INTEGER DEFAULT 0
+        )
+        """
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)")
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS images (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_name TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            metadata TEXT,
+            visibility TEXT DEFAULT 'private',
+            narrative TEXT,
+            upload_date TEXT DEFAULT CURRENT_TIMESTAMP,
+            file_size REAL
+        )
+        """
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_images_user_name ON images(user_name)")
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS admins (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL
+        )
+        """
+    )
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS docs_entries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            slug TEXT UNIQUE NOT NULL,
+            title TEXT NOT NULL,
+            section TEXT NOT NULL DEFAULT 'General',
+            summary TEXT,
+            content TEXT NOT NULL,
+            tags TEXT,
+            attachment_name TEXT,
+            created_by TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            is_published INTEGER DEFAULT 1
+        )
+        """
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_docs_entries_section ON docs_entries(section)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_docs_entries_slug ON docs_entries(slug)")
+
+
+def _002_analysis_status(cur):
+    # pending -> done | failed, filled in by app.services.analysis_queue
+    _ensure_column(cur, "images", "analysis_status", "TEXT DEFAULT 'done'")
+
+
+def _003_analysis_cache(cur):
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS analysis_cache (
+            cache_key TEXT PRIMARY KEY,
+            metadata TEXT NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            last_used_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_analysis_cache_last_used ON analysis_cache(last_used_at)"
+    )
+
+
+def _004_thumbnails(cur):
+    # JSON [[width, filename], ...] written by app.services.thumbnail_service
+    _ensure_column(cur, "images", "thumbnails", "TEXT")
+
+
+def _005_blobs(cur):
+    # One row per stored upload file (see app.services.storage_service);
+    # refcount is the number of images rows pointing at it.
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS blobs (
+            name TEXT PRIMARY KEY,
+            size INTEGER,
+            refcount INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_images_filename ON images(filename)")
+
+
+def _006_original_file_size(cur):
+    # KB as uploaded; file_size is what is stored after normalize_service
+    _ensure_column(cur, "images", "original_file_size", "REAL")
+
+
+def _007_images_access_indexes(cur):
+    # Exports: WHERE user_name=? ORDER BY upload_date DESC
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_images_user_upload ON images(user_name, upload_date)"
+    )
+    # /search: WHERE user_name IN (...) AND visibility='public' ORDER BY upload_date DESC
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_images_user_visibility_upload "
+        "ON images(user_name, visibility, upload_date)"
+    )
+    # Deletes, narrative/status lookups and blob refcounts: filename=? [AND user_name=?]
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_images_filename_user ON images(filename, user_name)"
+    )
+    cur.execute("DROP INDEX IF EXISTS idx_images_filename")
+    # resume_pending on startup; the partial index stays tiny
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_images_pending ON images(analysis_status) "
+        "WHERE analysis_status = 'pending'"
+    )
+    # idx_images_user_name stays: (user_name, rowid) serves ORDER BY id DESC per user
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_docs_entries_published_order ON docs_entries("
+        "is_published, section COLLATE NOCASE, title COLLATE NOCASE)"
+    )
+
+
+def _json_number(path, source="metadata"):
+    return (
+        f"CASE WHEN json_type({source}, '{path}') IN ('integer', 'real') "
+        f"THEN json_extract({source}, '{path}') END"
+    )
+
+
+def _008_emotion_columns(cur):
+    # Typed copies of images.metadata kept by app.services.emotion_store
+    for column, decl in (
+        ("dominant_color", "TEXT"),
+        ("dominant_emotion", "TEXT"),
+        ("emotion_positive", "REAL"),
+        ("emotion_neutral", "REAL"),
+        ("emotion_negative", "REAL"),
+        ("confidence", "REAL"),
+        ("brightness", "REAL"),
+        ("saturation", "REAL"),
+        ("contrast", "REAL"),
+    ):
+        _ensure_column(cur, "images", column, decl)
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS image_palette (
+            image_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            color TEXT NOT NULL,
+            weight REAL,
+            r INTEGER,
+            g INTEGER,
+            b INTEGER,
+            lab_distance REAL,
+            PRIMARY KEY (image_id, position)
+        )
+        """
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_image_palette_color ON image_palette(color, image_id)"
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_images_user_emotion ON images(user_name, dominant_emotion)"
+    )
+
+    # Backfill; same rules as emotion_store.derive (ties: first palette entry,
+    # alphabetically first emotion; non-numeric values become NULL)
+    valid_palette_entry = (
+        "json_type(p.value) = 'object' AND json_type(p.value, '$.color') = 'text'"
+    )
+    cur.execute(
+        f"""
+        UPDATE images SET
+            dominant_color = (
+                SELECT json_extract(p.value, '$.color')
+                FROM json_each(images.metadata, '$.palette') p
+                WHERE {valid_palette_entry}
+                  AND json_type(p.value, '$.weight') IN ('integer', 'real')
+                ORDER BY json_extract(p.value, '$.weight') DESC, p.key
+                LIMIT 1
+            ),
+            dominant_emotion = (
+                SELECT e.key FROM json_each(images.metadata, '$.emotion_space') e
+                WHERE e.type IN ('integer', 'real')
+                ORDER BY e.value DESC, e.key
+                LIMIT 1
+            ),
+            emotion_positive = {_json_number('$.emotion_groups.positive')},
+            emotion_neutral = {_json_number('$.emotion_groups.neutral')},
+            emotion_negative = {_json_number('$.emotion_groups.negative')},
+            confidence = {_json_number('$.confidence')},
+            brightness = {_json_number('$.visual_stats.avg_brightness')},
+            saturation = {_json_number('$.visual_stats.avg_saturation')},
+            contrast = {_json_number('$.visual_stats.contrast')}
+        WHERE CASE WHEN json_valid(metadata) THEN json_type(metadata) END = 'object'
+        """
+    )
+    cur.execute(
+        f"""
+        WITH valid AS MATERIALIZED (
+            SELECT id, metadata FROM images
+            WHERE CASE WHEN json_valid(metadata) THEN json_type(metadata, '$.palette') END = 'array'
+        )
+        INSERT OR REPLACE INTO image_palette (image_id, position, color, weight, r, g, b, lab_distance)
+        SELECT
+            valid.id, p.key, json_extract(p.value, '$.color'),
+            {_json_number('$.weight', 'p.value')},
+            json_extract(p.value, '$.centroid_rgb[0]'),
+            json_extract(p.value, '$.centroid_rgb[1]'),
+            json_extract(p.value, '$.centroid_rgb[2]'),
+            {_json_number('$.lab_distance', 'p.value')}
+        FROM valid, json_each(valid.metadata, '$.palette') p
+        WHERE {valid_palette_entry}
+        """
+    )
+
+
+def _009_pagination_indexes(cur):
+    # Keyset pages: /gallery?emotion= walks (user_name, dominant_emotion, upload_date, id)
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_images_user_emotion_upload "
+        "ON images(user_name, dominant_emotion, upload_date)"
+    )
+    cur.execute("DROP INDEX IF EXISTS idx_images_user_emotion")
+    # Admin dashboard: users ordered by (IFNULL(name, '') COLLATE NOCASE, id)
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_name_order ON users(IFNULL(name, '') COLLATE NOCASE)"
+    )
+
+
+def _010_users_fts(cur):
+    # External-content trigram index over users for /search substring matches;
+    # the triggers keep it in step with every write to users
+    cur.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+            name, email, content='users', content_rowid='id', tokenize='trigram'
+        )
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN
+            INSERT INTO users_fts (rowid, name, email) VALUES (new.id, new.name, new.email);
+        END
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN
+            INSERT INTO users_fts (users_fts, rowid, name, email)
+            VALUES ('delete', old.id, old.name, old.email);
+        END
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF name, email ON users BEGIN
+            INSERT INTO users_fts (users_fts, rowid, name, email)
+            VALUES ('delete', old.id, old.name, old.email);
+            INSERT INTO users_fts (rowid, name, email) VALUES (new.id, new.name, new.email);
+        END
+        """
+    )
+    cur.execute("INSERT INTO users_fts (users_fts) VALUES ('rebuild')")
+
+
+def _011_docs_fts(cur):
+    # Ranked /docs?q= search. Prefix indexes serve search-as-you-type terms.
+    cur.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(
+            title, summary, content, section, tags,
+            content='docs_entries', content_rowid='id',
+            tokenize='porter unicode61 remove_diacritics 2', prefix='2 3'
+        )
+        """
+    )
+    columns = "title, summary, content, section, tags"
+    new_values = "new.title, new.summary, new.content, new.section, new.tags"
+    old_values = "old.title, old.summary, old.content, old.section, old.tags"
+    cur.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS docs_fts_insert AFTER INSERT ON docs_entries BEGIN
+            INSERT INTO docs_fts (rowid, {columns}) VALUES (new.id, {new_values});
+        END
+        """
+    )
+    cur.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS docs_fts_delete AFTER DELETE ON docs_entries BEGIN
+            INSERT INTO docs_fts (docs_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+        END
+        """
+    )
+    cur.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS docs_fts_update
+        AFTER UPDATE OF {columns} ON docs_entries BEGIN
+            INSERT INTO docs_fts (docs_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO docs_fts (rowid, {columns}) VALUES (new.id, {new_values});
+        END
+        """
+    )
+    cur.execute("INSERT INTO docs_fts (docs_fts) VALUES ('rebuild')")
+    # ORDER BY rank: BM25 weighting title, summary, content, section, tags
+    cur.execute(
+        "INSERT INTO docs_fts (docs_fts, rank) VALUES ('rank', 'bm25(10.0, 4.0, 1.0, 2.0, 3.0)')"
+    )
+
+
+def _012_cache_versions(cur):
+    # Change counters for in-process caches shared by every worker
+    # (app.services.docs_catalog); bumped by triggers, so any writer counts
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    cur.execute("INSERT OR IGNORE INTO cache_versions (name) VALUES ('docs')")
+    bump = "UPDATE cache_versions SET version = version + 1 WHERE name = 'docs';"
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        cur.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS docs_version_{event.lower()}
+            AFTER {event} ON docs_entries BEGIN {bump} END
+            """
+        )
+
+
+def _013_narratives_fts(cur):
+    # Search over images.narrative within one vault. user_name is indexed
+    # too, so a search names its owner in the MATCH and FTS5 ranks only the
+    # intersection, not every user's matches; it carries no weight in rank.
+    # Only non-empty narratives are indexed, and the triggers use the same
+    # test on both sides so 'delete' always matches.
+    cur.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS narratives_fts USING fts5(
+            narrative, user_name, content='images', content_rowid='id',
+            tokenize='porter unicode61 remove_diacritics 2', prefix='2 3'
+        )
+        """
+    )
+    cur.execute("INSERT INTO narratives_fts (narratives_fts, rank) VALUES ('rank', 'bm25(1.0, 0.0)')")
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS narratives_fts_insert AFTER INSERT ON images
+        WHEN COALESCE(new.narrative, '') != '' BEGIN
+            INSERT INTO narratives_fts (rowid, narrative, user_name)
+            VALUES (new.id, new.narrative, new.user_name);
+        END
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS narratives_fts_delete AFTER DELETE ON images
+        WHEN COALESCE(old.narrative, '') != '' BEGIN
+            INSERT INTO narratives_fts (narratives_fts, rowid, narrative, user_name)
+            VALUES ('delete', old.id, old.narrative, old.user_name);
+        END
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS narratives_fts_update AFTER UPDATE OF narrative, user_name ON images
+        BEGIN
+            INSERT INTO narratives_fts (narratives_fts, rowid, narrative, user_name)
+            SELECT 'delete', old.id, old.narrative, old.user_name WHERE COALESCE(old.narrative, '') != '';
+            INSERT INTO narratives_fts (rowid, narrative, user_name)
+            SELECT new.id, new.narrative, new.user_name WHERE COALESCE(new.narrative, '') != '';
+        END
+        """
+    )
+    cur.execute(
+        """
+        INSERT INTO narratives_fts (rowid, narrative, user_name)
+        SELECT id, narrative, user_name FROM images WHERE COALESCE(narrative, '') != ''
+        """
+    )
+
+
+def _014_analysis_claims(cur):
+    # julianday() of the resume_pending call that re-queued a pending row, so
+    # only one server worker re-queues it
+    _ensure_column(cur, "images", "analysis_claimed_at", "REAL")
+
+
+MIGRATIONS = [
+    (1, "initial schema", _001_initial),
+    (2, "images.analysis_status", _002_analysis_status),
+    (3, "analysis_cache table", _003_analysis_cache),
+    (4, "images.thumbnails", _004_thumbnails),
+    (5, "blobs table", _005_blobs),
+    (6, "images.original_file_size", _006_original_file_size),
+    (7, "composite indexes for images access patterns", _007_images_access_indexes),
+    (8, "emotion columns and image_palette", _008_emotion_columns),
+    (9, "keyset pagination indexes", _009_pagination_indexes),
+    (10, "users_fts trigram index", _010_users_fts),
+    (11, "docs_fts full-text index", _011_docs_fts),
+    (12, "cache_versions counters", _012_cache_versions),
+    (13, "narratives_fts full-text index", _013_narratives_fts),
+    (14, "images.analysis_claimed_at", _014_analysis_claims),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+@contextmanager
+def _file_lock(path):
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def current_version(conn):
+    try:
+        row = conn.execute("SELECT MAX(version) FROM schema_migrations").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] or 0
+
+
+def _apply_pending(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    # Persistent per database file; cannot be changed inside a transaction
+    conn.execute("PRAGMA journal_mode = WAL")
+
+    applied = []
+    version = current_version(conn)
+    for number, name, migration in MIGRATIONS:
+        if number <= version:
+            continue
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            migration(cur)
+            cur.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (?, ?)", (number, name)
+            )
+            cur.execute("COMMIT")
+        except BaseException:
+            cur.execute("ROLLBACK")
+            raise
+        applied.append((number, name))
+    return applied
+
+
+def migrate(db_path):
+    """Bring ``db_path`` up to LATEST_VERSION; returns the migrations applied."""
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        if current_version(conn) >= LATEST_VERSION:
+            return []
+        with _file_lock(f"{db_path}.migrate.lock"):
+            # Another process may have finished while we waited for the lock
+            return _apply_pending(conn)
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    from db import DB_PATH
+
+    parser = argparse.ArgumentParser(description="Apply database schema migrations.")
+    parser.add_argument("--status", action="store_true", help="show versions without migrating")
+    args = parser.parse_args(argv)
+
+    if args.status:
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            version = current_version(conn)
+        finally:
+            conn.close()
+        for number, name, _ in MIGRATIONS:
+            print(f"{number:4d} {'applied' if number <= version else 'pending':8s} {name}")
+        return 0
+
+    applied = migrate(DB_PATH)
+    for number, name in applied:
+        print(f"Applied {number}: {name}")
+    print(f"{DB_PATH} is at version {LATEST_VERSION}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
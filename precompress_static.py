@@ -0,0 +1,92 @@
+"""Write .br and .gz copies of the CSS/JS assets for CachedStaticFiles to serve.
+
+Run at build time (the Dockerfile does) or after editing static assets:
+
+    python precompress_static.py
+    python precompress_static.py --check    # exit 1 if any copy is stale
+
+Variants older than their source are ignored at serve time, so a stale run
+only costs bandwidth, never correctness.
+"""
+import argparse
+import gzip
+import os
+import sys
+
+try:
+    import brotli
+except ImportError:  # gzip-only builds still work
+    brotli = None
+
+from app.middleware.static_files import COMPRESSIBLE_SUFFIXES
+
+STATIC_DIRS = (os.path.join("static", "css"), os.path.join("static", "js"))
+# Skip files where compression saves less than this fraction
+MIN_SAVING = 0.05
+
+
+def iter_assets(dirs=STATIC_DIRS):
+    for root_dir in dirs:
+        for root, _, files in os.walk(root_dir):
+            for name in sorted(files):
+                if os.path.splitext(name)[1] in COMPRESSIBLE_SUFFIXES:
+                    yield os.path.join(root, name)
+
+
+def _encoders():
+    encoders = [(".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        encoders.insert(0, (".br", lambda data: brotli.compress(data, quality=11)))
+    return encoders
+
+
+def _is_fresh(path, variant):
+    try:
+        return os.stat(variant).st_mtime >= os.stat(path).st_mtime
+    except OSError:
+        return False
+
+
+def compress_file(path, encoders=None):
+    """Write compressed siblings of ``path``; returns the variant paths written."""
+    with open(path, "rb") as f:
+        data = f.read()
+    written = []
+    for suffix, encode in encoders or _encoders():
+        variant = path + suffix
+        packed = encode(data)
+        if len(packed) > len(data) * (1 - MIN_SAVING):
+            if os.path.exists(variant):
+                os.remove(variant)
+            continue
+        tmp = f"{variant}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(packed)
+        os.replace(tmp, variant)
+        written.append(variant)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--check", action="store_true", help="only report assets with missing or stale copies")
+    args = parser.parse_args(argv)
+
+    if brotli is None:
+        print("brotli is not installed; writing .gz only", file=sys.stderr)
+
+    stale = 0
+    for path in iter_assets():
+        if args.check:
+            if not all(_is_fresh(path, path + suffix) for suffix, _ in _encoders()):
+                stale += 1
+                print(f"  stale: {path}")
+            continue
+        for variant in compress_file(path):
+            before, after = os.path.getsize(path), os.path.getsize(variant)
+            print(f"{variant}: {before} -> {after} bytes")
+    return 1 if stale else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Re-run emotion analysis for rows already in the images table.
+
+Rows are streamed in id order, analysed across a process pool and written
+back one batch per transaction. Progress is checkpointed after every batch
+so an interrupted run resumes where it stopped:
+
+    python reanalyze.py --stale
+    python reanalyze.py --user someone@example.com --since 2025-01-01
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from config import ANALYSIS_WORKERS
+from db import DB_PATH
+from fuzzy_emotion import ALGORITHM_VERSION, analyze_image, warm_up
+from app.services import analysis_cache, emotion_store, storage_service, thumbnail_service
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Re-run fuzzy emotion analysis on stored images.")
+    parser.add_argument("--algorithm", help="only rows whose metadata was produced by this algorithm version")
+    parser.add_argument("--stale", action="store_true", help=f"only rows not already on {ALGORITHM_VERSION}")
+    parser.add_argument("--user", help="only images owned by this email")
+    parser.add_argument("--since", help="only images uploaded on or after this ISO date")
+    parser.add_argument("--until", help="only images uploaded before this ISO date")
+    parser.add_argument("--workers", type=int, default=ANALYSIS_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--checkpoint", default=".reanalyze_checkpoint.json")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    return parser.parse_args(argv)
+
+
+def build_filters(args):
+    clauses, params = [], []
+    if args.algorithm:
+        clauses.append("json_extract(metadata, '$.algorithm') = ?")
+        params.append(args.algorithm)
+    if args.stale:
+        clauses.append("(metadata IS NULL OR json_extract(metadata, '$.algorithm') IS NOT ?)")
+        params.append(ALGORITHM_VERSION)
+    if args.user:
+        clauses.append("user_name = ?")
+        params.append(args.user.strip().lower())
+    if args.since:
+        clauses.append("upload_date >= ?")
+        params.append(args.since)
+    if args.until:
+        clauses.append("upload_date < ?")
+        params.append(args.until)
+    return clauses, params
+
+
+def load_checkpoint(path, filters):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    if state.get("filters") != filters:
+        print("Checkpoint was written for different filters; starting from the beginning")
+        return 0
+    return int(state.get("last_id", 0))
+
+
+def save_checkpoint(path, filters, last_id):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"filters": filters, "last_id": last_id}, f)
+    os.replace(tmp, path)
+
+
+def iter_batches(conn, clauses, params, start_id, batch_size):
+    where = " AND ".join(["id > ?"] + clauses)
+    last_id = start_id
+    while True:
+        rows = conn.execute(
+            f"SELECT id, filename FROM images WHERE {where} ORDER BY id LIMIT ?",
+            [last_id, *params, batch_size]
+        ).fetchall()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def analyze(path):
+    """Worker job: return (cache_key, metadata_json, error).
+
+    Decodes like the upload workers so the shared cache key maps to one result.
+    """
+    try:
+        key = analysis_cache.cache_key(analysis_cache.file_sha256(path))
+        img = thumbnail_service.load_for_analysis(path)
+        return key, json.dumps(analyze_image(img)), None
+    except Exception as exc:
+        return None, None, str(exc)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    clauses, params = build_filters(args)
+    filters = {"clauses": clauses, "params": params}
+    start_id = 0 if args.restart else load_checkpoint(args.checkpoint, filters)
+    if start_id:
+        print(f"Resuming after image id {start_id}")
+
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    done = failed = 0
+    try:
+        # spawn, like analysis_queue: never fork a process that may hold OpenMP/BLAS thread state
+        pool = ProcessPoolExecutor(
+            max_workers=args.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=warm_up
+        )
+        with pool:
+            for rows in iter_batches(conn, clauses, params, start_id, args.batch_size):
+                paths = [storage_service.blob_path(filename) for _, filename in rows]
+                results = list(pool.map(analyze, paths))
+
+                updates = []
+                with conn:
+                    for (image_id, filename), (key, metadata, error) in zip(rows, results):
+                        if error:
+                            failed += 1
+                            print(f"  {image_id} {filename}: {error}", file=sys.stderr)
+                            continue
+                        updates.append((metadata, image_id))
+                        analysis_cache.put(conn, key, metadata, commit=False)
+                    conn.executemany(
+                        "UPDATE images SET metadata = ?, analysis_status = 'done' WHERE id = ?",
+                        updates
+                    )
+                    for metadata, image_id in updates:
+                        emotion_store.store(conn, image_id, metadata)
+                done += len(updates)
+
+                save_checkpoint(args.checkpoint, filters, rows[-1][0])
+                print(f"Processed through id {rows[-1][0]}: {done} updated, {failed} failed")
+    finally:
+        conn.close()
+
+    if os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    print(f"Finished: {done} updated, {failed} failed")
+    return 0 if not failed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,58 @@
 import os
+import tempfile
 import pytest
+from fastapi import FastAPI, Request
 from fastapi.testclient import TestClient
+from starlette.middleware.sessions import SessionMiddleware
 
 
 os.environ["SECRET_KEY"] = "test_secret_key"
 os.environ["GOOGLE_CLIENT_ID"] = "test_client_id"
 os.environ["GOOGLE_CLIENT_SECRET"] = "test_client_secret"
 os.environ["GOOGLE_REDIRECT_URI"] = "test_redirect_uri"
+os.environ["BHV_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "test.db")
+os.environ["COLOR_LUT_CACHE_DIR"] = tempfile.mkdtemp()
 
+import db
 from main import app
 
+db.init_db()
+
 
 @pytest.fixture
 def client():
     return TestClient(app)
+
+
+@pytest.fixture
+def session_app():
+    """Factory for a bare app mounting ``routers`` behind SessionMiddleware.
+
+    GET /test-login copies ``session`` into the session cookie, standing in
+    for the real login flow.
+    """
+    def build(*routers, session, **app_kwargs):
+        app = FastAPI(**app_kwargs)
+        app.add_middleware(SessionMiddleware, secret_key="test")
+
+        @app.get("/test-login")
+        def login(request: Request):
+            request.session.update(session)
+            return {}
+
+        for router in routers:
+            app.include_router(router)
+        return app
+    return build
+
+
+@pytest.fixture
+def session_client(session_app):
+    """Factory for a TestClient on session_app(), logged in unless ``login=False``."""
+    def build(*routers, session, login=True, **app_kwargs):
+        client = TestClient(session_app(*routers, session=session, **app_kwargs))
+        if login:
+            client.get("/test-login")
+        return client
+    return build
+
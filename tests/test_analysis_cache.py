@@ -0,0 +1,72 @@
+import sqlite3
+import time
+
+import pytest
+
+import db
+from app.services import analysis_cache
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.execute("DELETE FROM analysis_cache")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_cache_key_covers_content_and_parameters():
+    base = analysis_cache.cache_key("ab" * 32, k=5, size=200, engine="kmeans")
+
+    assert base.startswith("ab" * 32)
+    assert "fuzzy-color-v2" in base
+    assert analysis_cache.cache_key("cd" * 32, k=5, size=200, engine="kmeans") != base
+    assert analysis_cache.cache_key("ab" * 32, k=6, size=200, engine="kmeans") != base
+    assert analysis_cache.cache_key("ab" * 32, k=5, size=100, engine="kmeans") != base
+    assert analysis_cache.cache_key("ab" * 32, k=5, size=200, engine="histogram") != base
+
+
+def test_file_sha256(tmp_path):
+    path = tmp_path / "blob.bin"
+    path.write_bytes(b"hello")
+    assert analysis_cache.file_sha256(path) == (
+        "2cf24dba5fb0a30e26e83b2ac5b9e29e1b161e5c1fa7425e73043362938b9824"
+    )
+
+
+def test_put_get_round_trip(conn):
+    assert analysis_cache.get(conn, "missing") is None
+
+    analysis_cache.put(conn, "key-1", '{"algorithm": "fuzzy-color-v2"}')
+    assert analysis_cache.get(conn, "key-1") == '{"algorithm": "fuzzy-color-v2"}'
+
+
+def test_put_evicts_least_recently_used(conn):
+    for i in range(5):
+        analysis_cache.put(conn, f"key-{i}", "{}", max_entries=3)
+
+    keys = {r[0] for r in conn.execute("SELECT cache_key FROM analysis_cache")}
+    assert keys == {"key-2", "key-3", "key-4"}
+
+
+def test_get_refreshes_recency_within_a_second(conn):
+    for i in range(3):
+        analysis_cache.put(conn, f"key-{i}", "{}")
+    time.sleep(0.01)
+    analysis_cache.get(conn, "key-0")
+    time.sleep(0.01)
+    analysis_cache.put(conn, "key-3", "{}", max_entries=3)
+
+    keys = {r[0] for r in conn.execute("SELECT cache_key FROM analysis_cache")}
+    assert keys == {"key-0", "key-2", "key-3"}
+
+
+def test_get_can_leave_the_transaction_to_the_caller(conn):
+    analysis_cache.put(conn, "key-1", "{}")
+    conn.execute("INSERT INTO analysis_cache (cache_key, metadata) VALUES ('key-2', '{}')")
+
+    assert analysis_cache.get(conn, "key-1", commit=False) == "{}"
+    assert conn.in_transaction
+    conn.rollback()
+    assert analysis_cache.get(conn, "key-2") is None
@@ -0,0 +1,95 @@
+import json
+import sqlite3
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import db
+from app.services import analysis_cache, analysis_queue
+
+
+@pytest.fixture
+def pending_row():
+    def _insert(filename):
+        conn = sqlite3.connect(db.DB_PATH)
+        cur = conn.execute(
+            "INSERT INTO images (user_name, filename, analysis_status) VALUES (?, ?, 'pending')",
+            ("queue@test.dev", filename)
+        )
+        conn.commit()
+        conn.close()
+        return cur.lastrowid
+    return _insert
+
+
+def _row(image_id):
+    conn = sqlite3.connect(db.DB_PATH)
+    row = conn.execute(
+        "SELECT analysis_status, metadata FROM images WHERE id=?", (image_id,)
+    ).fetchone()
+    conn.close()
+    return row
+
+
+def test_submit_fills_in_metadata(tmp_path, pending_row):
+    path = tmp_path / "img.png"
+    arr = np.random.default_rng(0).integers(0, 256, size=(64, 64, 3), dtype=np.uint8)
+    Image.fromarray(arr).save(path)
+    image_id = pending_row(path.name)
+
+    assert analysis_queue.submit(image_id, path).result(timeout=120) == "done"
+
+    status, metadata = _row(image_id)
+    assert status == "done"
+    assert json.loads(metadata)["algorithm"] == "fuzzy-color-v2"
+
+
+def test_submit_marks_unreadable_image_failed(tmp_path, pending_row):
+    path = tmp_path / "broken.jpg"
+    path.write_bytes(b"not an image")
+    image_id = pending_row(path.name)
+
+    assert analysis_queue.submit(image_id, path).result(timeout=120) == "failed"
+    assert _row(image_id) == ("failed", None)
+
+
+def test_submit_populates_analysis_cache(tmp_path, pending_row):
+    path = tmp_path / "cached.png"
+    arr = np.random.default_rng(1).integers(0, 256, size=(48, 48, 3), dtype=np.uint8)
+    Image.fromarray(arr).save(path)
+    key = analysis_cache.cache_key(analysis_cache.file_sha256(path))
+    image_id = pending_row(path.name)
+
+    analysis_queue.submit(image_id, path, key).result(timeout=120)
+
+    conn = sqlite3.connect(db.DB_PATH)
+    try:
+        assert analysis_cache.get(conn, key) == _row(image_id)[1]
+    finally:
+        conn.close()
+
+
+def test_resume_pending_is_claimed_by_one_worker(pending_row, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(analysis_queue, "submit", lambda image_id, path: submitted.append(image_id))
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.execute("UPDATE images SET analysis_status = 'done' WHERE analysis_status = 'pending'")
+    conn.commit()
+    image_id = pending_row("resume.png")
+    try:
+        # Two server workers starting together
+        assert analysis_queue.resume_pending(conn) == 1
+        assert analysis_queue.resume_pending(conn) == 0
+        assert submitted == [image_id]
+
+        # A later start takes over claims from an earlier one
+        time.sleep(0.01)
+        assert analysis_queue.resume_pending(conn, window=0) == 1
+        assert submitted == [image_id, image_id]
+    finally:
+        conn.execute("DELETE FROM images WHERE id = ?", (image_id,))
+        conn.commit()
+        conn.close()
+
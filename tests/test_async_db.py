@@ -0,0 +1,61 @@
+import asyncio
+import threading
+import time
+
+import httpx
+
+import db
+from app.routers import export
+
+EXPORT_SECONDS = 0.6
+
+
+def test_run_db_runs_off_the_event_loop_thread():
+    async def main():
+        return threading.current_thread(), await db.run_db(threading.current_thread)
+
+    loop_thread, worker = asyncio.run(main())
+    assert worker is not loop_thread
+    assert worker.name.startswith("db")
+
+
+def test_slow_export_does_not_block_other_requests(monkeypatch, session_app):
+    original = export.generate_user_csv
+
+    def slow_generate(conn, user_email):
+        time.sleep(EXPORT_SECONDS)  # stands in for a long query on a large gallery
+        return original(conn, user_email)
+
+    monkeypatch.setattr(export, "generate_user_csv", slow_generate)
+
+    app = session_app(export.router, session={"email": "async@test.dev"})
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await client.get("/test-login")
+            started = time.perf_counter()
+            export_task = asyncio.create_task(client.get("/my-data/csv"))
+            await asyncio.sleep(0.05)
+
+            pings = []
+            while not export_task.done():
+                t = time.perf_counter()
+                assert (await client.get("/ping")).status_code == 200
+                pings.append(time.perf_counter() - t)
+                await asyncio.sleep(0.02)
+            response = await export_task
+            return response, time.perf_counter() - started, pings
+
+    response, elapsed, pings = asyncio.run(main())
+
+    assert response.status_code == 200
+    assert response.text.startswith("Title,Description")
+    assert elapsed >= EXPORT_SECONDS
+    # Had the export run on the loop, the first ping would have waited for all of it
+    assert len(pings) >= 5
+    assert max(pings) < EXPORT_SECONDS / 2
@@ -37,3 +37,8 @@ def test_update_narrative_requires_auth(client):
 
 
 #my code
+
+
+def test_analysis_status_requires_login(client):
+    res = client.get("/gallery/status/fake.jpg", follow_redirects=False)
+    assert res.status_code in (302, 303)
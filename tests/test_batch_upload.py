@@ -0,0 +1,96 @@
+import io
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import db
+from app.routers import gallery
+from app.services import storage_service
+
+
+@pytest.fixture
+def user_client(tmp_path, monkeypatch, session_client):
+    monkeypatch.setattr(storage_service, "UPLOAD_DIR", str(tmp_path))
+    return session_client(gallery.router, session={"email": "batch@test.dev"})
+
+
+def _png(seed, size=(96, 64)):
+    arr = np.random.default_rng(seed).integers(0, 256, size=(size[1], size[0], 3), dtype=np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(arr).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def test_batch_upload_reports_each_file(user_client):
+    first, second = _png(10), _png(11, size=(400, 300))
+    files = [
+        ("images", ("a.png", first, "image/png")),
+        ("images", ("b.png", second, "image/png")),
+        ("images", ("a-again.png", first, "image/png")),
+        ("images", ("notes.txt", b"hello", "text/plain")),
+        ("images", ("fake.jpg", b"not really a jpeg", "image/jpeg")),
+    ]
+
+    res = user_client.post("/upload/batch", files=files, data={"visibility": "public"})
+
+    assert res.status_code == 200
+    body = res.json()
+    assert (body["uploaded"], body["rejected"]) == (2, 3)
+    statuses = [(r["file"], r["status"], r.get("error")) for r in body["results"]]
+    assert statuses == [
+        ("a.png", "done", None),
+        ("b.png", "done", None),
+        ("a-again.png", "rejected", "duplicate_image"),
+        ("notes.txt", "rejected", "invalid_file_type"),
+        ("fake.jpg", "rejected", "invalid_image"),
+    ]
+    assert body["results"][0]["metadata"]["algorithm"] == "fuzzy-color-v2"
+
+    conn = sqlite3.connect(db.DB_PATH)
+    try:
+        rows = conn.execute(
+            "SELECT filename, analysis_status, thumbnails FROM images WHERE user_name=? ORDER BY id",
+            ("batch@test.dev",)
+        ).fetchall()
+    finally:
+        conn.close()
+    assert [r[0] for r in rows] == [body["results"][0]["filename"], body["results"][1]["filename"]]
+    assert all(status == "done" for _, status, _ in rows)
+    # b.png is larger than the smallest thumbnail width, so it gets one next to its blob
+    assert rows[1][2] != "[]"
+    thumb = storage_service.blob_path(os.path.splitext(rows[1][0])[0] + "_160.webp")
+    assert os.path.exists(thumb)
+
+
+def test_failed_batch_leaves_no_files(user_client, tmp_path, monkeypatch):
+    inserted = []
+
+    def insert_then_fail(db, user_email, upload, *args):
+        if inserted:
+            raise sqlite3.OperationalError("disk I/O error")
+        inserted.append(upload["filename"])
+        return real_insert(db, user_email, upload, *args)
+
+    real_insert = gallery._insert_image
+    monkeypatch.setattr(gallery, "_insert_image", insert_then_fail)
+    files = [
+        ("images", ("c.png", _png(20, size=(400, 300)), "image/png")),
+        ("images", ("d.png", _png(21, size=(400, 300)), "image/png")),
+    ]
+
+    with pytest.raises(sqlite3.OperationalError):
+        user_client.post("/upload/batch", files=files)
+
+    stored = [name for _, _, names in os.walk(tmp_path) for name in names]
+    assert stored == []
+    conn = sqlite3.connect(db.DB_PATH)
+    try:
+        assert conn.execute(
+            "SELECT COUNT(*) FROM blobs WHERE name=?", (inserted[0],)
+        ).fetchone()[0] == 0
+    finally:
+        conn.close()
+
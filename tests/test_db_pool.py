@@ -0,0 +1,44 @@
+import sqlite3
+
+import pytest
+
+import db
+
+
+def test_pool_reuses_configured_connections(tmp_path):
+    path = str(tmp_path / "pool.db")
+    sqlite3.connect(path).execute("PRAGMA journal_mode = WAL").close()
+    pool = db.ConnectionPool(path, size=2)
+
+    with pool.connection() as first:
+        assert first.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert first.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        first.execute("CREATE TABLE t (x)")
+        first.execute("INSERT INTO t VALUES (1)")  # never committed
+    with pool.connection() as second:
+        assert second is first
+        assert second.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    pool.close()
+
+
+def test_read_pool_is_query_only(tmp_path):
+    path = str(tmp_path / "pool.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (x)")
+    conn.close()
+
+    with db.ConnectionPool(path, size=1, readonly=True).connection() as reader:
+        assert reader.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+        with pytest.raises(sqlite3.OperationalError):
+            reader.execute("INSERT INTO t VALUES (1)")
+
+
+def test_overflow_connections_are_closed(tmp_path):
+    pool = db.ConnectionPool(str(tmp_path / "pool.db"), size=1)
+    a, b = pool.acquire(), pool.acquire()
+    pool.release(a)
+    pool.release(b)
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        b.execute("SELECT 1")
+    assert pool.acquire() is a
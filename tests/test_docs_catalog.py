@@ -0,0 +1,66 @@
+import sqlite3
+
+import pytest
+
+import migrations
+from app.services import docs_catalog
+
+DEFAULTS = [{"slug": "builtin", "title": "Built in", "section": "General", "tags": "a"}]
+
+
+@pytest.fixture
+def conn(tmp_path):
+    path = str(tmp_path / "catalog.db")
+    migrations.migrate(path)
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    docs_catalog.invalidate()
+    yield conn
+    docs_catalog.invalidate()
+    conn.close()
+
+
+def _add(conn, slug, section, tags):
+    conn.execute(
+        "INSERT INTO docs_entries (slug, title, section, content, tags) VALUES (?, ?, ?, 'x', ?)",
+        (slug, slug.title(), section, tags)
+    )
+
+
+def test_cache_hits_skip_the_database(conn, monkeypatch):
+    _add(conn, "beta", "Guides", "setup, db")
+    _add(conn, "alpha", "api", "db")
+    statements = []
+    conn.set_trace_callback(statements.append)
+
+    catalog = docs_catalog.get(conn, DEFAULTS)
+    assert [d["slug"] for d in catalog["entries"]] == ["alpha", "beta"]
+    assert [(name, [d["slug"] for d in docs]) for name, docs in catalog["nav"]] == [
+        ("api", ["alpha"]), ("Guides", ["beta"])
+    ]
+    assert catalog["tag_counts"] == [("db", 2), ("setup", 1)]
+
+    statements.clear()
+    assert docs_catalog.get(conn, DEFAULTS) is catalog
+    assert statements == []
+
+    monkeypatch.setattr(docs_catalog, "DOCS_CATALOG_RECHECK_SECONDS", 0)
+    assert docs_catalog.get(conn, DEFAULTS) is catalog
+    assert len(statements) == 1  # only the version counter
+
+
+def test_writes_from_any_connection_invalidate(conn, monkeypatch):
+    monkeypatch.setattr(docs_catalog, "DOCS_CATALOG_RECHECK_SECONDS", 0)
+    empty = docs_catalog.get(conn, DEFAULTS)
+    assert not empty["published"] and empty["by_slug"].keys() == {"builtin"}
+
+    other_worker = sqlite3.connect(conn.execute("PRAGMA database_list").fetchone()[2])
+    _add(other_worker, "gamma", "Guides", "")
+    other_worker.commit()
+    other_worker.close()
+
+    catalog = docs_catalog.get(conn, DEFAULTS)
+    assert catalog["published"] and list(catalog["by_slug"]) == ["gamma"]
+
+    conn.execute("UPDATE docs_entries SET is_published = 0")
+    assert docs_catalog.get(conn, DEFAULTS)["by_slug"].keys() == {"builtin"}
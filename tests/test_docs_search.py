@@ -0,0 +1,65 @@
+import re
+import sqlite3
+
+import pytest
+
+import db
+from app.routers import pages
+from app.services import docs_catalog
+
+
+def _doc(title, content, summary="", tags=""):
+    return {
+        "title": title, "section": "Search tests", "summary": summary, "content": content,
+        "tags": tags, "attachment_name": None, "created_by": "admin@test.dev",
+    }
+
+
+@pytest.fixture
+def docs_client(session_client):
+    conn = sqlite3.connect(db.DB_PATH)
+    slugs = [
+        pages._insert_doc(conn, _doc("Palette engines", "Choosing a <b>clustering</b> backend.")),
+        pages._insert_doc(conn, _doc("Deployment", "Workers warm the palette cache at startup.")),
+        pages._insert_doc(conn, _doc("Drafts", "Unpublished palette notes.")),
+    ]
+    conn.execute("UPDATE docs_entries SET is_published = 0 WHERE slug = ?", (slugs[2],))
+    conn.commit()
+    docs_catalog.invalidate()
+
+    # docs_url=None: the app serves its own /docs
+    client = session_client(pages.router, session={"user": "Reader"}, docs_url=None)
+    yield client
+
+    conn.executemany("DELETE FROM docs_entries WHERE slug = ?", [(s,) for s in slugs])
+    conn.commit()
+    conn.close()
+    docs_catalog.invalidate()
+
+
+def _cards(page):
+    return re.findall(r'<article class="doc-card">(.*?)</article>', page, re.S)
+
+
+def test_docs_search_ranks_highlights_and_escapes(docs_client):
+    cards = _cards(docs_client.get("/docs", params={"q": "palet"}).text)
+
+    assert len(cards) == 2  # prefix match; the unpublished draft is left out
+    assert "<mark>Palette</mark> engines" in cards[0]  # title hits outrank content hits
+    assert "<mark>palette</mark> cache" in cards[1]
+
+    cards = _cards(docs_client.get("/docs", params={"q": "clustering backend"}).text)
+    assert len(cards) == 1
+    assert "&lt;b&gt;<mark>clustering</mark>&lt;/b&gt; <mark>backend</mark>" in cards[0]
+
+    assert _cards(docs_client.get("/docs", params={"q": '"" -- *'}).text) == []
+
+
+def test_docs_updates_reach_the_index(docs_client):
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.execute("UPDATE docs_entries SET content = 'Now about thumbnails.' WHERE title = 'Deployment'")
+    conn.commit()
+    conn.close()
+
+    assert len(_cards(docs_client.get("/docs", params={"q": "thumbnails"}).text)) == 1
+    assert len(_cards(docs_client.get("/docs", params={"q": "palette"}).text)) == 1
@@ -0,0 +1,90 @@
+import json
+import sqlite3
+
+import numpy as np
+from PIL import Image
+
+import migrations
+from app.services import emotion_store
+from fuzzy_emotion import analyze_image
+
+
+def _analysis():
+    rng = np.random.default_rng(3)
+    arr = rng.integers(0, 256, size=(48, 64, 3), dtype=np.uint8)
+    return json.dumps(analyze_image(Image.fromarray(arr)))
+
+
+TIED = json.dumps({
+    "palette": [
+        {"color": "red", "weight": 0.5, "centroid_rgb": [250, 10, 10]},
+        {"color": "blue", "weight": 0.5, "centroid_rgb": [10, 10, 250]},
+        {"color": 7, "weight": 0.9},
+    ],
+    "emotion_space": {"sadness": 0.4, "anger": 0.4, "joy": "lots"},
+    "emotion_groups": {"positive": "n/a", "neutral": 0.2, "negative": 0.8},
+    "confidence": True,
+})
+
+
+def test_derive_reads_analysis_output():
+    metadata = _analysis()
+    meta = json.loads(metadata)
+
+    columns, palette = emotion_store.derive(metadata)
+
+    top = max(meta["palette"], key=lambda p: p["weight"])
+    assert columns["dominant_color"] == top["color"]
+    assert columns["emotion_positive"] == meta["emotion_groups"]["positive"]
+    assert columns["brightness"] == meta["visual_stats"]["avg_brightness"]
+    assert [row[1] for row in palette] == [p["color"] for p in meta["palette"]]
+    assert emotion_store.derive("not json") == (dict.fromkeys(emotion_store.COLUMNS), [])
+
+
+def _palette(conn, image_id):
+    return conn.execute(
+        "SELECT position, color, weight, r, g, b, lab_distance FROM image_palette "
+        "WHERE image_id = ? ORDER BY position",
+        (image_id,)
+    ).fetchall()
+
+
+def test_migration_backfill_matches_store(tmp_path, monkeypatch):
+    path = str(tmp_path / "backfill.db")
+    full = migrations.MIGRATIONS
+    monkeypatch.setattr(migrations, "MIGRATIONS", [m for m in full if m[0] < 8])
+    monkeypatch.setattr(migrations, "LATEST_VERSION", 7)
+    migrations.migrate(path)
+
+    samples = [_analysis(), TIED, "{broken", None, "[1, 2]"]
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO images (user_name, filename, metadata) VALUES ('u@test.dev', ?, ?)",
+        [(f"{i}.png", metadata) for i, metadata in enumerate(samples)]
+    )
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", full)
+    monkeypatch.setattr(migrations, "LATEST_VERSION", full[-1][0])
+    migrations.migrate(path)
+
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute(
+            f"SELECT id, metadata, {', '.join(emotion_store.COLUMNS)} FROM images ORDER BY id"
+        ).fetchall()
+        for image_id, metadata, *backfilled in rows:
+            columns, palette = emotion_store.derive(metadata)
+            assert backfilled == [columns[name] for name in emotion_store.COLUMNS], metadata
+            assert _palette(conn, image_id) == palette, metadata
+
+        tied_id = rows[1][0]
+        emotion_store.store(conn, tied_id, TIED)
+        assert conn.execute(
+            "SELECT dominant_color, dominant_emotion, emotion_positive, confidence FROM images WHERE id = ?",
+            (tied_id,)
+        ).fetchone() == ("red", "anger", None, None)
+        assert [row[1] for row in _palette(conn, tied_id)] == ["red", "blue"]
+    finally:
+        conn.close()
@@ -0,0 +1,195 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+from skimage import color as skcolor
+
+import fuzzy_emotion
+from fuzzy_emotion import (
+    PALETTE_ENGINES,
+    REFERENCE_RGB,
+    _nearest_named_colors,
+    detect_fuzzy_emotion,
+    detect_fuzzy_emotion_v1,
+    name_colors,
+    rgb_to_lab,
+)
+
+
+def _corpus():
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:240, 0:320]
+
+    gradient = np.stack([xx * 255 / 319, yy * 255 / 239, np.full_like(xx, 128)], axis=-1)
+
+    blocks = np.zeros((300, 300, 3))
+    blocks[:150, :150] = (220, 20, 60)
+    blocks[:150, 150:] = (30, 144, 255)
+    blocks[150:, :150] = (255, 215, 0)
+    blocks[150:, 150:] = (34, 139, 34)
+
+    noise = rng.integers(0, 256, size=(180, 260, 3))
+
+    portrait = np.zeros((400, 120, 3))
+    portrait[:] = (128, 0, 128)
+    portrait[200:] = (240, 240, 240)
+
+    tiny = rng.integers(0, 256, size=(12, 9, 3))
+
+    return {
+        "gradient": gradient,
+        "blocks": blocks,
+        "noise": noise,
+        "portrait": portrait,
+        "tiny": tiny,
+    }
+
+
+# v1 measured visual stats on a 200x200 resample of the full image, v2 reuses
+# the aspect-preserving analysis buffer; they only drift apart where that
+# resample itself changes the pixels (smoothing noise, upscaling a 12x9 image).
+STATS_TOLERANCE = {"noise": 0.06, "tiny": 0.12}
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory):
+    root = tmp_path_factory.mktemp("corpus")
+    paths = {}
+    for name, arr in _corpus().items():
+        path = root / f"{name}.png"
+        Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8)).save(path)
+        paths[name] = str(path)
+    return paths
+
+
+def test_rgb_to_lab_matches_skimage():
+    arr = np.random.default_rng(1).random((50, 40, 3))
+    assert np.allclose(rgb_to_lab(arr), skcolor.rgb2lab(arr), atol=1e-6)
+
+
+@pytest.mark.parametrize("name", ["gradient", "blocks", "noise", "portrait", "tiny"])
+def test_v2_matches_v1(corpus, name):
+    v1 = detect_fuzzy_emotion_v1(corpus[name])
+    v2 = detect_fuzzy_emotion(corpus[name])
+
+    assert v1["algorithm"] == "fuzzy-color-v1"
+    assert v2["algorithm"] == "fuzzy-color-v2"
+    assert set(v2) == set(v1)
+
+    assert [p["color"] for p in v2["palette"]] == [p["color"] for p in v1["palette"]]
+    for p1, p2 in zip(v1["palette"], v2["palette"]):
+        assert p2["weight"] == pytest.approx(p1["weight"], abs=1e-6)
+        assert p2["centroid_rgb"] == p1["centroid_rgb"]
+        assert p2["lab_distance"] == pytest.approx(p1["lab_distance"], abs=1e-2)
+
+    assert v2["emotion_space"] == pytest.approx(v1["emotion_space"], abs=1e-6)
+    assert v2["emotion_groups"] == pytest.approx(v1["emotion_groups"], abs=1e-6)
+    assert v2["visual_stats"] == pytest.approx(
+        v1["visual_stats"], abs=STATS_TOLERANCE.get(name, 1e-3)
+    )
+    assert v2["confidence"] == pytest.approx(v1["confidence"], abs=1e-6)
+
+
+@pytest.mark.parametrize("engine", sorted(PALETTE_ENGINES))
+def test_palette_engines_find_dominant_colors(corpus, engine):
+    meta = detect_fuzzy_emotion(corpus["blocks"], palette_engine=engine)
+
+    assert meta["palette_engine"] == engine
+    assert sum(p["weight"] for p in meta["palette"]) == pytest.approx(1.0, abs=1e-4)
+
+    by_color = {}
+    for p in meta["palette"]:
+        by_color[p["color"]] = by_color.get(p["color"], 0.0) + p["weight"]
+    assert set(by_color) == {"red", "blue", "yellow", "green"}
+    for weight in by_color.values():
+        assert weight == pytest.approx(0.25, abs=0.01)
+
+
+def test_unknown_palette_engine_rejected(corpus):
+    with pytest.raises(ValueError):
+        detect_fuzzy_emotion(corpus["blocks"], palette_engine="nope")
+
+
+@pytest.fixture
+def lut_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(fuzzy_emotion, "COLOR_LUT_CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_name_colors_reference_colors(lut_dir):
+    names = name_colors(np.array(list(REFERENCE_RGB.values()), dtype=np.uint8))
+    assert list(names) == list(REFERENCE_RGB)
+
+
+def test_name_colors_agrees_with_exact_lookup(lut_dir):
+    rgb = np.random.default_rng(2).integers(0, 256, size=(2000, 3))
+    exact, _ = _nearest_named_colors(rgb)
+    assert np.mean(name_colors(rgb) == np.array(exact)) > 0.95
+
+
+def test_color_lut_is_memory_mapped_cache_file(lut_dir):
+    lut = fuzzy_emotion.color_lut(32)
+
+    assert isinstance(lut, np.memmap)
+    assert lut.shape == (32, 32, 32)
+    assert len(list(lut_dir.glob("color_lut_32_*.npy"))) == 1
+    assert name_colors(np.zeros((4, 4, 3)), bins=32).shape == (4, 4)
+
+
+def test_import_defers_scientific_stack(tmp_path):
+    probe = (
+        "import sys, app.routers.gallery, fuzzy_emotion\n"
+        "print(sorted(m for m in ('sklearn', 'skimage', 'scipy') if m in sys.modules))\n"
+        "fuzzy_emotion.warm_up()\n"
+        "print('sklearn' in sys.modules)"
+    )
+    env = {**os.environ, "COLOR_LUT_CACHE_DIR": str(tmp_path)}
+    out = subprocess.run(
+        [sys.executable, "-c", probe], check=True, capture_output=True, text=True, env=env
+    ).stdout.split()
+    assert out == ["[]", "True"]
+
+
+@pytest.mark.parametrize("mode", ["P", "RGBA", "LA", "CMYK"])
+def test_load_analysis_image_converts_after_downscaling(tmp_path, monkeypatch, mode):
+    src = Image.new("RGB", (1600, 1200), (200, 40, 40))
+    img = src.quantize(16) if mode == "P" else src.convert(mode)
+    path = tmp_path / ("large.tiff" if mode == "CMYK" else "large.png")
+    img.save(path)
+
+    converted = []
+    convert = Image.Image.convert
+
+    def spy(self, *args, **kwargs):
+        converted.append(self.size)
+        return convert(self, *args, **kwargs)
+
+    monkeypatch.setattr(Image.Image, "convert", spy)
+    small = fuzzy_emotion.load_analysis_image(str(path))
+
+    assert small.size == (200, 150) and small.mode == "RGB"
+    assert converted and max(w for w, _ in converted) <= 400
+
+
+def test_misconfigured_palette_engine_fails_on_import():
+    env = {**os.environ, "PALETTE_ENGINE": "kmeens"}
+    out = subprocess.run(
+        [sys.executable, "-c", "import fuzzy_emotion"], capture_output=True, text=True, env=env
+    )
+    assert out.returncode != 0
+    assert "PALETTE_ENGINE='kmeens' is not one of: kmeans," in out.stderr
+
+
+def test_load_analysis_image_downscales_and_caps_pixels(tmp_path):
+    path = tmp_path / "large.jpg"
+    Image.new("RGB", (4000, 3000), (30, 144, 255)).save(path, quality=90)
+
+    small = fuzzy_emotion.load_analysis_image(str(path))
+    assert small.size == (200, 150)
+    assert small.mode == "RGB"
+
+    with pytest.raises(ValueError):
+        fuzzy_emotion.load_analysis_image(str(path), max_pixels=1_000_000)
@@ -0,0 +1,70 @@
+import sqlite3
+import threading
+
+import migrations
+
+
+def _tables(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    finally:
+        conn.close()
+
+
+def test_fresh_database_is_migrated_once(tmp_path):
+    path = str(tmp_path / "fresh.db")
+
+    applied = migrations.migrate(path)
+
+    assert [v for v, _ in applied] == [v for v, _, _ in migrations.MIGRATIONS]
+    assert {"users", "images", "admins", "docs_entries", "analysis_cache", "blobs"} <= _tables(path)
+    assert migrations.migrate(path) == []
+
+
+def test_legacy_database_is_adopted(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE, "
+                 "email TEXT UNIQUE NOT NULL, password TEXT, is_private INTEGER DEFAULT 0)")
+    conn.execute("INSERT INTO users (name, email) VALUES ('Ann', 'ann@test.dev')")
+    conn.execute("CREATE TABLE images (id INTEGER PRIMARY KEY AUTOINCREMENT, user_name TEXT NOT NULL, "
+                 "filename TEXT NOT NULL, metadata TEXT, visibility TEXT DEFAULT 'private', "
+                 "narrative TEXT, upload_date TEXT DEFAULT CURRENT_TIMESTAMP, file_size REAL, "
+                 "analysis_status TEXT DEFAULT 'done')")
+    conn.commit()
+    conn.close()
+
+    migrations.migrate(path)
+
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute("SELECT email FROM users").fetchall() == [("ann@test.dev",)]
+        users_sql = conn.execute("SELECT sql FROM sqlite_master WHERE name='users'").fetchone()[0]
+        assert "name TEXT UNIQUE" not in users_sql
+        columns = {r[1] for r in conn.execute("PRAGMA table_info(images)")}
+        assert {"analysis_status", "thumbnails", "original_file_size"} <= columns
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    finally:
+        conn.close()
+
+
+def test_concurrent_workers_apply_each_migration_once(tmp_path):
+    path = str(tmp_path / "race.db")
+    results = []
+
+    def worker():
+        results.append(migrations.migrate(path))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sum(len(r) for r in results) == len(migrations.MIGRATIONS)
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM schema_migrations").fetchone()[0] == len(migrations.MIGRATIONS)
+    finally:
+        conn.close()
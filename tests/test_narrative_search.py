@@ -0,0 +1,121 @@
+import sqlite3
+
+import pytest
+
+import db
+import migrations
+from app.routers import narrative
+from app.services import fts
+
+FILES = ("n1.png", "n2.png", "n3.png", "n4.png", "n5.png")
+
+
+def _match(conn, text):
+    return sorted(
+        r[0] for r in conn.execute(
+            "SELECT i.filename FROM narratives_fts JOIN images i ON i.id = narratives_fts.rowid "
+            "WHERE narratives_fts MATCH ?",
+            (fts.prefix_terms(text),)
+        )
+    )
+
+
+def test_migration_indexes_existing_narratives(tmp_path, monkeypatch):
+    path = str(tmp_path / "narratives.db")
+    full = migrations.MIGRATIONS
+    monkeypatch.setattr(migrations, "MIGRATIONS", [m for m in full if m[0] < 13])
+    monkeypatch.setattr(migrations, "LATEST_VERSION", 12)
+    migrations.migrate(path)
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO images (user_name, filename, narrative) VALUES ('old@test.dev', ?, ?)",
+        [("o1.png", "Lanterns over the river"), ("o2.png", ""), ("o3.png", None)]
+    )
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", full)
+    monkeypatch.setattr(migrations, "LATEST_VERSION", full[-1][0])
+    migrations.migrate(path)
+
+    conn = sqlite3.connect(path)
+    try:
+        assert _match(conn, "lantern") == ["o1.png"]
+        assert conn.execute("SELECT COUNT(*) FROM narratives_fts_docsize").fetchone()[0] == 1
+        conn.execute("UPDATE images SET narrative = 'River at night' WHERE filename = 'o3.png'")
+        conn.execute("DELETE FROM images WHERE filename = 'o1.png'")
+        assert _match(conn, "river") == ["o3.png"]
+        conn.execute("INSERT INTO narratives_fts(narratives_fts) VALUES ('integrity-check')")
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def narrative_client(session_client):
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.executemany(
+        "INSERT INTO images (user_name, filename, narrative, upload_date) VALUES (?, ?, ?, ?)",
+        [
+            ("writer@test.dev", "n1.png", "A quiet harbour at dawn", "2025-03-01"),
+            ("writer@test.dev", "n2.png", "Harbour lights, harbour <b>noise</b>, harbour again", "2025-03-02"),
+            ("writer@test.dev", "n3.png", "Walking past the harbour wall", "2025-03-03"),
+            ("writer@test.dev", "n4.png", "", "2025-03-04"),
+            # Tokenizes like writer@test.dev, so only the exact user_name check tells them apart
+            ("writer.test@dev.org", "n5.png", "Someone else's harbour", "2025-03-05"),
+        ]
+    )
+    conn.commit()
+    conn.close()
+
+    client = session_client(narrative.router, session={"email": "writer@test.dev"}, login=False)
+    yield client
+
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.execute(f"DELETE FROM images WHERE filename IN ({', '.join('?' * len(FILES))})", FILES)
+    conn.commit()
+    conn.close()
+
+
+def test_narratives_fts_follows_writes(narrative_client):
+    conn = sqlite3.connect(db.DB_PATH)
+    try:
+        assert _match(conn, "harb") == ["n1.png", "n2.png", "n3.png", "n5.png"]
+
+        conn.execute("UPDATE images SET narrative = 'Lighthouse keeper' WHERE filename = 'n4.png'")
+        conn.execute("UPDATE images SET narrative = '' WHERE filename = 'n1.png'")
+        conn.execute("UPDATE images SET visibility = 'public' WHERE filename = 'n3.png'")
+        conn.execute("DELETE FROM images WHERE filename = 'n5.png'")
+        assert _match(conn, "harbour") == ["n2.png", "n3.png"]
+        assert _match(conn, "lighthouse") == ["n4.png"]
+        # Raises if the index and images.narrative have drifted apart
+        conn.execute("INSERT INTO narratives_fts(narratives_fts) VALUES ('integrity-check')")
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def test_search_is_ranked_scoped_and_paged(narrative_client, monkeypatch):
+    assert narrative_client.get("/narratives/search", params={"q": "harbour"}).status_code == 401
+    narrative_client.get("/test-login")
+
+    body = narrative_client.get("/narratives/search", params={"q": "harbour"}).json()
+    names = [r["filename"] for r in body["results"]]
+    assert names[0] == "n2.png"  # three hits beat one
+    assert sorted(names) == ["n1.png", "n2.png", "n3.png"]
+    assert body["next_cursor"] is None
+    assert "<mark>Harbour</mark>" in body["results"][0]["snippet_html"]
+    assert "&lt;b&gt;noise&lt;/b&gt;" in body["results"][0]["snippet_html"]
+
+    monkeypatch.setattr(narrative, "GALLERY_PAGE_SIZE", 2)
+    first = narrative_client.get("/narratives/search", params={"q": "harbour"}).json()
+    second = narrative_client.get(
+        "/narratives/search", params={"q": "harbour", "cursor": first["next_cursor"]}
+    ).json()
+    assert [r["filename"] for r in first["results"] + second["results"]] == names
+    assert second["next_cursor"] is None
+
+    # The owner's address is only a filter, never a search term
+    assert narrative_client.get("/narratives/search", params={"q": "writer"}).json()["results"] == []
+
+    empty = narrative_client.get("/narratives/search", params={"q": "  "}).json()
+    assert empty["results"] == [] and empty["next_cursor"] is None
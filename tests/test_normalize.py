@@ -0,0 +1,57 @@
+import hashlib
+
+from PIL import Image
+
+from app.services import normalize_service
+from app.services.normalize_service import normalize_file
+
+
+def _exif_jpeg(path, size, orientation):
+    exif = Image.Exif()
+    exif[0x0112] = orientation  # Orientation
+    exif[0x010F] = "TestCam"    # Make
+    Image.new("RGB", size, (200, 40, 40)).save(path, quality=95, exif=exif.tobytes())
+
+
+def test_normalize_rotates_caps_and_strips(tmp_path):
+    path = tmp_path / "camera.jpg"
+    _exif_jpeg(path, (4000, 3000), orientation=6)  # stored sideways
+
+    ext, size, digest = normalize_file(str(path), max_edge=1000, quality=80)
+
+    assert ext == ".jpg"
+    assert size == path.stat().st_size
+    assert digest == hashlib.sha256(path.read_bytes()).hexdigest()
+    with Image.open(path) as img:
+        assert img.size == (750, 1000)
+        assert not img.getexif()
+
+
+def test_normalize_keeps_transparency(tmp_path):
+    path = tmp_path / "logo.png"
+    Image.new("RGBA", (3000, 1000), (0, 0, 255, 128)).save(path)
+
+    ext, _, _ = normalize_file(str(path), max_edge=600, quality=80)
+
+    assert ext == ".webp"
+    with Image.open(path) as img:
+        assert img.format == "WEBP"
+        assert img.mode == "RGBA"
+        assert img.size == (600, 200)
+
+
+def test_normalize_leaves_small_clean_jpeg(tmp_path):
+    path = tmp_path / "small.jpg"
+    Image.new("RGB", (320, 240), (10, 120, 10)).save(path, quality=70)
+    before = path.read_bytes()
+
+    assert normalize_file(str(path), max_edge=1000) is None
+    assert path.read_bytes() == before
+
+
+def test_apply_is_a_no_op_when_disabled(tmp_path, monkeypatch):
+    monkeypatch.setattr(normalize_service, "NORMALIZE_UPLOADS", False)
+    path = tmp_path / "camera.jpg"
+    _exif_jpeg(path, (4000, 3000), orientation=6)
+
+    assert normalize_service.apply(str(path), ".jpg", 123, "abc") == (".jpg", 123, "abc")
@@ -0,0 +1,63 @@
+import html
+import re
+import sqlite3
+
+import pytest
+
+import db
+from app.routers import gallery
+from app.services import pagination
+
+USER = "pager@test.dev"
+
+
+def test_cursor_round_trip_and_bad_tokens():
+    token = pagination.encode_cursor(("2025-01-02T03:04:05", 42))
+    assert pagination.decode_cursor(token, pagination.NEWEST) == ("2025-01-02T03:04:05", 42)
+
+    for bad in (None, "", "%%%", "bm90IGpzb24", pagination.encode_cursor([1, 2]),
+                pagination.encode_cursor(["a"])):
+        assert pagination.decode_cursor(bad, pagination.NEWEST) == pagination.NEWEST
+
+
+@pytest.fixture
+def pager_client(monkeypatch, session_client):
+    monkeypatch.setattr(gallery, "GALLERY_PAGE_SIZE", 3)
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.execute("DELETE FROM images WHERE user_name = ?", (USER,))
+    # p6..p8 share an upload_date so the id tiebreak is exercised
+    conn.executemany(
+        "INSERT INTO images (user_name, filename, upload_date, dominant_emotion) VALUES (?, ?, ?, ?)",
+        [(USER, f"p{i}.png", f"2025-01-0{min(i, 6)}", "joy" if i % 2 else "calm") for i in range(1, 9)]
+    )
+    conn.commit()
+    conn.close()
+
+    client = session_client(gallery.router, session={"email": USER})
+    yield client
+
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.execute("DELETE FROM images WHERE user_name = ?", (USER,))
+    conn.commit()
+    conn.close()
+
+
+def _walk(client, url):
+    seen = []
+    while url:
+        page = client.get(url).text
+        seen.append(re.findall(r"(p\d)\.png", page))
+        match = re.search(r'href="([^"]+)" rel="next"', page)
+        url = html.unescape(match.group(1)) if match else None
+    return seen
+
+
+def test_gallery_pages_follow_upload_date_then_id(pager_client):
+    pages = _walk(pager_client, "/gallery")
+    order = [name for page in pages for name in dict.fromkeys(page)]
+
+    assert len(pages) == 3
+    assert order == ["p8", "p7", "p6", "p5", "p4", "p3", "p2", "p1"]
+
+    joy = [name for page in _walk(pager_client, "/gallery?emotion=joy") for name in dict.fromkeys(page)]
+    assert joy == ["p7", "p5", "p3", "p1"]
@@ -0,0 +1,123 @@
+"""EXPLAIN QUERY PLAN every SQL statement issued from app/routers and app/services.
+
+Statements are pulled out of the source with ``ast``: string literals (and
+f-strings, with each ``{...}`` replaced by a ``?`` placeholder) passed to
+``execute``/``executemany`` directly or through a local variable. Each is
+planned against a freshly migrated database and must not scan a whole
+table or sort through a temporary B-tree, unless it is listed in ALLOWED
+with the reason it has to.
+"""
+import ast
+import pathlib
+import re
+import sqlite3
+
+import pytest
+
+import migrations
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+SOURCES = sorted((ROOT / "app" / "routers").glob("*.py")) + sorted((ROOT / "app" / "services").glob("*.py"))
+
+# (module, function, SQL fragment) -> why a full scan or temp sort is expected
+ALLOWED = {
+    ("admin", "admin_dashboard", "(SELECT COUNT(*) FROM admins)"): "site-wide totals count every row",
+    ("analysis_cache", "put", "SELECT COUNT(*) FROM analysis_cache"):
+        "the cache is capped at ANALYSIS_CACHE_MAX_ENTRIES rows",
+    ("analysis_cache", "put", "ORDER BY last_used_at"):
+        "walks the LRU index only as far as LIMIT, the rows to evict",
+    ("admin", "generate_admin_users_csv", "LEFT JOIN images"): "exports every user",
+    ("admin", "generate_admin_images_csv", "FROM images i"): "exports every image",
+    ("gallery", "search_users", "LIKE"):
+        "queries shorter than a trigram cannot use users_fts; capped by SEARCH_MAX_USERS",
+    ("narrative", "search_narratives", "narratives_fts"):
+        "BM25 order with an id tiebreak sorts the user's matches",
+    ("gallery", "search_users", "visibility = 'public'"):
+        "one index range per matched user; merging them needs a sort of their public images",
+}
+
+
+# A table walked end to end, directly or through all of one index; virtual
+# table (FTS5, json_each) steps and SEARCH ranges are fine
+FULL_SCAN = re.compile(r"SCAN \w+( USING (COVERING )?INDEX \S+)?$")
+
+
+def _allowed(owner, sql):
+    return any(
+        (module, function) == owner and fragment in sql
+        for module, function, fragment in ALLOWED
+    )
+
+
+def _sql_text(node):
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.JoinedStr):
+        text = ""
+        for part in node.values:
+            if isinstance(part, ast.Constant):
+                text += part.value
+            elif re.search(r"IN\s*\(\s*$", text, re.I):
+                # A generated placeholder list; one element would plan as "="
+                text += "?, ?"
+            else:
+                text += "?"
+        return text
+    return None
+
+
+def _statements(path):
+    tree = ast.parse(path.read_text(encoding="utf-8"))
+    for func in ast.walk(tree):
+        if not isinstance(func, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        local_sql = {}
+        for node in ast.walk(func):
+            if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+                text = _sql_text(node.value)
+                if text is not None:
+                    local_sql[node.targets[0].id] = text
+        for node in ast.walk(func):
+            if not (
+                isinstance(node, ast.Call)
+                and isinstance(node.func, ast.Attribute)
+                and node.func.attr in ("execute", "executemany")
+                and node.args
+            ):
+                continue
+            arg = node.args[0]
+            text = _sql_text(arg)
+            if text is None and isinstance(arg, ast.Name):
+                text = local_sql.get(arg.id)
+            if text and re.match(r"\s*(SELECT|UPDATE|DELETE|INSERT|WITH)\b", text, re.I):
+                yield f"{path.stem}.{func.name}:{node.lineno}", (path.stem, func.name), text
+
+
+STATEMENTS = [s for path in SOURCES for s in _statements(path)]
+
+
+@pytest.fixture(scope="module")
+def schema(tmp_path_factory):
+    path = tmp_path_factory.mktemp("plans") / "plans.db"
+    migrations.migrate(str(path))
+    conn = sqlite3.connect(str(path))
+    yield conn
+    conn.close()
+
+
+def test_statements_were_found():
+    assert len(STATEMENTS) > 20
+
+
+@pytest.mark.parametrize("where, owner, sql", STATEMENTS, ids=[s[0] for s in STATEMENTS])
+def test_query_plan(schema, where, owner, sql):
+    params = [None] * sql.count("?")
+    plan = [row[3] for row in schema.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+    problems = [
+        step for step in plan
+        if FULL_SCAN.match(step) or "USE TEMP B-TREE" in step
+    ]
+    if _allowed(owner, sql):
+        return
+    assert not problems, f"{where}: {problems}\n{sql}"
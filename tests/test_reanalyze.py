@@ -0,0 +1,76 @@
+import json
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import db
+import reanalyze
+from app.services import storage_service
+
+
+@pytest.fixture
+def rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_service, "UPLOAD_DIR", str(tmp_path))
+    conn = sqlite3.connect(db.DB_PATH)
+    ids = []
+    for i in range(4):
+        filename = f"re-{i}.png"
+        arr = np.random.default_rng(i).integers(0, 256, size=(32, 32, 3), dtype=np.uint8)
+        path = storage_service.blob_path(filename)
+        os.makedirs(os.path.dirname(path))
+        Image.fromarray(arr).save(path)
+        cur = conn.execute(
+            "INSERT INTO images (user_name, filename, metadata) VALUES (?, ?, ?)",
+            ("reanalyze@test.dev", filename, json.dumps({"algorithm": "fuzzy-color-v1"}))
+        )
+        ids.append(cur.lastrowid)
+    conn.commit()
+    conn.close()
+    return ids
+
+
+def _algorithms(ids):
+    conn = sqlite3.connect(db.DB_PATH)
+    try:
+        return [
+            conn.execute(
+                "SELECT json_extract(metadata, '$.algorithm') FROM images WHERE id = ?", (i,)
+            ).fetchone()[0]
+            for i in ids
+        ]
+    finally:
+        conn.close()
+
+
+def test_resumes_from_checkpoint(rows, tmp_path):
+    checkpoint = tmp_path / "checkpoint.json"
+    argv = ["--user", "reanalyze@test.dev", "--stale", "--workers", "1",
+            "--batch-size", "2", "--checkpoint", str(checkpoint)]
+    filters = dict(zip(("clauses", "params"), reanalyze.build_filters(reanalyze.parse_args(argv))))
+    reanalyze.save_checkpoint(str(checkpoint), filters, rows[1])
+
+    assert reanalyze.main(argv) == 0
+
+    assert _algorithms(rows) == ["fuzzy-color-v1", "fuzzy-color-v1", "fuzzy-color-v2", "fuzzy-color-v2"]
+    assert not checkpoint.exists()
+
+
+def _without_timestamp(metadata):
+    return {k: v for k, v in json.loads(metadata).items() if k != "generated_at"}
+
+
+def test_analysis_matches_upload_worker(tmp_path):
+    from app.services import analysis_queue
+
+    path = tmp_path / "wide.png"
+    arr = np.random.default_rng(7).integers(0, 256, size=(900, 1200, 3), dtype=np.uint8)
+    Image.fromarray(arr).save(path)
+
+    _, metadata, error = reanalyze.analyze(str(path))
+    uploaded, _ = analysis_queue._analyze_file(str(path), out_dir=str(tmp_path / "thumbs"))
+
+    assert error is None
+    assert _without_timestamp(metadata) == _without_timestamp(uploaded)
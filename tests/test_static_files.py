@@ -0,0 +1,80 @@
+import gzip
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.middleware.static_files import CachedStaticFiles, parse_range
+from precompress_static import compress_file
+
+CSS = b"body { color: #333; }\n" * 200
+
+
+@pytest.fixture
+def static_client(tmp_path):
+    (tmp_path / "css").mkdir()
+    (tmp_path / "css" / "site.css").write_bytes(CSS)
+    shard = tmp_path / "uploads" / "ab" / "cd"
+    shard.mkdir(parents=True)
+    (shard / "abcd.png").write_bytes(bytes(range(256)) * 4)
+    (tmp_path / "uploads" / ".incoming").mkdir()
+    (tmp_path / "uploads" / ".incoming" / "x.part").write_bytes(b"partial")
+
+    app = FastAPI()
+    app.mount("/static", CachedStaticFiles(directory=str(tmp_path), immutable_prefixes=("uploads",)))
+    return TestClient(app), tmp_path
+
+
+def test_uploads_are_immutable_and_conditional(static_client):
+    client, _ = static_client
+    res = client.get("/static/uploads/ab/cd/abcd.png")
+
+    assert res.headers["cache-control"] == "public, max-age=31536000, immutable"
+    again = client.get("/static/uploads/ab/cd/abcd.png", headers={"If-None-Match": res.headers["etag"]})
+    assert again.status_code == 304
+    assert client.get("/static/css/site.css").headers["cache-control"] == "no-cache"
+
+
+def test_range_requests(static_client):
+    client, _ = static_client
+    url = "/static/uploads/ab/cd/abcd.png"
+
+    res = client.get(url, headers={"Range": "bytes=10-19"})
+    assert res.status_code == 206
+    assert res.content == bytes(range(10, 20))
+    assert res.headers["content-range"] == "bytes 10-19/1024"
+
+    assert client.get(url, headers={"Range": "bytes=-4"}).content == bytes(range(252, 256))
+    assert client.get(url, headers={"Range": "bytes=5000-"}).status_code == 416
+    stale = client.get(url, headers={"Range": "bytes=0-1", "If-Range": '"other"'})
+    assert stale.status_code == 200 and len(stale.content) == 1024
+
+
+def test_precompressed_variant_served(static_client):
+    client, root = static_client
+    compress_file(str(root / "css" / "site.css"))
+
+    res = client.get("/static/css/site.css", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["content-encoding"] == "gzip"
+    assert res.headers["content-type"].startswith("text/css")
+    assert res.headers["vary"] == "Accept-Encoding"
+    assert res.content == CSS  # decoded by the client
+    assert int(res.headers["content-length"]) == os.path.getsize(root / "css" / "site.css.gz")
+
+    plain = client.get("/static/css/site.css", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert gzip.decompress((root / "css" / "site.css.gz").read_bytes()) == CSS
+
+
+def test_dot_paths_are_hidden(static_client):
+    client, _ = static_client
+    assert client.get("/static/uploads/.incoming/x.part").status_code == 404
+
+
+def test_parse_range():
+    assert parse_range("bytes=0-", 10) == (0, 9)
+    assert parse_range("bytes=2-100", 10) == (2, 9)
+    assert parse_range("bytes=0-1,4-5", 10) is None
+    with pytest.raises(ValueError):
+        parse_range("bytes=10-", 10)
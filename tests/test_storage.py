@@ -0,0 +1,171 @@
+import hashlib
+import io
+import json
+import os
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+
+import db
+import migrate_storage
+from app.routers import gallery
+from app.services import analysis_cache, analysis_queue, image_service, storage_service
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_service, "UPLOAD_DIR", str(tmp_path))
+    submitted = []
+    monkeypatch.setattr(analysis_queue, "submit", lambda *args, **kw: submitted.append(args))
+    conn = sqlite3.connect(db.DB_PATH)
+    yield conn, submitted
+    conn.close()
+
+
+def _png(color):
+    buf = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def _upload(data, name="photo.PNG"):
+    return SimpleNamespace(filename=name, file=io.BytesIO(data))
+
+
+def _refcount(conn, name):
+    row = conn.execute("SELECT refcount FROM blobs WHERE name=?", (name,)).fetchone()
+    return row[0] if row else None
+
+
+def test_blob_paths_are_sharded():
+    name = storage_service.blob_name("abcdef" + "0" * 58, ".JPG")
+    assert name.endswith(".jpg")
+    assert storage_service.blob_path(name, "root") == os.path.join("root", "ab", "cd", name)
+    assert storage_service.upload_url(name) == f"/static/uploads/ab/cd/{name}"
+
+
+def test_identical_uploads_share_one_blob(store):
+    conn, submitted = store
+    data = _png((255, 0, 0))
+
+    name = image_service.save_image(conn, "a@test.dev", _upload(data), "private")
+    assert image_service.save_image(conn, "b@test.dev", _upload(data), "private") == name
+    path = storage_service.blob_path(name)
+    assert open(path, "rb").read() == data
+    assert _refcount(conn, name) == 2
+
+    image_service.delete_image(conn, "a@test.dev", name)
+    assert os.path.exists(path)
+    assert _refcount(conn, name) == 1
+
+    image_service.delete_image(conn, "b@test.dev", name)
+    assert not os.path.exists(path)
+    assert _refcount(conn, name) is None
+
+
+def test_same_user_upload_is_deduplicated(store):
+    conn, submitted = store
+    data = _png((0, 0, 255))
+
+    name = image_service.save_image(conn, "dup@test.dev", _upload(data), "private")
+    image_service.save_image(conn, "dup@test.dev", _upload(data), "public")
+
+    count = conn.execute(
+        "SELECT COUNT(*) FROM images WHERE user_name=? AND filename=?", ("dup@test.dev", name)
+    ).fetchone()[0]
+    assert count == 1
+    assert _refcount(conn, name) == 1
+    assert len(submitted) == 1
+    assert os.listdir(os.path.join(storage_service.UPLOAD_DIR, ".incoming")) == []
+
+
+def test_failed_commit_moves_no_file(store, monkeypatch):
+    conn, submitted = store
+    data = _png((0, 128, 0))
+    name = storage_service.blob_name(hashlib.sha256(data).hexdigest(), ".png")
+
+    class Busy(sqlite3.Connection):
+        def commit(self):
+            raise sqlite3.OperationalError("database is locked")
+
+    busy = sqlite3.connect(db.DB_PATH, factory=Busy)
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            image_service.save_image(busy, "busy@test.dev", _upload(data), "private")
+    finally:
+        busy.close()
+
+    assert not os.path.exists(storage_service.blob_path(name))
+    assert _refcount(conn, name) is None
+    assert os.listdir(os.path.join(storage_service.UPLOAD_DIR, ".incoming")) == []
+    assert submitted == []
+
+
+def test_purge_keeps_a_blob_referenced_again(store):
+    conn, _ = store
+    data = _png((128, 0, 128))
+    name = image_service.save_image(conn, "p@test.dev", _upload(data), "private")
+
+    conn.execute("DELETE FROM images WHERE filename=?", (name,))
+    assert storage_service.release(conn, name)
+    conn.commit()
+    # Another upload of the same content commits before the purge runs
+    storage_service.add_ref(conn, name, len(data))
+    conn.commit()
+
+    assert not storage_service.purge(conn, name)
+    assert os.path.exists(storage_service.blob_path(name))
+    assert not conn.in_transaction
+
+
+def test_migrate_moves_flat_uploads(store, tmp_path):
+    conn, _ = store
+    (tmp_path / "legacy.png").write_bytes(_png((0, 255, 0)))
+    (tmp_path / "legacy_160.webp").write_bytes(b"thumb")
+    cur = conn.execute(
+        "INSERT INTO images (user_name, filename, thumbnails) VALUES (?, ?, ?)",
+        ("legacy@test.dev", "legacy.png", json.dumps([[160, "legacy_160.webp"]]))
+    )
+    conn.commit()
+
+    name = migrate_storage.migrate_row(
+        conn, cur.lastrowid, "legacy.png", json.dumps([[160, "legacy_160.webp"]]), str(tmp_path)
+    )
+
+    filename, thumbnails = conn.execute(
+        "SELECT filename, thumbnails FROM images WHERE id=?", (cur.lastrowid,)
+    ).fetchone()
+    assert filename == name
+    stem = os.path.splitext(filename)[0]
+    assert json.loads(thumbnails) == [[160, f"{stem}_160.webp"]]
+    assert os.path.exists(storage_service.blob_path(filename))
+    assert os.path.exists(storage_service.blob_path(f"{stem}_160.webp"))
+    assert not (tmp_path / "legacy.png").exists()
+    assert _refcount(conn, filename) == 1
+
+
+def test_store_upload_rechecks_duplicates_in_its_transaction(store):
+    conn, _ = store
+    data = _png((10, 20, 30))
+    uploads = []
+    for _ in range(2):
+        # Both passed the early check in _receive_upload before either was stored
+        tmp_path, size, digest = storage_service.receive(io.BytesIO(data))
+        uploads.append({
+            "tmp_path": tmp_path, "filename": storage_service.blob_name(digest, ".png"),
+            "digest": digest, "size": size, "original_size": size,
+        })
+    key = analysis_cache.cache_key(uploads[0]["digest"])
+
+    assert gallery._store_upload(conn, "race@test.dev", uploads[0], "private", key) is not None
+    assert gallery._store_upload(conn, "race@test.dev", uploads[1], "private", key) is None
+
+    name = uploads[0]["filename"]
+    assert conn.execute(
+        "SELECT COUNT(*) FROM images WHERE user_name=? AND filename=?", ("race@test.dev", name)
+    ).fetchone()[0] == 1
+    assert _refcount(conn, name) == 1
+    assert os.listdir(os.path.join(storage_service.UPLOAD_DIR, ".incoming")) == []
+
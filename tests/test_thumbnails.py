@@ -0,0 +1,36 @@
+import json
+
+from PIL import Image
+
+from config import THUMBNAIL_WIDTHS
+from app.services.thumbnail_service import generate_for_file, make_thumbnails, remove_thumbnails
+
+
+def test_make_thumbnails_widths_and_no_upscale(tmp_path):
+    img = Image.new("RGB", (500, 250), (30, 144, 255))
+
+    thumbs = make_thumbnails(img, "photo", str(tmp_path), widths=(160, 320, 640))
+
+    assert thumbs == [[160, "photo_160.webp"], [320, "photo_320.webp"]]
+    with Image.open(tmp_path / "photo_320.webp") as thumb:
+        assert thumb.format == "WEBP"
+        assert thumb.size == (320, 160)
+
+
+def test_remove_thumbnails(tmp_path):
+    img = Image.new("RGB", (400, 400))
+    thumbs = make_thumbnails(img, "photo", str(tmp_path), widths=(160,))
+
+    remove_thumbnails(str(tmp_path), json.dumps(thumbs))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_generate_for_file_produces_every_width(tmp_path):
+    path = tmp_path / "large.jpg"
+    Image.new("RGB", (4000, 3000), (200, 120, 40)).save(path, quality=85)
+
+    _, thumbs = generate_for_file(str(path))
+
+    assert [width for width, _ in thumbs] == sorted(THUMBNAIL_WIDTHS)
+    with Image.open(tmp_path / f"large_{max(THUMBNAIL_WIDTHS)}.webp") as thumb:
+        assert max(thumb.size) == max(THUMBNAIL_WIDTHS)
@@ -0,0 +1,67 @@
+import hashlib
+import io
+
+import pytest
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from app.middleware.upload_limit import UploadSizeLimitMiddleware
+from app.services.upload_service import UploadTooLarge, copy_stream
+
+
+def test_copy_stream_hashes_and_counts(tmp_path):
+    data = b"x" * 2500
+    size, digest = copy_stream(io.BytesIO(data), tmp_path / "out", 10_000, chunk_size=1000)
+
+    assert size == 2500
+    assert digest == hashlib.sha256(data).hexdigest()
+    assert (tmp_path / "out").read_bytes() == data
+
+
+def test_copy_stream_aborts_and_cleans_up(tmp_path):
+    target = tmp_path / "out"
+    with pytest.raises(UploadTooLarge):
+        copy_stream(io.BytesIO(b"x" * 2500), target, 1500, chunk_size=1000)
+    assert not target.exists()
+
+
+@pytest.fixture
+def limited_client():
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(image: UploadFile = File(...)):
+        return {"size": len(await image.read())}
+
+    app.add_middleware(UploadSizeLimitMiddleware, limits={"/upload": (4096, "/gallery")})
+    return TestClient(app)
+
+
+def test_upload_limit_allows_small_bodies(limited_client):
+    res = limited_client.post("/upload", files={"image": ("a.jpg", b"x" * 100, "image/jpeg")})
+    assert res.json() == {"size": 100}
+
+
+def test_upload_limit_rejects_declared_length(limited_client):
+    res = limited_client.post(
+        "/upload",
+        files={"image": ("a.jpg", b"x" * 10_000, "image/jpeg")},
+        follow_redirects=False
+    )
+    assert res.status_code == 303
+    assert res.headers["location"] == "/gallery?error=file_too_large"
+
+
+def test_upload_limit_rejects_streamed_body(limited_client):
+    def chunks():
+        for _ in range(10):
+            yield b"x" * 1000
+
+    res = limited_client.post(
+        "/upload",
+        content=chunks(),
+        headers={"content-type": "multipart/form-data; boundary=abc"},
+        follow_redirects=False
+    )
+    assert res.status_code == 303
+    assert res.headers["location"] == "/gallery?error=file_too_large"
@@ -0,0 +1,117 @@
+import re
+import sqlite3
+
+import pytest
+
+import db
+import migrations
+from app.routers import gallery
+from app.services import fts
+
+
+def _match(conn, text):
+    return sorted(
+        r[0] for r in conn.execute(
+            "SELECT email FROM users_fts WHERE users_fts MATCH ?", (fts.phrase(text),)
+        )
+    )
+
+
+def test_users_fts_indexes_existing_rows_and_follows_writes(tmp_path, monkeypatch):
+    path = str(tmp_path / "fts.db")
+    full = migrations.MIGRATIONS
+    monkeypatch.setattr(migrations, "MIGRATIONS", [m for m in full if m[0] < 10])
+    monkeypatch.setattr(migrations, "LATEST_VERSION", 9)
+    migrations.migrate(path)
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO users (name, email) VALUES ('Marta Quill', 'mquill@test.dev')")
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", full)
+    monkeypatch.setattr(migrations, "LATEST_VERSION", full[-1][0])
+    migrations.migrate(path)
+
+    conn = sqlite3.connect(path)
+    try:
+        assert _match(conn, "QUILL") == ["mquill@test.dev"]
+
+        conn.execute("INSERT INTO users (name, email) VALUES ('Quillon', 'q@test.dev')")
+        conn.execute("UPDATE users SET name = 'Marta Pen' WHERE email = 'mquill@test.dev'")
+        assert _match(conn, "quill") == ["mquill@test.dev", "q@test.dev"]  # email still matches
+        assert _match(conn, "ta pe") == ["mquill@test.dev"]
+
+        conn.execute("DELETE FROM users WHERE email = 'q@test.dev'")
+        assert _match(conn, "quillon") == []
+        assert _match(conn, 'a "quoted" name') == []
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def search_client(session_client):
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.executemany(
+        "INSERT INTO users (name, email) VALUES (?, ?)",
+        [("Searcher", "searcher@test.dev"), ("Orla Finch", "orla@test.dev"), ("Finchley", "fy@test.dev")]
+    )
+    conn.executemany(
+        "INSERT INTO images (user_name, filename, visibility, upload_date, analysis_status) VALUES (?, ?, ?, ?, ?)",
+        [
+            ("orla@test.dev", "s1.png", "public", "2025-02-01", "done"),
+            ("orla@test.dev", "s2.png", "private", "2025-02-02", "done"),
+            ("fy@test.dev", "s3.png", "public", "2025-02-03", "pending"),
+            ("searcher@test.dev", "s4.png", "public", "2025-02-04", "done"),
+        ]
+    )
+    conn.commit()
+    conn.close()
+
+    client = session_client(gallery.router, session={"email": "searcher@test.dev"})
+    yield client
+
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.execute("DELETE FROM images WHERE filename IN ('s1.png', 's2.png', 's3.png', 's4.png')")
+    conn.execute("DELETE FROM users WHERE email IN ('searcher@test.dev', 'orla@test.dev', 'fy@test.dev')")
+    conn.commit()
+    conn.close()
+
+
+def test_search_returns_public_images_of_matching_users(search_client):
+    page = search_client.get("/search", params={"q": "finch"}).text
+    assert "s3.png" in page and "s1.png" in page
+    assert page.index("s3.png") < page.index("s1.png")  # newest first
+    assert "s2.png" not in page and "s4.png" not in page
+    assert "2 public posts found" in page
+    # Status polling is owner-only; other users' pending images get no hook
+    assert "Analyzing..." in page and "data-status-url=" not in page
+
+    short = search_client.get("/search", params={"q": "fy"}).text
+    assert "s3.png" in short and "s1.png" not in short
+
+
+def test_short_query_caps_users_in_id_order(search_client, monkeypatch):
+    monkeypatch.setattr(gallery, "SEARCH_MAX_USERS", 1)
+    page = search_client.get("/search", params={"q": "fi"}).text
+    # Orla Finch signed up before Finchley, so she is the one user kept
+    assert "s1.png" in page and "s3.png" not in page
+
+
+def test_shared_blob_shown_twice_gets_distinct_ids(search_client):
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.executemany(
+        "INSERT INTO images (user_name, filename, visibility, metadata) VALUES (?, 'same.png', 'public', '{}')",
+        [("orla@test.dev",), ("fy@test.dev",)]
+    )
+    conn.commit()
+    try:
+        page = search_client.get("/search", params={"q": "finch"}).text
+        ids = re.findall(r'id="(meta-[^"]+)"', page)
+        assert len(ids) == len(set(ids)) == 2  # only the same.png rows have metadata
+        # Metadata goes out as stored, not re-serialized per row
+        assert '<pre class="meta-json">{}</pre>' in page
+    finally:
+        conn.execute("DELETE FROM images WHERE filename = 'same.png'")
+        conn.commit()
+        conn.close()
+